@@ -1,17 +1,25 @@
 # amazon_app/amazon_crawler.py
 import logging
-import uuid
+import queue
 import time
-import random
-from urllib.parse import urlparse, parse_qs
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
+from django.conf import settings
 from django.utils import timezone
-from django.db import transaction
+from django.db import transaction, connection
+from django.db.models import F
 from .amazon_driver_manager import AmazonDriverManager  # 🔥 تغییر اینجا
 from .geo_manager import AmazonGeoManager
 from .amazon_parser import AmazonProductParser
 from contract_manager.models import Country
-from .models import AmazonProduct, AmazonProductPrice, AmazonCrawlSession
+from .models import AmazonProduct, AmazonProductPrice, AmazonCrawlSession, AmazonCrawlOutcome
+from .persistence import (
+    AmazonProductBatchWriter, build_product_fields, build_price_fields, record_price_observation
+)
+from .freshness import CrawlFreshnessPolicy
+from .price_history import price_runs_in_window
+from .url_normalizer import normalize_amazon_url
 
 logger = logging.getLogger(__name__)
 
@@ -20,9 +28,24 @@ class AmazonCrawlerService:
     def __init__(self):
         self.driver_manager = AmazonDriverManager()  # 🔥 تغییر اینجا
         self.geo_manager = AmazonGeoManager(self.driver_manager)
+        self.freshness = CrawlFreshnessPolicy()
 
     def crawl_product_by_url(self, product_url):
-        """کراول کردن محصول با URL"""
+        """کراول کردن محصول با URL - با قفل single-flight همان ASIN/کشور اگر ASIN از URL استخراج شود"""
+        amazon_url = normalize_amazon_url(product_url)
+        if not amazon_url.asin:
+            return self._crawl_url(product_url)
+
+        country_code = amazon_url.country_code or 'US'
+        wait_started = timezone.now()
+        with self.freshness.single_flight(amazon_url.asin, country_code):
+            shared_product = self._crawled_while_waiting(amazon_url.asin, country_code, wait_started)
+            if shared_product:
+                logger.info(f"🤝 Sharing in-flight crawl result for {amazon_url.asin} ({country_code})")
+                return self._stored_product_data(shared_product)
+            return self._crawl_url(product_url)
+
+    def _crawl_url(self, product_url):
         try:
             logger.info(f"🎯 STARTING CRAWL FOR URL: {product_url}")
 
@@ -38,19 +61,21 @@ class AmazonCrawlerService:
                 logger.error(f"❌ Country not available: {country_code}")
                 return None
 
-            # دریافت درایور مخصوص کشور - 🔥 حالا این متد وجود دارد
-            driver = self.driver_manager.get_amazon_driver(country_code)
-            logger.info(f"🚗 Amazon driver obtained for: {country_code}")
+            # درایور انحصاری کشور از pool تا پایان کراول
+            with self.driver_manager.lease_amazon_driver(country_code) as driver:
+                logger.info(f"🚗 Amazon driver obtained for: {country_code}")
 
-            # تنظیم موقعیت
-            logger.info(f"🌍 CONFIGURING AMAZON LOCATION FOR {country.name}")
-            self.geo_manager.configure_location(driver, country)
+                # تنظیم موقعیت
+                logger.info(f"🌍 CONFIGURING AMAZON LOCATION FOR {country.name}")
+                self.geo_manager.configure_location(driver, country)
 
-            # ایجاد پارسر
-            parser = AmazonProductParser(self.driver_manager, driver, country)
+                # ایجاد پارسر
+                parser = AmazonProductParser(self.driver_manager, driver, country)
 
-            # کراول کردن
-            product_data = parser.crawl_product_by_url(product_url)
+                # کراول کردن
+                product_data = parser.crawl_product_by_url(product_url)
+                if product_data:
+                    self.geo_manager.verify_page_location(driver, country, parser.page_source)
 
             if product_data:
                 # ذخیره در دیتابیس
@@ -66,29 +91,7 @@ class AmazonCrawlerService:
 
     def extract_country_from_url(self, url):
         """استخراج کشور از URL"""
-        try:
-            from urllib.parse import urlparse
-
-            domain = urlparse(url).netloc.lower()
-
-            country_map = {
-                'amazon.com': 'US',
-                'amazon.co.uk': 'UK',
-                'amazon.de': 'DE',
-                'amazon.fr': 'FR',
-                'amazon.it': 'IT',
-                'amazon.es': 'ES',
-                'amazon.ca': 'CA',
-                'amazon.co.jp': 'JP',
-                'amazon.com.au': 'AU',
-            }
-
-            for domain_part, country_code in country_map.items():
-                if domain_part in domain:
-                    return country_code
-            return 'US'
-        except:
-            return 'US'
+        return normalize_amazon_url(url).country_code or 'US'
 
     def _save_product_data(self, product_data, country):
         """ذخیره داده‌های محصول"""
@@ -98,45 +101,12 @@ class AmazonCrawlerService:
                 product, created = AmazonProduct.objects.update_or_create(
                     asin=product_data['asin'],
                     country_code=country.code,
-                    defaults={
-                        'title': product_data.get('title', ''),
-                        'description': product_data.get('description', ''),
-                        'brand': product_data.get('brand', ''),
-                        'category': product_data.get('category', ''),
-                        'image_url': product_data.get('image_url', ''),
-                        'product_url': country.get_amazon_product_url(product_data['asin']),
-                        'condition': product_data.get('condition', 'NEW'),
-                        'features': product_data.get('features', []),
-                        'specifications': product_data.get('specifications', {}),
-                        'rating': product_data.get('rating'),
-                        'review_count': product_data.get('review_count', 0),
-                        'domain': country.amazon_domain,
-                        'seller': product_data.get('seller', ''),
-                        'seller_info': {
-                            'last_crawled': timezone.now().isoformat(),
-                            'seller_id': product_data.get('seller_id', ''),
-                            'seller_type': product_data.get('seller_type', '')
-                        },
-                        'last_crawled': timezone.now(),
-                        'is_active': True
-                    }
+                    defaults=build_product_fields(product_data, country)
                 )
 
-                # ذخیره قیمت
+                # ذخیره قیمت (در حالت change_only فقط در صورت تغییر ردیف جدید)
                 if product_data.get('price'):
-                    AmazonProductPrice.objects.create(
-                        product=product,
-                        price=product_data['price'],
-                        currency=country.get_currency_code(),
-                        country_code=country.code,
-                        seller=product_data.get('seller', ''),
-                        seller_type=product_data.get('seller_type', 'Third-Party'),
-                        availability=product_data.get('availability', True),
-                        stock_status='In Stock' if product_data.get('availability', True) else 'Out of Stock',
-                        shipping_info=product_data.get('shipping_info', ''),
-                        crawl_source='url_crawler',
-                        crawl_timestamp=timezone.now(),
-                    )
+                    record_price_observation(product, build_price_fields(product_data, country))
 
                 return product_data
 
@@ -145,8 +115,14 @@ class AmazonCrawlerService:
             return None
 
     # بقیه متدها...
-    def crawl_products(self, asins, country_code='US', driver_name="amazon_crawler", session_id=None):
-        """Crawl کردن چندین محصول"""
+    def get_crawl_concurrency(self, country_code):
+        """تعداد درایورهای موازی برای هر کشور (از تنظیمات)"""
+        per_country = getattr(settings, 'AMAZON_CRAWL_CONCURRENCY_BY_COUNTRY', {})
+        return max(1, int(per_country.get(country_code.upper(), getattr(settings, 'AMAZON_CRAWL_CONCURRENCY', 1))))
+
+    def crawl_products(self, asins, country_code='US', driver_name="amazon_crawler", session_id=None,
+                       concurrency=None, force=False, caller=None):
+        """Crawl کردن چندین محصول - ASIN هایی که داده تازه دارند (مگر با force) کراول نمی‌شوند"""
         if not session_id:
             session_id = str(uuid.uuid4())
 
@@ -156,68 +132,70 @@ class AmazonCrawlerService:
             logger.error(f"❌ Country not available: {country_code}")
             return {'error': f'Country {country_code} not available'}
 
-        # ایجاد session
-        crawl_session = AmazonCrawlSession.objects.create(
+        # ایجاد session (یا ادامه session ای که برای job در صف ساخته شده)
+        crawl_session, _ = AmazonCrawlSession.objects.update_or_create(
             session_id=session_id,
-            driver_name=driver_name,
-            country_code=country_code,
-            total_products=len(asins),
-            status='RUNNING'
+            defaults={
+                'driver_name': driver_name,
+                'country_code': country_code,
+                'total_products': len(asins),
+                'status': 'RUNNING',
+            }
         )
 
+        # وضعیت نتیجه هر ASIN به ترتیب ورودی (None = ثبت نشده)
+        outcomes = [None] * len(asins)
+        writer = AmazonProductBatchWriter()
+
+        fresh_asins = set() if force else self.freshness.get_fresh_asins(asins, country_code, caller)
+        pending = []
+        for index, asin in enumerate(asins):
+            if asin in fresh_asins:
+                self._record_outcome(index, asin, 'FRESH', time.monotonic(), crawl_session, outcomes)
+            else:
+                pending.append((index, asin))
+        if fresh_asins:
+            logger.info(f"🧊 Skipping {len(fresh_asins)} ASINs with fresh data for {country_code}")
+
+        concurrency = min(concurrency or self.get_crawl_concurrency(country_code), len(pending)) or 1
+        if concurrency > 1:
+            logger.info(f"🚀 Crawling {len(pending)} ASINs with {concurrency} drivers for {country_code}")
+            asin_queue = queue.Queue()
+            for index, asin in pending:
+                asin_queue.put((index, asin))
+
+            with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"amazon_{country_code.lower()}") as executor:
+                workers = [
+                    executor.submit(self._crawl_worker, slot, asin_queue, len(asins), country,
+                                    crawl_session, outcomes, writer, force, caller)
+                    for slot in range(concurrency)
+                ]
+                for worker in workers:
+                    worker.result()
+        else:
+            for i, asin in pending:
+                logger.info(f"🔄 Processing ASIN {i + 1}/{len(asins)}: {asin}")
+
+                self._crawl_and_record(i, asin, country, crawl_session, outcomes, writer, force, caller)
+
+        # ذخیره رکوردهای باقیمانده در بافر
+        writer.close()
+
         results = {
             'session_id': session_id,
             'country': country_code,
-            'successful': [],
-            'failed': [],
+            'successful': [
+                asin for asin, outcome in zip(asins, outcomes) if outcome in AmazonCrawlOutcome.SUCCESS_STATUSES
+            ],
+            'failed': [
+                asin for asin, outcome in zip(asins, outcomes) if outcome not in AmazonCrawlOutcome.SUCCESS_STATUSES
+            ],
+            'skipped_fresh': [asin for asin, outcome in zip(asins, outcomes) if outcome == 'FRESH'],
             'total': len(asins)
         }
 
-        for i, asin in enumerate(asins):
-            try:
-                logger.info(f"🔄 Processing ASIN {i + 1}/{len(asins)}: {asin}")
-
-                # تأخیر بین درخواست‌ها
-                if i > 0:
-                    delay = random.uniform(10, 25)
-                    logger.info(f"⏳ Waiting {delay:.1f} seconds...")
-                    time.sleep(delay)
-
-                # دریافت درایور مخصوص کشور
-                driver = self.driver_manager.get_amazon_driver(country_code)
-
-                # تنظیم موقعیت
-                self.geo_manager.configure_location(driver, country)
-
-                # ایجاد پارسر
-                parser = AmazonProductParser(self.driver_manager, driver, country)
-
-                # crawl محصول
-                product_data = parser.navigate_to_product(asin)
-                if product_data:
-                    product_data = parser.get_product_data()
-
-                if product_data:
-                    # ذخیره در دیتابیس
-                    self._save_product_data(product_data, country)
-                    results['successful'].append(asin)
-                    crawl_session.successful_crawls += 1
-                    logger.info(f"✅ Successfully crawled: {asin}")
-                else:
-                    results['failed'].append(asin)
-                    crawl_session.failed_crawls += 1
-                    logger.warning(f"❌ Failed to crawl: {asin}")
-
-                crawl_session.asins_crawled.append(asin)
-                crawl_session.save()
-
-            except Exception as e:
-                logger.error(f"💥 Unexpected error crawling {asin}: {e}")
-                results['failed'].append(asin)
-                crawl_session.failed_crawls += 1
-                crawl_session.save()
-
-        # آپدیت وضعیت نهایی
+        # آپدیت وضعیت نهایی - شمارنده‌ها در طول کراول فقط در دیتابیس (با F) زیاد شده‌اند
+        crawl_session.refresh_from_db(fields=['successful_crawls', 'failed_crawls'])
         if crawl_session.failed_crawls == 0:
             crawl_session.status = 'COMPLETED'
         elif crawl_session.successful_crawls > 0:
@@ -225,87 +203,310 @@ class AmazonCrawlerService:
         else:
             crawl_session.status = 'FAILED'
 
+        # فقط ASIN هایی که واقعاً کراول و ذخیره شده‌اند (نه FRESH یا ناموفق)
+        crawl_session.asins_crawled = list(
+            crawl_session.outcomes.filter(status='SUCCESS').order_by().values_list('asin', flat=True).distinct()
+        )
         crawl_session.completed_at = timezone.now()
-        crawl_session.save()
+        crawl_session.save(update_fields=['status', 'asins_crawled', 'completed_at'])
 
         logger.info(
             f"🎉 Crawl session completed: {crawl_session.successful_crawls} successful, {crawl_session.failed_crawls} failed")
         return results
 
-    def verify_product_match(self, product_url, expected_asin):
-        """تأیید تطابق URL با محصول - بدون لود صفحه"""
+    def _crawl_worker(self, slot, asin_queue, total, country, crawl_session, outcomes, writer, force=False,
+                      caller=None):
+        """worker موازی: برای هر ASIN یک درایور از pool کشور lease می‌کند و نرخ را rate limiter دامنه تعیین می‌کند"""
+        try:
+            while True:
+                try:
+                    index, asin = asin_queue.get_nowait()
+                except queue.Empty:
+                    writer.flush()
+                    return
+
+                logger.info(f"🔄 [worker {slot}] Processing ASIN {index + 1}/{total}: {asin}")
+                self._crawl_and_record(index, asin, country, crawl_session, outcomes, writer, force, caller)
+        finally:
+            # هر thread کانکشن دیتابیس خودش را دارد
+            connection.close()
+
+    def crawl_single_product(self, product_identifier, country_code='US', driver_name="amazon_crawler",
+                             force=False, caller=None):
+        """کراول کردن یک محصول با ASIN یا URL
+
+        اگر داده ذخیره شده هنوز تازه باشد (و force نباشد) همان برگردانده می‌شود و
+        درخواست‌های هم‌زمان برای یک ASIN/کشور فقط یک کراول انجام می‌دهند.
+        """
+        is_url = product_identifier.lower().startswith('http')
+        if is_url:
+            amazon_url = normalize_amazon_url(product_identifier)
+            asin = amazon_url.asin
+            country_code = amazon_url.country_code or 'US'
+        else:
+            asin = product_identifier.strip().upper()
+
+        if asin and not force:
+            fresh_product = self.freshness.get_fresh_product(asin, country_code, caller)
+            if fresh_product:
+                logger.info(f"🧊 Using fresh stored data for {asin} ({country_code})")
+                return self._stored_product_data(fresh_product)
+
+        if not asin:
+            return self.crawl_product_by_url(product_identifier)
+
+        wait_started = timezone.now()
+        with self.freshness.single_flight(asin, country_code):
+            shared_product = self._crawled_while_waiting(asin, country_code, wait_started, force, caller)
+            if shared_product:
+                logger.info(f"🤝 Sharing in-flight crawl result for {asin} ({country_code})")
+                return self._stored_product_data(shared_product)
+
+            if is_url:
+                return self._crawl_url(product_identifier)
+            return self._crawl_single_asin(asin, country_code)
+
+    def _crawled_while_waiting(self, asin, country_code, wait_started, force=True, caller=None):
+        """بعد از گرفتن قفل single-flight: محصولی که درخواست هم‌زمان دیگری در زمان انتظار کراول کرده
+        (یا بدون force در این فاصله تازه شده) - در غیر این صورت None
+        """
+        since = wait_started
+        if not force:
+            fresh_since = self.freshness.fresh_since(country_code, caller)
+            if fresh_since is not None:
+                since = min(since, fresh_since)
+        return AmazonProduct.objects.filter(asin=asin, country_code=country_code, last_crawled__gte=since).first()
+
+    def _crawl_single_asin(self, asin, country_code):
+        try:
+            country = Country.objects.get(code=country_code, is_active=True, is_available_for_crawling=True)
+        except Country.DoesNotExist:
+            logger.error(f"❌ Country not available: {country_code}")
+            return None
+
+        try:
+            product_data = self._crawl_asin(asin, country)
+            if product_data:
+                return self._save_product_data(product_data, country)
+            return None
+        except Exception as e:
+            logger.error(f"❌ Error crawling single product {asin}: {e}")
+            return None
+
+    def _stored_product_data(self, product):
+        """داده محصول ذخیره شده هم‌شکل با خروجی پارسر - قیمت از فیلدهای خلاصه محصول (بدون کوئری قیمت‌ها)"""
+        latest_price = product.get_latest_price_snapshot()
+        seller_info = product.seller_info or {}
+        return {
+            'asin': product.asin,
+            'title': product.title,
+            'price': float(latest_price.price) if latest_price else None,
+            'currency': latest_price.currency if latest_price else None,
+            'brand': product.brand,
+            'seller': product.seller,
+            'seller_id': seller_info.get('seller_id', ''),
+            'seller_type': seller_info.get('seller_type', ''),
+            'rating': float(product.rating) if product.rating is not None else None,
+            'review_count': product.review_count,
+            'image_url': product.image_url,
+            'category': product.category,
+            'availability': latest_price.availability if latest_price else True,
+            'domain': product.domain,
+            'description': product.description,
+            'features': product.features,
+            'specifications': product.specifications,
+            'shipping_info': latest_price.shipping_info if latest_price else '',
+            'condition': product.condition,
+            'last_crawled': product.last_crawled.isoformat() if product.last_crawled else None,
+            'from_cache': True,
+        }
+
+    def _crawl_asin(self, asin, country):
+        """باز کردن صفحه محصول و استخراج داده‌ها (بدون ذخیره)"""
+        # درایور انحصاری کشور از pool - بعد از این محصول به pool برمی‌گردد
+        with self.driver_manager.lease_amazon_driver(country.code) as driver:
+            # تنظیم موقعیت
+            self.geo_manager.configure_location(driver, country)
+
+            # ایجاد پارسر
+            parser = AmazonProductParser(self.driver_manager, driver, country)
+
+            # crawl محصول
+            if not parser.navigate_to_product(asin):
+                return None
+            product_data = parser.get_product_data()
+
+            # اگر روی صفحه محصول موقعیت/دامنه عوض شده بود، تنظیم مجدد و یک بار تلاش دوباره
+            if product_data and not self.geo_manager.verify_page_location(driver, country, parser.page_source):
+                self.geo_manager.configure_location(driver, country, force=True)
+                if not parser.navigate_to_product(asin):
+                    return None
+                product_data = parser.get_product_data()
+
+            return product_data
+
+    def _crawl_and_record(self, index, asin, country, crawl_session, outcomes, writer, force=False, caller=None):
+        """کراول یک ASIN - ذخیره در بافر writer و ثبت نتیجه در session بعد از flush
+
+        کراول با قفل single-flight همان ASIN/کشور انجام می‌شود؛ اگر در زمان انتظار کراول دیگری
+        (تکی یا دسته‌ای) داده را تازه کرده باشد، ASIN به عنوان FRESH ثبت و کراول نمی‌شود.
+        """
+        started = time.monotonic()
+        wait_started = timezone.now()
+        error_class = 'NoProductData'
+        with self.freshness.single_flight(asin, country.code):
+            if self._crawled_while_waiting(asin, country.code, wait_started, force, caller):
+                logger.info(f"🤝 {asin} was crawled by a concurrent request, skipping")
+                self._record_outcome(index, asin, 'FRESH', started, crawl_session, outcomes)
+                return
+
+            try:
+                product_data = self._crawl_asin(asin, country)
+            except Exception as e:
+                logger.error(f"💥 Unexpected error crawling {asin}: {e}")
+                product_data = None
+                error_class = type(e).__name__
+
+        if not product_data:
+            logger.warning(f"❌ Failed to crawl: {asin}")
+            self._record_outcome(index, asin, 'FAILED', started, crawl_session, outcomes, error_class)
+            return
+
+        logger.info(f"✅ Successfully crawled: {asin}")
+        writer.add(
+            product_data,
+            country,
+            on_result=lambda saved: self._record_outcome(
+                index, asin, 'SUCCESS' if saved else 'SAVE_FAILED', started, crawl_session, outcomes,
+                '' if saved else 'SaveError'
+            )
+        )
+
+    def _record_outcome(self, index, asin, outcome_status, started, crawl_session, outcomes, error_class=''):
+        """ثبت نتیجه نهایی (کراول + ذخیره) یک ASIN: یک ردیف جدید + افزایش اتمیک شمارنده session"""
+        success = outcome_status in AmazonCrawlOutcome.SUCCESS_STATUSES
+        outcomes[index] = outcome_status
         try:
-            # استخراج ASIN و seller از URL
-            asin_from_url = self.driver_manager.extract_asin_from_url(product_url)
-            seller_from_url = self._extract_seller_from_url(product_url)
+            AmazonCrawlOutcome.objects.create(
+                session_id=crawl_session.pk,
+                asin=asin,
+                status=outcome_status,
+                duration_ms=int((time.monotonic() - started) * 1000),
+                error_class=error_class
+            )
+            counter = 'successful_crawls' if success else 'failed_crawls'
+            AmazonCrawlSession.objects.filter(pk=crawl_session.pk).update(**{counter: F(counter) + 1})
+        except Exception as e:
+            logger.error(f"❌ Error recording outcome for {asin}: {e}")
+
+    def get_retry_asins(self, session_id):
+        """ASIN های ناموفق یک session برای کراول مجدد"""
+        return list(
+            AmazonCrawlOutcome.objects.filter(session__session_id=session_id)
+            .exclude(status__in=AmazonCrawlOutcome.SUCCESS_STATUSES)
+            .order_by()
+            .values_list('asin', flat=True)
+            .distinct()
+        )
+
+    def verify_product_match(self, product_url, expected_asin, country_code=None):
+        """تأیید تطابق URL با محصول - بدون لود صفحه"""
+        return self.verify_product_matches([
+            {'url': product_url, 'asin': expected_asin, 'country_code': country_code}
+        ])[0]
+
+    def verify_product_matches(self, items):
+        """تأیید دسته‌ای تطابق URL ها با ASIN ها - بدون لود صفحه
+
+        items: [{'url', 'asin', 'country_code' (اختیاری - پیش‌فرض از دامنه URL)}]
+        هر URL یکتا فقط یک بار پارس می‌شود و محصولات لازم با یک کوئری IN خوانده می‌شوند.
+        خروجی: لیست نتایج به همان ترتیب ورودی
+        """
+        parsed_urls = {}
+        for item in items:
+            url = item['url']
+            if url not in parsed_urls:
+                try:
+                    amazon_url = normalize_amazon_url(url)
+                    parsed_urls[url] = (amazon_url.asin, amazon_url.seller_id, amazon_url.country_code)
+                except Exception as e:
+                    logger.error(f"❌ Error parsing URL {url}: {e}")
+                    parsed_urls[url] = (None, '', None)
+
+        expected_asins = {item['asin'].upper() for item in items}
+        sellers = {
+            (asin, country_code): seller
+            for asin, country_code, seller in AmazonProduct.objects.filter(
+                asin__in=expected_asins
+            ).values_list('asin', 'country_code', 'seller')
+        }
+
+        results = []
+        for item in items:
+            product_url = item['url']
+            expected_asin = item['asin'].upper()
+            asin_from_url, seller_from_url, country_from_url = parsed_urls[product_url]
+            country_code = (item.get('country_code') or country_from_url or 'US').upper()
 
             # بررسی تطابق ASIN
-            asin_match = asin_from_url == expected_asin.upper()
+            asin_match = asin_from_url == expected_asin
 
             if not asin_match:
-                return {
+                results.append({
                     'valid': False,
                     'error': 'ASIN mismatch',
+                    'url': product_url,
                     'asin_match': False,
                     'seller_match': False,
                     'details': {
                         'asin_from_url': asin_from_url,
-                        'expected_asin': expected_asin.upper()
-                    }
-                }
-
-            # پیدا کردن محصول در دیتابیس
-            try:
-                product = AmazonProduct.objects.get(asin=expected_asin.upper())
-                seller_from_db = product.seller
-
-                # بررسی تطابق seller
-                seller_match = self._check_seller_match(seller_from_url, seller_from_db) if seller_from_url else True
-
-                return {
-                    'valid': True,
-                    'url': product_url,
-                    'asin_match': asin_match,
-                    'seller_match': seller_match,
-                    'details': {
-                        'asin_from_url': asin_from_url,
-                        'expected_asin': expected_asin.upper(),
-                        'seller_from_url': seller_from_url,
-                        'seller_from_db': seller_from_db
+                        'expected_asin': expected_asin,
+                        'country_code': country_code
                     }
-                }
+                })
+                continue
 
-            except AmazonProduct.DoesNotExist:
-                return {
+            # پیدا کردن محصول همان کشور در دیتابیس
+            if (expected_asin, country_code) not in sellers:
+                results.append({
                     'valid': False,
                     'error': 'Product not found in database',
+                    'url': product_url,
                     'asin_match': asin_match,
                     'seller_match': False,
                     'details': {
                         'asin_from_url': asin_from_url,
-                        'expected_asin': expected_asin.upper(),
+                        'expected_asin': expected_asin,
+                        'country_code': country_code,
                         'seller_from_url': seller_from_url
                     }
+                })
+                continue
+
+            seller_from_db = sellers[(expected_asin, country_code)]
+
+            # بررسی تطابق seller
+            seller_match = self._check_seller_match(seller_from_url, seller_from_db) if seller_from_url else True
+
+            results.append({
+                'valid': True,
+                'url': product_url,
+                'asin_match': asin_match,
+                'seller_match': seller_match,
+                'details': {
+                    'asin_from_url': asin_from_url,
+                    'expected_asin': expected_asin,
+                    'country_code': country_code,
+                    'seller_from_url': seller_from_url,
+                    'seller_from_db': seller_from_db
                 }
+            })
 
-        except Exception as e:
-            logger.error(f"❌ Error verifying product match: {e}")
-            return {
-                'valid': False,
-                'error': str(e)
-            }
+        return results
 
     def _extract_seller_from_url(self, url):
         """استخراج seller از URL (پارامتر m)"""
-        try:
-            parsed_url = urlparse(url)
-            query_params = parse_qs(parsed_url.query)
-
-            if 'm' in query_params:
-                return query_params['m'][0]
-            return ""
-        except:
-            return ""
+        return normalize_amazon_url(url).seller_id
 
     def _check_seller_match(self, seller_from_url, seller_from_db):
         """بررسی تطابق seller"""
@@ -324,10 +525,7 @@ class AmazonCrawlerService:
 
         cutoff_date = timezone.now() - timezone.timedelta(days=days)
 
-        prices = AmazonProductPrice.objects.filter(
-            product__asin=asin,
-            crawl_timestamp__gte=cutoff_date
-        ).order_by('crawl_timestamp')
+        prices = price_runs_in_window(AmazonProductPrice.objects.filter(product__asin=asin), cutoff_date)
 
         return {
             'asin': asin,
@@ -336,6 +534,8 @@ class AmazonCrawlerService:
                     'price': float(price.price),
                     'currency': price.currency,
                     'timestamp': price.crawl_timestamp.isoformat(),
+                    'last_seen': price.seen_until.isoformat(),
+                    'observation_count': price.observation_count,
                     'seller': price.seller,
                     'availability': price.availability
                 }
@@ -3,13 +3,21 @@ import logging
 import time
 import random
 import re
-from urllib.parse import urlparse, parse_qs
+import threading
+from datetime import timedelta
+from urllib.parse import urlparse
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium_app.driver_manager import SeleniumDriverManager
+from selenium_app.models import SeleniumDriver
+from .rate_limiter import AmazonRateLimiter
+from .url_normalizer import normalize_amazon_url
 
 logger = logging.getLogger(__name__)
 
@@ -19,42 +27,125 @@ class AmazonDriverManager:
 
     def __init__(self):
         self.driver_manager = SeleniumDriverManager()
-        self.country_drivers = {}  # {country_code: driver_instance}
-
-    def get_amazon_driver(self, country_code, force_new=False):
-        """دریافت درایور مخصوص کشور برای آمازون"""
-        driver_name = f"amazon_{country_code.lower()}"
-
-        if not force_new and country_code in self.country_drivers:
-            driver = self.country_drivers[country_code]
-            if self._is_driver_healthy(driver_name):
-                logger.info(f"🚗 Using existing driver for {country_code}")
-                return driver
-            else:
-                logger.info(f"🔄 Driver unhealthy, creating new one for {country_code}")
-                self._cleanup_driver(driver_name)
-                self.country_drivers.pop(country_code, None)
-
-        # ایجاد درایور جدید با پروفایل مخصوص آمازون
-        profile_data = {
-            'headless': False,
-            'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'window_size': '1920,1080',
-        }
+        self.rate_limiter = AmazonRateLimiter()
+        # موقعیت جغرافیایی session هایی که از کوکی‌های ذخیره شده ساخته شده‌اند: {session_id: location}
+        self.seeded_locations = {}
+        self._seeded_lock = threading.Lock()
+
+    # پروفایل مرورگر درایورهای آمازون
+    PROFILE_DATA = {
+        'headless': False,
+        'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'window_size': '1920,1080',
+    }
+
+    @staticmethod
+    def get_driver_name(country_code):
+        """نام درایور (و pool درایورهای) هر کشور"""
+        return f"amazon_{country_code.lower()}"
+
+    def get_pool_size(self, country_code):
+        """حداکثر درایورهای هم‌زمان هر کشور - حداقل به اندازه concurrency کراول"""
+        per_country = getattr(settings, 'AMAZON_CRAWL_CONCURRENCY_BY_COUNTRY', {})
+        concurrency = int(per_country.get(country_code.upper(), getattr(settings, 'AMAZON_CRAWL_CONCURRENCY', 1)))
+        return max(1, concurrency, getattr(settings, 'SELENIUM_POOL_MAX_SIZE', 2))
+
+    def get_warm_size(self, country_code):
+        """تعداد درایورهای گرم (بیکار آماده) هر کشور - این درایورها با بیکاری بسته نمی‌شوند"""
+        per_country = getattr(settings, 'AMAZON_DRIVER_WARM_POOL_SIZE_BY_COUNTRY', {})
+        warm_size = int(per_country.get(country_code.upper(), getattr(settings, 'AMAZON_DRIVER_WARM_POOL_SIZE', 1)))
+        return max(0, min(warm_size, self.get_pool_size(country_code)))
+
+    def get_amazon_pool(self, country_code):
+        """pool درایورهای آمازون کشور"""
+        driver_name = self.get_driver_name(country_code)
+        return self.driver_manager.get_pool(
+            driver_name,
+            factory=lambda: self._open_amazon_driver(country_code),
+            min_size=self.get_warm_size(country_code),
+            max_size=self.get_pool_size(country_code),
+        )
+
+    def lease_amazon_driver(self, country_code, timeout=None):
+        """with lease_amazon_driver('US') as driver: ... - درایور انحصاری کشور تا پایان بلاک"""
+        if timeout is None:
+            timeout = getattr(settings, 'SELENIUM_POOL_LEASE_TIMEOUT', 300)
+        return self.get_amazon_pool(country_code).lease(timeout)
+
+    def _open_amazon_driver(self, country_code):
+        """ساخت درایور جدید برای pool کشور - از کوکی‌های ذخیره شده (اگر معتبر باشند) شروع می‌کند"""
+        driver_name = self.get_driver_name(country_code)
+        cookie_jar = self.get_country_cookie_jar(country_code)
+        cookies = cookie_jar['cookies'] if cookie_jar else None
+        cookie_url = f"https://www.{cookie_jar['domain']}" if cookie_jar else None
+
+        logger.info(f"🚗 Creating new Amazon driver {driver_name} for {country_code}")
+        driver, session_data = self.driver_manager.open_pooled_driver(
+            driver_name, 'CHROME', self.PROFILE_DATA, cookies, cookie_url
+        )
+
+        if cookie_jar and session_data.get('cookies_loaded'):
+            logger.info(
+                f"🍪 Seeded {driver_name} with {session_data['cookies_loaded']} cookies "
+                f"(jar v{cookie_jar['version']})"
+            )
+            with self._seeded_lock:
+                self.seeded_locations[driver.session_id] = cookie_jar['location']
+
+        return driver, session_data
+
+    def pop_seeded_location(self, driver):
+        """موقعیتی که session درایور با کوکی‌هایش ساخته شده (فقط یک بار برگردانده می‌شود)"""
+        with self._seeded_lock:
+            return self.seeded_locations.pop(getattr(driver, 'session_id', None), None)
+
+    def get_country_cookie_jar(self, country_code):
+        """کوکی‌های ذخیره شده و منقضی نشده کشور"""
+        try:
+            driver_obj = SeleniumDriver.objects.filter(name=self.get_driver_name(country_code)).first()
+        except Exception as e:
+            logger.warning(f"⚠️ Could not load cookie jar for {country_code}: {e}")
+            return None
 
-        logger.info(f"🚗 Creating new Amazon driver for {country_code}")
-        driver = self.driver_manager.get_or_create_driver(driver_name, 'CHROME', profile_data)
-        self.country_drivers[country_code] = driver
+        if not driver_obj or not driver_obj.has_valid_cookie_jar():
+            return None
+
+        return {
+            'version': driver_obj.cookie_jar_version,
+            'domain': driver_obj.cookie_jar.get('domain'),
+            'location': driver_obj.cookie_jar.get('location'),
+            'cookies': driver_obj.cookie_jar['cookies'],
+        }
 
-        return driver
+    def save_country_cookies(self, country_code, driver, location):
+        """ذخیره کوکی‌های session بعد از تنظیم موفق موقعیت تا درایورهای بعدی از آن شروع کنند"""
+        ttl_hours = getattr(settings, 'AMAZON_COOKIE_JAR_TTL_HOURS', 24)
+        if not ttl_hours:
+            return False
 
-    def _is_driver_healthy(self, driver_name):
-        """بررسی سلامت درایور"""
-        return self.driver_manager._is_driver_healthy(driver_name)
+        try:
+            domain = location['domain']
+            cookies = [cookie for cookie in driver.get_cookies() if domain in cookie.get('domain', '')]
+            if not cookies:
+                logger.debug(f"🍪 No {domain} cookies to save for {country_code}")
+                return False
 
-    def _cleanup_driver(self, driver_name):
-        """پاکسازی درایور مشکل‌دار"""
-        self.driver_manager._cleanup_driver(driver_name)
+            now = timezone.now()
+            driver_obj, _ = SeleniumDriver.objects.get_or_create(
+                name=self.get_driver_name(country_code),
+                defaults={'driver_type': 'CHROME'}
+            )
+            SeleniumDriver.objects.filter(pk=driver_obj.pk).update(
+                cookie_jar={'domain': domain, 'location': location, 'cookies': cookies},
+                cookie_jar_version=F('cookie_jar_version') + 1,
+                cookie_jar_saved_at=now,
+                cookie_jar_expires_at=now + timedelta(hours=ttl_hours)
+            )
+            logger.info(f"🍪 Saved {len(cookies)} cookies for {country_code}")
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ Could not save cookies for {country_code}: {e}")
+            return False
 
     def safe_amazon_click(self, driver, by, value, timeout=10):
         """کلیک ایمن در آمازون با هندل کردن استثناها"""
@@ -84,29 +175,7 @@ class AmazonDriverManager:
 
     def extract_asin_from_url(self, url):
         """استخراج ASIN از URL"""
-        try:
-            parsed_url = urlparse(url)
-            path_parts = parsed_url.path.split('/')
-
-            # از مسیر /dp/ASIN
-            if 'dp' in path_parts:
-                dp_index = path_parts.index('dp')
-                if dp_index + 1 < len(path_parts):
-                    asin = path_parts[dp_index + 1]
-                    if len(asin) == 10 and asin.isalnum():
-                        return asin.upper()
-
-            # از پارامتر ASIN
-            query_params = parse_qs(parsed_url.query)
-            if 'asin' in query_params:
-                asin = query_params['asin'][0]
-                if len(asin) == 10 and asin.isalnum():
-                    return asin.upper()
-
-            return None
-        except Exception as e:
-            logger.error(f"Error extracting ASIN from URL: {e}")
-            return None
+        return normalize_amazon_url(url).asin
 
     def simulate_human_behavior(self, driver):
         """شبیه‌سازی رفتار انسانی"""
@@ -126,10 +195,32 @@ class AmazonDriverManager:
         except Exception as e:
             logger.debug(f"Human behavior simulation minor issue: {e}")
 
+    def get_domain_from_url(self, url):
+        """دامنه آمازون از URL (مثال: amazon.co.uk) - هم‌شکل با Country.amazon_domain"""
+        known_domain = normalize_amazon_url(url).domain
+        if known_domain:
+            return known_domain
+        try:
+            domain = urlparse(url).netloc.lower().split(':')[0]
+            return domain[4:] if domain.startswith('www.') else domain
+        except Exception:
+            return ""
+
+    def wait_for_page_ready(self, driver, timeout=5):
+        """منتظر ماندن تا کامل شدن لود صفحه (به جای sleep ثابت)"""
+        try:
+            WebDriverWait(driver, timeout).until(
+                lambda d: d.execute_script("return document.readyState") == "complete"
+            )
+            return True
+        except Exception:
+            return False
+
     def handle_amazon_block(self, driver):
         """مدیریت صفحات مسدودسازی آمازون"""
         try:
             page_text = driver.page_source.lower()
+            domain = self.get_domain_from_url(driver.current_url)
             automation_keywords = [
                 "automated test software",
                 "being controlled by automated test software",
@@ -140,6 +231,8 @@ class AmazonDriverManager:
 
             if any(keyword in page_text for keyword in automation_keywords):
                 logger.warning("🛑 Amazon block page detected - attempting to bypass...")
+                if domain:
+                    self.rate_limiter.report_block(domain)
 
                 continue_button_selectors = [
                     "//button[contains(text(), 'Continue shopping')]",
@@ -156,18 +249,22 @@ class AmazonDriverManager:
                         )
                         continue_button.click()
                         logger.info("✅ Continue button clicked successfully")
-                        time.sleep(3)
+                        self.wait_for_page_ready(driver)
                         return True
                     except:
                         continue
 
                 # اگر دکمه continue پیدا نشد، صفحه رو رفرش کن
                 logger.warning("⚠️ Could not find continue button, trying refresh")
+                if domain:
+                    self.rate_limiter.acquire(domain)
                 driver.refresh()
-                time.sleep(5)
+                self.wait_for_page_ready(driver)
                 return True
 
+            if domain:
+                self.rate_limiter.report_success(domain)
             return True
         except Exception as e:
             logger.error(f"Error handling Amazon block: {e}")
-            return False
\ No newline at end of file
+            return False
@@ -0,0 +1,272 @@
+# amazon_app/amazon_html_parser.py
+import logging
+import re
+
+from lxml import html as lxml_html
+from lxml.cssselect import CSSSelector
+
+logger = logging.getLogger(__name__)
+
+
+def _compile(*selectors):
+    """کامپایل یک‌باره سلکتورهای CSS به XPath"""
+    return [CSSSelector(selector) for selector in selectors]
+
+
+# سلکتورها یک بار در زمان import کامپایل می‌شوند
+PAGE_INDICATORS = _compile('#dp', '#productTitle', '#landingImage')
+ASIN_SELECTORS = _compile('[data-asin]', '[data-product-asin]', '#ASIN')
+TITLE_SELECTORS = _compile('#productTitle', '#title', 'h1.a-size-large')
+# برخلاف حالت زنده، a-offscreen اینجا قابل خواندن است و قیمت کامل (با سنت) را دارد
+PRICE_SELECTORS = _compile(
+    '.a-price .a-offscreen',
+    '#priceblock_dealprice',
+    '#priceblock_ourprice',
+    '.a-price-whole',
+    '.a-price-current',
+    '[data-a-color="price"] .a-offscreen',
+)
+BRAND_SELECTORS = _compile('#bylineInfo')
+SELLER_SELECTORS = _compile('#merchant-info')
+SELLER_ID_SELECTORS = _compile('[data-csa-c-seller-id]')
+RATING_SELECTORS = _compile('[data-hook="average-star-rating"] .a-icon-alt')
+REVIEW_COUNT_SELECTORS = _compile('#acrCustomerReviewText')
+IMAGE_SELECTORS = _compile('#landingImage', '#imgBlkFront', '.a-dynamic-image')
+CATEGORY_SELECTORS = _compile('#wayfinding-breadcrumbs_container a')
+AVAILABILITY_SELECTORS = _compile('#availability')
+DESCRIPTION_SELECTORS = _compile('#productDescription', '.product-description', '#aplus')
+FEATURE_SELECTORS = _compile(
+    '#feature-bullets .a-list-item',
+    '.a-unordered-list .a-list-item',
+    '[data-hook="cr-features-list"] li',
+)
+SPEC_ROW_SELECTORS = _compile('.prodDetTable tr', '.product-specification-table tr')
+SHIPPING_SELECTORS = _compile(
+    '#mir-layout-DELIVERY_BLOCK-slot-DELIVERY_MESSAGE',
+    '.shipping-weight',
+    '.a-section.shipping-weight',
+)
+CONDITION_SELECTORS = _compile('#condition', '.a-section.condition')
+
+PRICE_PATTERN = re.compile(r'[\d,]+\.?\d*')
+RATING_PATTERN = re.compile(r'(\d+\.?\d*) out of 5')
+REVIEW_COUNT_PATTERN = re.compile(r'([\d,]+)')
+
+
+class AmazonHTMLParser:
+    """استخراج آفلاین اطلاعات محصول از HTML کامل صفحه (بدون رفت‌وبرگشت به WebDriver)"""
+
+    def __init__(self, page_source, current_url, country, driver_manager):
+        self.document = lxml_html.fromstring(page_source or '<html></html>')
+        self.current_url = current_url or ''
+        self.country = country
+        self.driver_manager = driver_manager
+
+    def get_product_data(self):
+        """استخراج اطلاعات محصول - خروجی هم‌شکل با AmazonProductParser.get_product_data"""
+        if not self.is_product_page_loaded():
+            logger.warning("❌ Product page not properly loaded")
+            return None
+
+        asin = self._extract_asin()
+        if not asin:
+            logger.warning("❌ Could not extract ASIN")
+            return None
+
+        seller = self._extract_seller()
+
+        return {
+            'asin': asin,
+            'title': self._extract_title(),
+            'price': self._extract_price(),
+            'currency': self.country.get_currency_code(),
+            'brand': self._extract_brand(),
+            'seller': seller,
+            'seller_id': self._extract_seller_id(),
+            'seller_type': self._seller_type_for(seller),
+            'rating': self._extract_rating(),
+            'review_count': self._extract_review_count(),
+            'image_url': self._extract_image_url(),
+            'category': self._extract_category(),
+            'availability': self._extract_availability(),
+            'domain': self.country.amazon_domain,
+            'description': self._extract_description(),
+            'features': self._extract_features(),
+            'specifications': self._extract_specifications(),
+            'shipping_info': self._extract_shipping_info(),
+            'condition': self._extract_condition(),
+        }
+
+    def is_product_page_loaded(self):
+        """چک کردن آیا صفحه محصول درست لود شده"""
+        return self._first(PAGE_INDICATORS) is not None
+
+    # متدهای کمکی
+    def _all(self, selector):
+        return selector(self.document)
+
+    def _first(self, selectors):
+        for selector in selectors:
+            elements = selector(self.document)
+            if elements:
+                return elements[0]
+        return None
+
+    @staticmethod
+    def _text(element):
+        """متن المنت بدون script/style با فاصله‌های نرمال‌شده"""
+        if element is None:
+            return ''
+        parts = element.xpath('.//text()[not(ancestor::script) and not(ancestor::style)]')
+        return ' '.join(' '.join(parts).split())
+
+    # استخراج فیلدها
+    def _extract_asin(self):
+        asin_from_url = self.driver_manager.extract_asin_from_url(self.current_url)
+        if asin_from_url:
+            return asin_from_url
+
+        for selector in ASIN_SELECTORS:
+            for element in selector(self.document):
+                asin = element.get('data-asin') or element.get('data-product-asin') or element.get('value')
+                if asin and len(asin) == 10:
+                    return asin.upper()
+        return None
+
+    def _extract_title(self):
+        for selector in TITLE_SELECTORS:
+            for element in selector(self.document):
+                title = self._text(element)
+                if title and len(title) > 5:
+                    return title
+        return ""
+
+    def _extract_price(self):
+        for selector in PRICE_SELECTORS:
+            for element in selector(self.document):
+                price_match = PRICE_PATTERN.search(self._text(element).replace(',', ''))
+                if price_match:
+                    try:
+                        return float(price_match.group())
+                    except ValueError:
+                        continue
+        return None
+
+    def _extract_brand(self):
+        brand_text = self._text(self._first(BRAND_SELECTORS))
+        clean_brand = brand_text.replace('Visit the', '').replace('Store', '').replace('Brand:', '').strip()
+        if clean_brand and len(clean_brand) > 1:
+            return clean_brand
+        return ""
+
+    def _extract_seller(self):
+        element = self._first(SELLER_SELECTORS)
+        if element is None:
+            return "Amazon"
+
+        seller_text = self._text(element)
+        if 'Ships from and sold by' in seller_text:
+            return seller_text.replace('Ships from and sold by', '').split('.')[0].strip()
+        elif 'Sold by' in seller_text:
+            return seller_text.replace('Sold by', '').split('.')[0].strip()
+        elif 'Amazon' in seller_text:
+            return 'Amazon'
+        return seller_text
+
+    def _extract_seller_id(self):
+        element = self._first(SELLER_ID_SELECTORS)
+        if element is None:
+            return ""
+        return element.get('data-csa-c-seller-id') or ""
+
+    @staticmethod
+    def _seller_type_for(seller):
+        return 'Amazon' if 'amazon' in (seller or '').lower() else 'Third-Party'
+
+    def _extract_rating(self):
+        rating_match = RATING_PATTERN.search(self._text(self._first(RATING_SELECTORS)))
+        if rating_match:
+            return float(rating_match.group(1))
+        return None
+
+    def _extract_review_count(self):
+        review_text = self._text(self._first(REVIEW_COUNT_SELECTORS)).replace(',', '')
+        review_match = REVIEW_COUNT_PATTERN.search(review_text)
+        if review_match:
+            return int(review_match.group(1))
+        return 0
+
+    def _extract_image_url(self):
+        for selector in IMAGE_SELECTORS:
+            for element in selector(self.document):
+                image_url = element.get('src') or element.get('data-old-hires')
+                if image_url and 'http' in image_url:
+                    return image_url
+        return ""
+
+    def _extract_category(self):
+        categories = [
+            text for text in (self._text(el) for el in self._all(CATEGORY_SELECTORS[0]))
+            if text and text not in ['Home', '›']
+        ]
+        return ' > '.join(categories) if categories else ""
+
+    def _extract_availability(self):
+        element = self._first(AVAILABILITY_SELECTORS)
+        if element is None:
+            return True
+        availability_text = self._text(element).lower()
+        return 'in stock' in availability_text or 'available' in availability_text
+
+    def _extract_description(self):
+        for selector in DESCRIPTION_SELECTORS:
+            for element in selector(self.document):
+                description = self._text(element)
+                if description and len(description) > 50:
+                    return description
+        return ""
+
+    def _extract_features(self):
+        for selector in FEATURE_SELECTORS:
+            features = []
+            for element in selector(self.document):
+                text = self._text(element)
+                if text and len(text) > 10 and not text.startswith('#'):
+                    features.append(text)
+            if features:
+                return features
+        return []
+
+    def _extract_specifications(self):
+        for selector in SPEC_ROW_SELECTORS:
+            specs = {}
+            for row in selector(self.document):
+                cells = row.findall('td')
+                if len(cells) == 2:
+                    key = self._text(cells[0]).rstrip(':')
+                    value = self._text(cells[1])
+                    if key and value:
+                        specs[key] = value
+            if specs:
+                return specs
+        return {}
+
+    def _extract_shipping_info(self):
+        for selector in SHIPPING_SELECTORS:
+            for element in selector(self.document):
+                shipping_text = self._text(element)
+                if shipping_text and len(shipping_text) > 10:
+                    return shipping_text
+        return ""
+
+    def _extract_condition(self):
+        for selector in CONDITION_SELECTORS:
+            for element in selector(self.document):
+                condition_text = self._text(element).lower()
+                if 'new' in condition_text:
+                    return 'NEW'
+                elif 'used' in condition_text:
+                    return 'USED'
+                elif 'renewed' in condition_text or 'refurbished' in condition_text:
+                    return 'RENEWED'
+        return 'NEW'
@@ -7,25 +7,39 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from django.conf import settings
+
+from .amazon_html_parser import AmazonHTMLParser
 
 logger = logging.getLogger(__name__)
 
+EXTRACTION_MODE_LIVE = 'live'  # یک درخواست WebDriver برای هر المنت
+EXTRACTION_MODE_OFFLINE = 'offline'  # یک بار page_source و پارس محلی
+
 
 class AmazonProductParser:
-    def __init__(self, driver_manager, driver, country):
+    def __init__(self, driver_manager, driver, country, extraction_mode=None):
         self.driver_manager = driver_manager
         self.driver = driver
         self.country = country
         self.wait = WebDriverWait(driver, 15)
+        self.page_source = None  # آخرین HTML پارس شده در حالت offline
+        self.extraction_mode = extraction_mode or getattr(
+            settings, 'AMAZON_PARSER_EXTRACTION_MODE', EXTRACTION_MODE_OFFLINE
+        )
 
     def crawl_product_by_url(self, product_url):
         """کراول کردن صفحه محصول با URL"""
         try:
             logger.info(f"🔄 Crawling product from URL: {product_url}")
 
+            # نوبت گرفتن از rate limiter دامنه
+            if not self._acquire_rate_limit():
+                return None
+
             # لود صفحه
             self.driver.get(product_url)
-            time.sleep(3)
+            self._wait_for_product_page()
 
             # هندل کردن بلاک
             self.driver_manager.handle_amazon_block(self.driver)
@@ -46,12 +60,16 @@ class AmazonProductParser:
             # ساخت URL محصول
             product_url = self.country.get_amazon_product_url(asin)
 
+            # نوبت گرفتن از rate limiter دامنه
+            if not self._acquire_rate_limit():
+                return False
+
             logger.info(f"🔄 Navigating to: {product_url}")
             self.driver.get(product_url)
 
             # منتظر لود شدن صفحه
             self.wait.until(EC.presence_of_element_located((By.TAG_NAME, "body")))
-            time.sleep(3)
+            self._wait_for_product_page()
 
             # هندل کردن بلاک
             self.driver_manager.handle_amazon_block(self.driver)
@@ -65,8 +83,54 @@ class AmazonProductParser:
             logger.error(f"❌ Navigation failed: {e}")
             return False
 
+    def _acquire_rate_limit(self):
+        """انتظار برای توکن rate limiter دامنه کشور"""
+        if self.driver_manager.rate_limiter.acquire(self.country.amazon_domain):
+            return True
+        logger.error(f"❌ Rate limit wait timed out for {self.country.amazon_domain}")
+        return False
+
+    def _wait_for_product_page(self, timeout=3):
+        """منتظر ماندن تا ظاهر شدن المنت‌های اصلی صفحه محصول (حداکثر timeout ثانیه)"""
+        try:
+            WebDriverWait(self.driver, timeout).until(EC.any_of(
+                EC.presence_of_element_located((By.ID, "productTitle")),
+                EC.presence_of_element_located((By.ID, "dp")),
+            ))
+        except TimeoutException:
+            pass
+
     def get_product_data(self):
         """استخراج اطلاعات محصول"""
+        if self.extraction_mode == EXTRACTION_MODE_OFFLINE:
+            return self._get_product_data_offline()
+        return self._get_product_data_live()
+
+    def _get_product_data_offline(self):
+        """استخراج اطلاعات محصول از یک snapshot از page_source"""
+        try:
+            started = time.monotonic()
+            page_source = self.driver.page_source
+            current_url = self.driver.current_url
+            self.page_source = page_source
+
+            product_data = AmazonHTMLParser(
+                page_source, current_url, self.country, self.driver_manager
+            ).get_product_data()
+
+            if product_data:
+                logger.info(
+                    f"✅ Successfully extracted data for ASIN: {product_data['asin']} "
+                    f"(offline, {(time.monotonic() - started) * 1000:.0f} ms)"
+                )
+            return product_data
+
+        except Exception as e:
+            logger.error(f"❌ Error extracting product data (offline): {e}")
+            return None
+
+    def _get_product_data_live(self):
+        """استخراج اطلاعات محصول المنت به المنت از طریق WebDriver"""
         try:
             if not self._is_product_page_loaded():
                 logger.warning("❌ Product page not properly loaded")
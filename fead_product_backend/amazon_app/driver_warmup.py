@@ -0,0 +1,115 @@
+# amazon_app/driver_warmup.py
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+
+from contract_manager.models import Country
+
+logger = logging.getLogger(__name__)
+
+
+class AmazonDriverWarmer:
+    """گرم نگه داشتن pool درایورهای آمازون
+
+    برای هر کشور فعال کراول به تعداد تنظیم شده درایور می‌سازد و موقعیت آمازون را روی آن‌ها تنظیم می‌کند
+    تا اولین کراول هزینه راه‌اندازی Chrome و تنظیم موقعیت را نپردازد؛ سپس به صورت دوره‌ای کمبود را جبران می‌کند.
+    heartbeat مدیر درایورها درایورهای بیکار را ping می‌کند (session های Selenium Grid بعد از مدتی بیکاری بسته می‌شوند).
+    pool ها به ازای هر پروسه هستند، پس این کار باید در همان پروسه‌ای که کراول می‌کند اجرا شود.
+
+    هزینه: هر پروسه‌ای که warm-up می‌کند (مثلاً هر فرزند prefork یک worker) برای هر کشور فعال
+    get_warm_size درایور باز نگه می‌دارد که زیر min_size هستند و evict نمی‌شوند؛ مجموع session های یک میزبان
+    = پروسه‌ها × کشورها × اندازه pool گرم. پس فقط در worker اختصاصی کراول با concurrency کم فعال شود.
+    """
+
+    def __init__(self, crawler_service):
+        self.crawler_service = crawler_service
+        self.driver_manager = crawler_service.driver_manager
+        self.geo_manager = crawler_service.geo_manager
+        self.countries = {}  # {country_code: Country} کشورهای گرم شده
+        self._keepalive_thread = None
+        self._stop = threading.Event()
+
+    def get_countries(self, country_codes=None):
+        countries = Country.objects.filter(is_active=True, is_available_for_crawling=True).select_related(
+            'default_currency'
+        )
+        if country_codes:
+            countries = countries.filter(code__in=[code.upper() for code in country_codes])
+        return list(countries)
+
+    def warm_up(self, country_codes=None, size=None):
+        """ساخت و تنظیم موقعیت درایورهای گرم برای هر کشور - {country_code: تعداد درایور ساخته شده}"""
+        countries = [
+            country for country in self.get_countries(country_codes)
+            if (size if size is not None else self.driver_manager.get_warm_size(country.code)) > 0
+        ]
+        if not countries:
+            logger.info("ℹ️ No countries to warm up drivers for")
+            return {}
+
+        logger.info(f"🔥 Warming up Amazon drivers for {', '.join(country.code for country in countries)}")
+        with ThreadPoolExecutor(max_workers=len(countries), thread_name_prefix='amazon_warmup') as executor:
+            futures = {
+                country.code: executor.submit(self._warm_country, country, size)
+                for country in countries
+            }
+            results = {code: future.result() for code, future in futures.items()}
+
+        logger.info(f"🔥 Amazon driver warm-up finished: {results}")
+        return results
+
+    def _warm_country(self, country, size=None):
+        try:
+            pool = self.driver_manager.get_amazon_pool(country.code)
+            # درایورهای جایگزین (recycle) و ساخته شده در keep-warm هم با همین تنظیم موقعیت آماده می‌شوند
+            pool.setup = lambda driver: self.geo_manager.configure_location(driver, country)
+            created = pool.prewarm(size if size is not None else self.driver_manager.get_warm_size(country.code))
+            self.countries[country.code] = country
+            return created
+        except Exception as e:
+            logger.error(f"❌ Could not warm up drivers for {country.code}: {e}")
+            return 0
+        finally:
+            # هر thread کانکشن دیتابیس خودش را دارد
+            connection.close()
+
+    def keep_warm(self):
+        """جبران درایورهای گرم از دست رفته (بسته شده توسط heartbeat، recycle یا خطا) کشورهای گرم شده"""
+        for code in list(self.countries):
+            try:
+                created = self.driver_manager.get_amazon_pool(code).prewarm(self.driver_manager.get_warm_size(code))
+                if created:
+                    logger.info(f"🔥 Keep-warm {code}: {created} drivers created")
+            except Exception as e:
+                logger.warning(f"⚠️ Keep-warm failed for {code}: {e}")
+
+    def start(self, country_codes=None, interval=None):
+        """warm-up و سپس keep-warm دوره‌ای در یک thread پس‌زمینه (هر پروسه یک بار)"""
+        if self._keepalive_thread and self._keepalive_thread.is_alive():
+            return self._keepalive_thread
+
+        interval = interval or getattr(settings, 'AMAZON_DRIVER_KEEPALIVE_INTERVAL', 60)
+
+        def run():
+            try:
+                self.warm_up(country_codes)
+            except Exception as e:
+                logger.error(f"❌ Amazon driver warm-up failed: {e}")
+            finally:
+                connection.close()
+            while not self._stop.wait(interval):
+                try:
+                    self.keep_warm()
+                finally:
+                    connection.close()
+
+        self._stop.clear()
+        self._keepalive_thread = threading.Thread(target=run, name='amazon_driver_warmer', daemon=True)
+        self._keepalive_thread.start()
+        return self._keepalive_thread
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,99 @@
+# amazon_app/freshness.py
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import AmazonProduct
+
+logger = logging.getLogger(__name__)
+
+
+class CrawlFreshnessPolicy:
+    """سیاست تازگی داده: محصولی که کمتر از TTL پیش کراول شده دوباره کراول نمی‌شود"""
+
+    LOCK_PREFIX = 'amazon:single_flight'
+
+    def __init__(self, redis_alias='default'):
+        self.redis_alias = redis_alias
+        self._redis = None
+        self._local_locks = {}
+        self._local_guard = threading.Lock()
+
+    def get_ttl(self, country_code, caller=None):
+        """TTL (ثانیه) - اولویت: تنظیم caller، بعد کشور، بعد پیش‌فرض"""
+        by_caller = getattr(settings, 'AMAZON_FRESHNESS_TTL_BY_CALLER', {})
+        if caller and caller.lower() in by_caller:
+            return int(by_caller[caller.lower()])
+
+        by_country = getattr(settings, 'AMAZON_FRESHNESS_TTL_BY_COUNTRY', {})
+        return int(by_country.get(country_code.upper(), getattr(settings, 'AMAZON_FRESHNESS_TTL', 6 * 60 * 60)))
+
+    def fresh_since(self, country_code, caller=None):
+        """محصولاتی که بعد از این زمان کراول شده‌اند تازه حساب می‌شوند (None = غیرفعال)"""
+        ttl = self.get_ttl(country_code, caller)
+        if ttl <= 0:
+            return None
+        return timezone.now() - timedelta(seconds=ttl)
+
+    def get_fresh_product(self, asin, country_code, caller=None):
+        """محصول ذخیره شده اگر هنوز در TTL باشد"""
+        since = self.fresh_since(country_code, caller)
+        if since is None:
+            return None
+        return AmazonProduct.objects.filter(
+            asin=asin, country_code=country_code, last_crawled__gte=since
+        ).first()
+
+    def get_fresh_asins(self, asins, country_code, caller=None):
+        """ASIN هایی از لیست که داده تازه دارند (یک کوئری)"""
+        since = self.fresh_since(country_code, caller)
+        if since is None or not asins:
+            return set()
+        return set(
+            AmazonProduct.objects.filter(
+                asin__in=asins, country_code=country_code, last_crawled__gte=since
+            ).values_list('asin', flat=True)
+        )
+
+    # Single-flight
+    def _get_redis(self):
+        if self._redis is None:
+            from django_redis import get_redis_connection
+
+            self._redis = get_redis_connection(self.redis_alias)
+        return self._redis
+
+    @contextmanager
+    def single_flight(self, asin, country_code):
+        """فقط یک کراول هم‌زمان برای هر ASIN/کشور - بقیه منتظر نتیجه همان کراول می‌مانند"""
+        key = f"{self.LOCK_PREFIX}:{country_code}:{asin}"
+        timeout = getattr(settings, 'AMAZON_SINGLE_FLIGHT_TIMEOUT', 180)
+
+        acquired = False
+        try:
+            lock = self._get_redis().lock(key, timeout=timeout, blocking_timeout=timeout)
+            acquired = lock.acquire()
+        except Exception as e:
+            logger.warning(f"⚠️ Redis single-flight lock unavailable, using local lock: {e}")
+            lock = self._local_lock(key)
+            acquired = lock.acquire(timeout=timeout)
+
+        if not acquired:
+            logger.warning(f"⏳ Single-flight wait timed out for {asin} ({country_code}), crawling anyway")
+
+        try:
+            yield
+        finally:
+            if acquired:
+                try:
+                    lock.release()
+                except Exception as e:
+                    logger.debug(f"Single-flight lock {key} already released: {e}")
+
+    def _local_lock(self, key):
+        with self._local_guard:
+            return self._local_locks.setdefault(key, threading.Lock())
@@ -1,5 +1,6 @@
 # amazon_app/geo_manager.py
 import logging
+import threading
 import time
 import re
 from selenium.webdriver.common.by import By
@@ -9,17 +10,77 @@ from selenium.common.exceptions import TimeoutException, NoSuchElementException
 
 logger = logging.getLogger(__name__)
 
+# متن دکمه موقعیت در هدر صفحات آمازون (مثال: "New York 10001")
+GLOW_INGRESS_PATTERN = re.compile(r'id="glow-ingress-line2"[^>]*>\s*([^<]*)<')
+ZIP_PATTERN = re.compile(r'\b\d{5}\b')
+
 
 class AmazonGeoManager:
     """مدیریت موقعیت جغرافیایی برای آمازون"""
 
     def __init__(self, driver_manager):
         self.driver_manager = driver_manager
+        # وضعیت موقعیت تنظیم شده برای هر session درایور: {session_id: {'domain', 'zip_code', 'currency'}}
+        self._session_state = {}
+        self._state_lock = threading.Lock()
+
+    def _expected_location(self, country):
+        return {
+            'domain': country.amazon_domain,
+            'zip_code': country.default_zip_code or '',
+            'currency': country.default_currency.code if country.default_currency else '',
+        }
+
+    def is_location_cached(self, driver, country):
+        """آیا موقعیت این کشور قبلاً روی همین session درایور تنظیم شده؟"""
+        with self._state_lock:
+            state = self._session_state.get(driver.session_id)
+        return state == self._expected_location(country)
+
+    def invalidate(self, driver):
+        """فراموش کردن وضعیت موقعیت session درایور (مثلاً بعد از دیدن mismatch)"""
+        with self._state_lock:
+            self._session_state.pop(getattr(driver, 'session_id', None), None)
+
+    def verify_page_location(self, driver, country, page_source):
+        """بررسی ارزان موقعیت از روی HTML صفحه محصول - False یعنی mismatch و نیاز به تنظیم مجدد"""
+        current_domain = self.driver_manager.get_domain_from_url(driver.current_url)
+        if current_domain and country.amazon_domain not in current_domain:
+            logger.warning(f"🌍 Domain mismatch on product page: {current_domain} != {country.amazon_domain}")
+            self.invalidate(driver)
+            return False
 
-    def configure_location(self, driver, country):
+        if country.default_zip_code and page_source:
+            ingress_match = GLOW_INGRESS_PATTERN.search(page_source)
+            if ingress_match:
+                ingress_text = ingress_match.group(1)
+                zip_match = ZIP_PATTERN.search(ingress_text)
+                if country.default_zip_code not in ingress_text and zip_match:
+                    logger.warning(
+                        f"📮 ZIP mismatch on product page: {zip_match.group()} != {country.default_zip_code}"
+                    )
+                    self.invalidate(driver)
+                    return False
+
+        return True
+
+    def configure_location(self, driver, country, force=False):
         """تنظیم موقعیت در آمازون فقط اگر نیاز باشد"""
+        seeded_location = self.driver_manager.pop_seeded_location(driver)
+        if not force and seeded_location and seeded_location == self._expected_location(country):
+            # درایور با کوکی‌های همین موقعیت ساخته شده - صحت آن روی صفحه محصول بررسی می‌شود
+            logger.info(f"🍪 Amazon location for {country.name} restored from saved cookies")
+            with self._state_lock:
+                self._session_state[driver.session_id] = seeded_location
+            return True
+
+        if not force and self.is_location_cached(driver, country):
+            logger.debug(f"🌍 Amazon location already configured for {country.name} on this session")
+            return True
+
         try:
             logger.info(f"🌍 Checking Amazon location for {country.name}")
+            location_ok = True
 
             # 1. بررسی آیا در دامنه صحیح هستیم
             if not self._is_on_correct_domain(driver, country.amazon_domain):
@@ -34,6 +95,7 @@ class AmazonGeoManager:
             if zip_needed:
                 success = self._set_amazon_zip_code(driver, country.default_zip_code)
                 if not success:
+                    location_ok = False
                     logger.warning("⚠️ Failed to set ZIP code, but continuing...")
             else:
                 logger.info("✅ ZIP code already set correctly")
@@ -42,11 +104,19 @@ class AmazonGeoManager:
             if country.default_currency and not self._is_currency_set(driver, country.default_currency.code):
                 currency_success = self._set_amazon_currency(driver, country.default_currency.code)
                 if not currency_success:
+                    location_ok = False
                     logger.warning(f"⚠️ Failed to set currency to {country.default_currency.code}, but continuing...")
             else:
                 currency_code = country.default_currency.code if country.default_currency else country.get_currency_code()
                 logger.info(f"✅ Currency already set correctly to {currency_code}")
 
+            # فقط وقتی همه چیز تأیید شد برای این session کش می‌کنیم تا دفعه بعد دوباره تلاش شود
+            if location_ok:
+                expected_location = self._expected_location(country)
+                with self._state_lock:
+                    self._session_state[driver.session_id] = expected_location
+                self.driver_manager.save_country_cookies(country.code, driver, expected_location)
+
             logger.info(f"✅ Amazon location verified for {country.name}")
             return True
 
@@ -0,0 +1,31 @@
+# amazon_app/management/commands/manage_price_partitions.py
+from django.core.management.base import BaseCommand
+
+from amazon_app.partitions import PricePartitionManager
+
+
+class Command(BaseCommand):
+    help = 'Create upcoming monthly partitions of amazon_product_prices and retire old ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, help='Number of future monthly partitions to keep ready')
+        parser.add_argument('--retention-months', type=int, help='Months of price history to keep (0 = keep all)')
+        parser.add_argument('--action', choices=['detach', 'drop'], help='What to do with expired partitions')
+
+    def handle(self, *args, **options):
+        manager = PricePartitionManager(
+            months_ahead=options['months_ahead'],
+            retention_months=options['retention_months'],
+            retention_action=options['action'],
+        )
+        if not manager.is_partitioned():
+            self.stdout.write(self.style.WARNING(f'⚠️ {manager.TABLE} is not a partitioned table, nothing to do'))
+            return
+
+        result = manager.maintain()
+        for name in result['created']:
+            self.stdout.write(self.style.SUCCESS(f'✅ Created {name}'))
+        for name in result['retired']:
+            self.stdout.write(self.style.SUCCESS(f'🧹 Retired {name} ({manager.retention_action})'))
+        if not result['created'] and not result['retired']:
+            self.stdout.write('👌 Partitions are up to date')
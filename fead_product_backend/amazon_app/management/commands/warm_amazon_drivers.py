@@ -0,0 +1,33 @@
+# amazon_app/management/commands/warm_amazon_drivers.py
+from django.core.management.base import BaseCommand
+
+from amazon_app.amazon_crawler import AmazonCrawlerService
+from amazon_app.driver_warmup import AmazonDriverWarmer
+
+
+class Command(BaseCommand):
+    help = (
+        'Refresh the saved Amazon cookie jars by creating and geo-configuring a driver for every active '
+        'crawling country, then closing it. Driver pools are per process, so this does not leave warm drivers '
+        'in the Celery workers; for that enable AMAZON_DRIVER_WARMUP_ON_WORKER_START on the crawl worker'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--country', action='append', dest='countries', help='Country code (repeatable)')
+        parser.add_argument('--size', type=int, default=1, help='Drivers per country (default: 1)')
+
+    def handle(self, *args, **options):
+        crawler_service = AmazonCrawlerService()
+        warmer = AmazonDriverWarmer(crawler_service)
+        try:
+            results = warmer.warm_up(options['countries'], size=options['size'])
+            if not results:
+                self.stdout.write(self.style.WARNING('⚠️ No active crawling countries to warm up'))
+                return
+
+            for code, created in results.items():
+                self.stdout.write(self.style.SUCCESS(f'🍪 {code}: location configured on {created} drivers'))
+        finally:
+            # درایورهای این پروسه به کار کراول نمی‌آیند؛ فقط کوکی‌های ذخیره شده تازه شده‌اند
+            for pool in crawler_service.driver_manager.driver_manager.pools.values():
+                pool.close()
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amazon_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AmazonCrawlOutcome',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('asin', models.CharField(max_length=10, verbose_name='ASIN')),
+                ('status', models.CharField(choices=[('SUCCESS', 'Success'), ('FAILED', 'Failed'), ('SAVE_FAILED', 'Save Failed')], max_length=12, verbose_name='Status')),
+                ('duration_ms', models.PositiveIntegerField(default=0, verbose_name='Duration (ms)')),
+                ('error_class', models.CharField(blank=True, max_length=100, verbose_name='Error Class')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='outcomes', to='amazon_app.amazoncrawlsession', verbose_name='Session')),
+            ],
+            options={
+                'db_table': 'amazon_crawl_outcomes',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['session', 'status'], name='amazon_craw_session_5fedc2_idx'), models.Index(fields=['asin'], name='amazon_craw_asin_5445d5_idx')],
+            },
+        ),
+    ]
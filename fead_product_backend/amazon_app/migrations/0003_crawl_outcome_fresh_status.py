@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amazon_app', '0002_crawl_outcome'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='amazoncrawloutcome',
+            name='status',
+            field=models.CharField(choices=[('SUCCESS', 'Success'), ('FAILED', 'Failed'), ('SAVE_FAILED', 'Save Failed'), ('FRESH', 'Skipped (Fresh)')], max_length=12, verbose_name='Status'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amazon_app', '0003_crawl_outcome_fresh_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='amazonproductprice',
+            name='last_seen_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Last Seen At'),
+        ),
+        migrations.AddField(
+            model_name='amazonproductprice',
+            name='observation_count',
+            field=models.PositiveIntegerField(default=1, verbose_name='Observation Count'),
+        ),
+        migrations.AddIndex(
+            model_name='amazonproductprice',
+            index=models.Index(fields=['product', 'last_seen_at'], name='amazon_prod_product_11d145_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amazon_app', '0004_price_run_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AmazonPriceHourlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField(verbose_name='Bucket Start')),
+                ('min_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Min Price')),
+                ('max_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Max Price')),
+                ('avg_price', models.DecimalField(decimal_places=4, max_digits=12, verbose_name='Average Price')),
+                ('first_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='First Price')),
+                ('last_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Last Price')),
+                ('first_seen', models.DateTimeField(verbose_name='First Seen')),
+                ('last_seen', models.DateTimeField(verbose_name='Last Seen')),
+                ('record_count', models.PositiveIntegerField(default=0, verbose_name='Record Count')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='amazon_app.amazonproduct', verbose_name='Product')),
+            ],
+            options={
+                'db_table': 'amazon_price_rollup_hourly',
+                'ordering': ['bucket_start'],
+                'abstract': False,
+                'unique_together': {('product', 'bucket_start')},
+            },
+        ),
+        migrations.CreateModel(
+            name='AmazonPriceDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField(verbose_name='Bucket Start')),
+                ('min_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Min Price')),
+                ('max_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Max Price')),
+                ('avg_price', models.DecimalField(decimal_places=4, max_digits=12, verbose_name='Average Price')),
+                ('first_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='First Price')),
+                ('last_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Last Price')),
+                ('first_seen', models.DateTimeField(verbose_name='First Seen')),
+                ('last_seen', models.DateTimeField(verbose_name='Last Seen')),
+                ('record_count', models.PositiveIntegerField(default=0, verbose_name='Record Count')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='amazon_app.amazonproduct', verbose_name='Product')),
+            ],
+            options={
+                'db_table': 'amazon_price_rollup_daily',
+                'ordering': ['bucket_start'],
+                'abstract': False,
+                'unique_together': {('product', 'bucket_start')},
+            },
+        ),
+    ]
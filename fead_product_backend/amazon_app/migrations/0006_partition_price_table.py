@@ -0,0 +1,93 @@
+# تبدیل amazon_product_prices به جدول پارتیشن‌بندی ماهانه روی crawl_timestamp (فقط PostgreSQL)
+
+from django.db import migrations
+from django.utils import timezone
+
+TABLE = 'amazon_product_prices'
+LEGACY_TABLE = 'amazon_product_prices_unpartitioned'
+MONTHS_AHEAD = 3
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+def partition_prices(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s", [TABLE])
+        row = cursor.fetchone()
+        if row and row[0] == 'p':
+            return
+
+        cursor.execute(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE")
+
+        # ایندکس‌ها و کلیدهای خارجی با همان نام روی جدول جدید ساخته می‌شوند تا state جنگو معتبر بماند
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND indexname NOT IN ("
+            "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p')",
+            [TABLE, TABLE]
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [TABLE]
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute("SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'", [TABLE])
+        primary_key = cursor.fetchone()[0]
+        cursor.execute(f"SELECT min(crawl_timestamp) FROM {TABLE}")
+        oldest = cursor.fetchone()[0] or timezone.now()
+
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {LEGACY_TABLE}")
+        for name, _ in indexes:
+            cursor.execute(f'DROP INDEX "{name}"')
+        for name, _ in foreign_keys:
+            cursor.execute(f'ALTER TABLE {LEGACY_TABLE} DROP CONSTRAINT "{name}"')
+        # نام ایندکس کلید اصلی و sequence برای جدول جدید آزاد می‌شود
+        cursor.execute(f'ALTER TABLE {LEGACY_TABLE} DROP CONSTRAINT "{primary_key}"')
+        cursor.execute(f"ALTER TABLE {LEGACY_TABLE} ALTER COLUMN id DROP IDENTITY IF EXISTS")
+
+        # کلید اصلی جدول پارتیشن‌بندی شده باید ستون پارتیشن را شامل شود
+        cursor.execute(
+            f"CREATE TABLE {TABLE} (LIKE {LEGACY_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS, "
+            f"PRIMARY KEY (id, crawl_timestamp)) PARTITION BY RANGE (crawl_timestamp)"
+        )
+        cursor.execute(f"CREATE SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id")
+        cursor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{TABLE}_id_seq')")
+
+        month = timezone.localtime(oldest).date().replace(day=1)
+        last_month = _add_months(timezone.localdate().replace(day=1), MONTHS_AHEAD)
+        while month <= last_month:
+            next_month = _add_months(month, 1)
+            cursor.execute(
+                f"CREATE TABLE {TABLE}_p{month:%Y_%m} PARTITION OF {TABLE} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month.isoformat()}')"
+            )
+            month = next_month
+        cursor.execute(f"CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT")
+
+        for _, definition in indexes:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT "{name}" {definition}')
+
+        cursor.execute(f"INSERT INTO {TABLE} SELECT * FROM {LEGACY_TABLE}")
+        cursor.execute(f"SELECT setval('{TABLE}_id_seq', COALESCE((SELECT max(id) FROM {TABLE}), 0) + 1, false)")
+        cursor.execute(f"DROP TABLE {LEGACY_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amazon_app', '0005_price_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_prices, migrations.RunPython.noop),
+    ]
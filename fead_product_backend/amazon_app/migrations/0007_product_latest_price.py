@@ -0,0 +1,67 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:59
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_latest_price(apps, schema_editor):
+    AmazonProduct = apps.get_model('amazon_app', 'AmazonProduct')
+    AmazonProductPrice = apps.get_model('amazon_app', 'AmazonProductPrice')
+
+    latest = AmazonProductPrice.objects.filter(product_id=OuterRef('pk')).order_by('-crawl_timestamp')
+    AmazonProduct.objects.filter(pk__in=AmazonProductPrice.objects.values('product_id')).update(
+        latest_price=Subquery(latest.values('price')[:1]),
+        latest_price_currency=Subquery(latest.values('currency')[:1]),
+        latest_price_seller=Subquery(latest.values('seller')[:1]),
+        latest_price_availability=Subquery(latest.values('availability')[:1]),
+        latest_price_at=Subquery(latest.values('crawl_timestamp')[:1]),
+        latest_price_seen_at=Subquery(
+            latest.annotate(seen_until=Coalesce('last_seen_at', 'crawl_timestamp')).values('seen_until')[:1]
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amazon_app', '0006_partition_price_table'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='amazonproduct',
+            name='latest_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Latest Price'),
+        ),
+        migrations.AddField(
+            model_name='amazonproduct',
+            name='latest_price_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Latest Price Since'),
+        ),
+        migrations.AddField(
+            model_name='amazonproduct',
+            name='latest_price_availability',
+            field=models.BooleanField(blank=True, null=True, verbose_name='Latest Price Availability'),
+        ),
+        migrations.AddField(
+            model_name='amazonproduct',
+            name='latest_price_currency',
+            field=models.CharField(blank=True, max_length=3, verbose_name='Latest Price Currency'),
+        ),
+        migrations.AddField(
+            model_name='amazonproduct',
+            name='latest_price_seen_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Latest Price Seen At'),
+        ),
+        migrations.AddField(
+            model_name='amazonproduct',
+            name='latest_price_seller',
+            field=models.CharField(blank=True, max_length=200, verbose_name='Latest Price Seller'),
+        ),
+        migrations.AddIndex(
+            model_name='amazonproduct',
+            index=models.Index(fields=['latest_price'], name='amazon_prod_latest__347f76_idx'),
+        ),
+        migrations.RunPython(backfill_latest_price, migrations.RunPython.noop),
+    ]
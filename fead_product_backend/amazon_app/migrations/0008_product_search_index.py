@@ -0,0 +1,86 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:03
+
+import django.contrib.postgres.search
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+from django.db.models.functions import Upper
+
+SEARCH_INDEXES = [
+    GinIndex(fields=['search_vector'], name='amazon_prod_search_gin'),
+    GinIndex(OpClass(Upper('title'), name='gin_trgm_ops'), name='amazon_prod_title_trgm'),
+    GinIndex(OpClass(Upper('brand'), name='gin_trgm_ops'), name='amazon_prod_brand_trgm'),
+    GinIndex(OpClass(Upper('category'), name='gin_trgm_ops'), name='amazon_prod_category_trgm'),
+    GinIndex(OpClass(Upper('asin'), name='gin_trgm_ops'), name='amazon_prod_asin_trgm'),
+]
+
+# بردار وزن‌دار: عنوان A، برند B، دسته C - پیکربندی simple چون کاتالوگ چند زبانه است
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('simple', coalesce({row}title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce({row}brand, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce({row}category, '')), 'C')"
+)
+
+
+def create_search_indexes(apps, schema_editor):
+    # ایندکس‌های GIN فقط روی PostgreSQL ساخته می‌شوند؛ state جنگو در هر حال آن‌ها را دارد
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    AmazonProduct = apps.get_model('amazon_app', 'AmazonProduct')
+    for index in SEARCH_INDEXES:
+        schema_editor.add_index(AmazonProduct, index)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for index in SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{index.name}"')
+
+
+def create_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "CREATE OR REPLACE FUNCTION amazon_products_search_vector_update() RETURNS trigger AS $$ "
+        f"BEGIN NEW.search_vector := {SEARCH_VECTOR_SQL.format(row='NEW.')}; RETURN NEW; END "
+        "$$ LANGUAGE plpgsql"
+    )
+    schema_editor.execute(
+        "CREATE TRIGGER amazon_products_search_vector_trigger "
+        "BEFORE INSERT OR UPDATE OF title, brand, category ON amazon_products "
+        "FOR EACH ROW EXECUTE FUNCTION amazon_products_search_vector_update()"
+    )
+    schema_editor.execute(f"UPDATE amazon_products SET search_vector = {SEARCH_VECTOR_SQL.format(row='')}")
+
+
+def drop_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP TRIGGER IF EXISTS amazon_products_search_vector_trigger ON amazon_products")
+    schema_editor.execute("DROP FUNCTION IF EXISTS amazon_products_search_vector_update()")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amazon_app', '0007_product_latest_price'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='amazonproduct',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Search Vector'),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name='amazonproduct', index=index) for index in SEARCH_INDEXES
+            ],
+            database_operations=[
+                migrations.RunPython(create_search_indexes, drop_search_indexes),
+            ],
+        ),
+        migrations.RunPython(create_search_trigger, drop_search_trigger),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amazon_app', '0008_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='amazonproduct',
+            index=models.Index(fields=['latest_price_seen_at'], name='amazon_prod_latest__a06d25_idx'),
+        ),
+    ]
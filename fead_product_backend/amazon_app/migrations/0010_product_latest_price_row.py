@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:23
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_latest_price_row(apps, schema_editor):
+    AmazonProduct = apps.get_model('amazon_app', 'AmazonProduct')
+    AmazonProductPrice = apps.get_model('amazon_app', 'AmazonProductPrice')
+
+    latest = AmazonProductPrice.objects.filter(product_id=OuterRef('pk')).order_by('-crawl_timestamp')
+    AmazonProduct.objects.filter(latest_price__isnull=False).update(
+        latest_price_row_id=Subquery(latest.values('pk')[:1]),
+        latest_price_shipping_info=Subquery(latest.values('shipping_info')[:1]),
+        latest_price_observation_count=Subquery(latest.values('observation_count')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amazon_app', '0009_product_latest_price_seen_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='amazonproduct',
+            name='latest_price_observation_count',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Latest Price Observation Count'),
+        ),
+        migrations.AddField(
+            model_name='amazonproduct',
+            name='latest_price_row_id',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='Latest Price Row ID'),
+        ),
+        migrations.AddField(
+            model_name='amazonproduct',
+            name='latest_price_shipping_info',
+            field=models.TextField(blank=True, verbose_name='Latest Price Shipping Info'),
+        ),
+        migrations.RunPython(backfill_latest_price_row, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amazon_app', '0010_product_latest_price_row'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='amazonproduct',
+            name='amazon_prod_rating_592cde_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='amazonproduct',
+            name='amazon_prod_latest__347f76_idx',
+        ),
+        migrations.AddIndex(
+            model_name='amazonproduct',
+            index=models.Index(models.OrderBy(models.F('last_crawled'), descending=True, nulls_last=True), models.OrderBy(models.F('id'), descending=True), name='amazon_prod_crawled_keyset'),
+        ),
+        migrations.AddIndex(
+            model_name='amazonproduct',
+            index=models.Index(models.OrderBy(models.F('rating'), descending=True, nulls_last=True), models.OrderBy(models.F('id'), descending=True), name='amazon_prod_rating_keyset'),
+        ),
+        migrations.AddIndex(
+            model_name='amazonproduct',
+            index=models.Index(models.OrderBy(models.F('review_count'), descending=True, nulls_last=True), models.OrderBy(models.F('id'), descending=True), name='amazon_prod_reviews_keyset'),
+        ),
+        migrations.AddIndex(
+            model_name='amazonproduct',
+            index=models.Index(models.OrderBy(models.F('latest_price'), descending=True, nulls_last=True), models.OrderBy(models.F('id'), descending=True), name='amazon_prod_price_keyset'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amazon_app', '0011_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AmazonPriceRollupState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Name')),
+                ('watermark', models.DateTimeField(blank=True, null=True, verbose_name='Watermark')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+            ],
+            options={
+                'db_table': 'amazon_price_rollup_state',
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='amazonproduct',
+            name='amazon_prod_latest__a06d25_idx',
+        ),
+    ]
@@ -1,5 +1,9 @@
 # amazon_app/models.py
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Upper
 from django.utils import timezone
 from django.core.validators import MinValueValidator
 
@@ -53,6 +57,20 @@ class AmazonProduct(models.Model):
     last_crawled = models.DateTimeField(null=True, blank=True, verbose_name="Last Crawled")
     is_active = models.BooleanField(default=True, verbose_name="Is Active")
 
+    # خلاصه آخرین قیمت - هم‌زمان با ثبت قیمت در همان تراکنش بروز می‌شود
+    latest_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name="Latest Price")
+    latest_price_currency = models.CharField(max_length=3, blank=True, verbose_name="Latest Price Currency")
+    latest_price_seller = models.CharField(max_length=200, blank=True, verbose_name="Latest Price Seller")
+    latest_price_availability = models.BooleanField(null=True, blank=True, verbose_name="Latest Price Availability")
+    latest_price_at = models.DateTimeField(null=True, blank=True, verbose_name="Latest Price Since")
+    latest_price_seen_at = models.DateTimeField(null=True, blank=True, verbose_name="Latest Price Seen At")
+    latest_price_row_id = models.BigIntegerField(null=True, blank=True, verbose_name="Latest Price Row ID")
+    latest_price_shipping_info = models.TextField(blank=True, verbose_name="Latest Price Shipping Info")
+    latest_price_observation_count = models.PositiveIntegerField(null=True, blank=True, verbose_name="Latest Price Observation Count")
+
+    # بردار جستجوی وزن‌دار عنوان/برند/دسته - توسط trigger دیتابیس بروز می‌شود (migration 0008)
+    search_vector = SearchVectorField(null=True, editable=False, verbose_name="Search Vector")
+
     class Meta:
         db_table = 'amazon_products'
         indexes = [
@@ -60,8 +78,18 @@ class AmazonProduct(models.Model):
             models.Index(fields=['country_code']),
             models.Index(fields=['brand']),
             models.Index(fields=['category']),
-            models.Index(fields=['rating']),
             models.Index(fields=['seller']),  # 🔥 اضافه کردن ایندکس برای فروشنده
+            # ایندکس‌های keyset هم‌ترتیب با مرتب‌سازی لیست محصولات (KeysetPaginator): (field DESC NULLS LAST, id DESC)
+            models.Index(F('last_crawled').desc(nulls_last=True), F('id').desc(), name='amazon_prod_crawled_keyset'),
+            models.Index(F('rating').desc(nulls_last=True), F('id').desc(), name='amazon_prod_rating_keyset'),
+            models.Index(F('review_count').desc(nulls_last=True), F('id').desc(), name='amazon_prod_reviews_keyset'),
+            models.Index(F('latest_price').desc(nulls_last=True), F('id').desc(), name='amazon_prod_price_keyset'),
+            GinIndex(fields=['search_vector'], name='amazon_prod_search_gin'),
+            # trigram روی UPPER() تا icontains جنگو و جستجوی تقریبی از ایندکس استفاده کنند
+            GinIndex(OpClass(Upper('title'), name='gin_trgm_ops'), name='amazon_prod_title_trgm'),
+            GinIndex(OpClass(Upper('brand'), name='gin_trgm_ops'), name='amazon_prod_brand_trgm'),
+            GinIndex(OpClass(Upper('category'), name='gin_trgm_ops'), name='amazon_prod_category_trgm'),
+            GinIndex(OpClass(Upper('asin'), name='gin_trgm_ops'), name='amazon_prod_asin_trgm'),
         ]
         ordering = ['-created_at']
         unique_together = ['asin', 'country_code']
@@ -72,6 +100,24 @@ class AmazonProduct(models.Model):
     def get_amazon_url(self):
         return f"https://www.{self.domain}/dp/{self.asin}"
 
+    def get_latest_price_snapshot(self):
+        """آخرین ردیف قیمت از فیلدهای خلاصه (بدون کوئری روی جدول قیمت‌ها) - نمونه ذخیره نشده AmazonProductPrice"""
+        if self.latest_price is None:
+            return None
+        return AmazonProductPrice(
+            id=self.latest_price_row_id,
+            product=self,
+            price=self.latest_price,
+            currency=self.latest_price_currency,
+            country_code=self.country_code,
+            seller=self.latest_price_seller,
+            availability=self.latest_price_availability,
+            shipping_info=self.latest_price_shipping_info,
+            crawl_timestamp=self.latest_price_at,
+            last_seen_at=self.latest_price_seen_at,
+            observation_count=self.latest_price_observation_count or 1,
+        )
+
 class AmazonProductPrice(models.Model):
     CURRENCY_CHOICES = [
         ('USD', 'US Dollar'),
@@ -106,12 +152,17 @@ class AmazonProductPrice(models.Model):
     delivery_date = models.CharField(max_length=100, blank=True, verbose_name="Delivery Date")
     crawl_source = models.CharField(max_length=100, verbose_name="Crawl Source")
     crawl_timestamp = models.DateTimeField(default=timezone.now, verbose_name="Crawl Timestamp")
+    # ذخیره فقط-تغییرات: مشاهدات بعدی بدون تغییر فقط این دو فیلد را جلو می‌برند
+    last_seen_at = models.DateTimeField(null=True, blank=True, verbose_name="Last Seen At")
+    observation_count = models.PositiveIntegerField(default=1, verbose_name="Observation Count")
     metadata = models.JSONField(default=dict, blank=True, verbose_name="Metadata")
 
     class Meta:
+        # در PostgreSQL پارتیشن‌بندی ماهانه روی crawl_timestamp (migration 0006 و manage_price_partitions)
         db_table = 'amazon_product_prices'
         indexes = [
             models.Index(fields=['product', 'crawl_timestamp']),
+            models.Index(fields=['product', 'last_seen_at']),
             models.Index(fields=['country_code', 'crawl_timestamp']),
             models.Index(fields=['crawl_timestamp']),
             models.Index(fields=['price']),
@@ -121,6 +172,11 @@ class AmazonProductPrice(models.Model):
     def __str__(self):
         return f"{self.product.asin} - {self.country_code} - ${self.price} - {self.crawl_timestamp.strftime('%Y-%m-%d %H:%M')}"
 
+    @property
+    def seen_until(self):
+        """آخرین زمانی که این قیمت دیده شده (برای ردیف‌های قدیمی همان زمان کراول)"""
+        return self.last_seen_at or self.crawl_timestamp
+
 class AmazonCrawlSession(models.Model):
     STATUS_CHOICES = [
         ('PENDING', 'Pending'),
@@ -159,4 +215,83 @@ class AmazonCrawlSession(models.Model):
         ordering = ['-started_at']
 
     def __str__(self):
-        return f"Session {self.session_id} - {self.country_code} - {self.status}"
\ No newline at end of file
+        return f"Session {self.session_id} - {self.country_code} - {self.status}"
+
+
+class AmazonCrawlOutcome(models.Model):
+    """نتیجه هر ASIN در یک session کراول (فقط اضافه می‌شود، آپدیت نمی‌شود)"""
+    STATUS_CHOICES = [
+        ('SUCCESS', 'Success'),
+        ('FAILED', 'Failed'),
+        ('SAVE_FAILED', 'Save Failed'),
+        ('FRESH', 'Skipped (Fresh)'),
+    ]
+    # وضعیت‌هایی که شکست حساب نمی‌شوند (نه در failed_items و نه در کراول مجدد)
+    SUCCESS_STATUSES = ('SUCCESS', 'FRESH')
+
+    session = models.ForeignKey(AmazonCrawlSession, on_delete=models.CASCADE, related_name='outcomes', verbose_name="Session")
+    asin = models.CharField(max_length=10, verbose_name="ASIN")
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES, verbose_name="Status")
+    duration_ms = models.PositiveIntegerField(default=0, verbose_name="Duration (ms)")
+    error_class = models.CharField(max_length=100, blank=True, verbose_name="Error Class")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Created At")
+
+    class Meta:
+        db_table = 'amazon_crawl_outcomes'
+        indexes = [
+            models.Index(fields=['session', 'status']),
+            models.Index(fields=['asin']),
+        ]
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.asin} - {self.status} ({self.duration_ms} ms)"
+
+
+class AmazonPriceRollup(models.Model):
+    """خلاصه قیمت هر محصول در یک بازه زمانی (توسط compactor نگهداری می‌شود)"""
+    product = models.ForeignKey(AmazonProduct, on_delete=models.CASCADE, related_name='+', verbose_name="Product")
+    bucket_start = models.DateTimeField(verbose_name="Bucket Start")
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Min Price")
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Max Price")
+    avg_price = models.DecimalField(max_digits=12, decimal_places=4, verbose_name="Average Price")
+    first_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="First Price")
+    last_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Last Price")
+    first_seen = models.DateTimeField(verbose_name="First Seen")
+    last_seen = models.DateTimeField(verbose_name="Last Seen")
+    record_count = models.PositiveIntegerField(default=0, verbose_name="Record Count")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Updated At")
+
+    class Meta:
+        abstract = True
+        unique_together = ['product', 'bucket_start']
+        ordering = ['bucket_start']
+
+
+class AmazonPriceDailyRollup(AmazonPriceRollup):
+    class Meta(AmazonPriceRollup.Meta):
+        db_table = 'amazon_price_rollup_daily'
+
+    def __str__(self):
+        return f"{self.product_id} - {self.bucket_start:%Y-%m-%d} - {self.avg_price}"
+
+
+class AmazonPriceHourlyRollup(AmazonPriceRollup):
+    class Meta(AmazonPriceRollup.Meta):
+        db_table = 'amazon_price_rollup_hourly'
+
+    def __str__(self):
+        return f"{self.product_id} - {self.bucket_start:%Y-%m-%d %H:00} - {self.avg_price}"
+
+
+class AmazonPriceRollupState(models.Model):
+    """وضعیت compactor جداول خلاصه: سطل‌های قبل از watermark نهایی و ساخته شده‌اند"""
+    name = models.CharField(max_length=50, unique=True, verbose_name="Name")
+    watermark = models.DateTimeField(null=True, blank=True, verbose_name="Watermark")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Updated At")
+
+    class Meta:
+        db_table = 'amazon_price_rollup_state'
+
+    def __str__(self):
+        return f"{self.name} - {self.watermark}"
@@ -0,0 +1,130 @@
+# amazon_app/pagination.py
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import BooleanField, F, Func, Value
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def estimate_count(queryset):
+    """تعداد تقریبی ردیف‌ها از برنامه اجرای PostgreSQL (بدون COUNT کامل) - روی سایر دیتابیس‌ها COUNT"""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class RowCompare(Func):
+    """مقایسه row-value مثل (field, id) < (v, pk) که PostgreSQL آن را به range scan ایندکس تبدیل می‌کند"""
+    output_field = BooleanField()
+
+    def __init__(self, lhs, operator, rhs):
+        super().__init__(*lhs, *rhs)
+        self.operator = operator
+        self.width = len(lhs)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sqls, params = [], []
+        for expression in self.get_source_expressions():
+            sql, expression_params = compiler.compile(expression)
+            sqls.append(sql)
+            params.extend(expression_params)
+        lhs, rhs = ', '.join(sqls[:self.width]), ', '.join(sqls[self.width:])
+        return f'({lhs}) {self.operator} ({rhs})', params
+
+
+class KeysetPaginator:
+    """صفحه‌بندی cursor (keyset) روی یک فیلد مرتب‌سازی + pk برای شکستن تساوی
+
+    هزینه هر صفحه مستقل از عمق آن است؛ مقادیر NULL در هر دو جهت آخر می‌آیند.
+    ردیف‌های غیر NULL با مقایسه row-value روی ایندکس (field DESC NULLS LAST, id DESC) خوانده می‌شوند
+    (صعودی با پیمایش معکوس همان ایندکس) و بعد از تمام شدن آن‌ها ردیف‌های NULL به ترتیب pk.
+    cursor = base64 از {'v': مقدار فیلد آخرین ردیف, 'pk': pk آخرین ردیف}
+    """
+
+    # sort_by های مجاز در API -> فیلد مدل (فقط فیلدهای ساده محصول؛ رابطه‌ها ردیف تکراری می‌دهند)
+    SORT_FIELDS = {
+        'last_crawled': 'last_crawled',
+        'rating': 'rating',
+        'review_count': 'review_count',
+        'price': 'latest_price',
+    }
+
+    def __init__(self, model, sort_by, sort_order='desc'):
+        self.model = model
+        if sort_by not in self.SORT_FIELDS:
+            raise InvalidCursor(f"Invalid sort field: {sort_by}")
+        self.field_name = self.SORT_FIELDS[sort_by]
+        self.field = model._meta.get_field(self.field_name)
+        self.descending = sort_order == 'desc'
+
+    def order(self, queryset):
+        field = F(self.field_name)
+        if self.descending:
+            return queryset.order_by(field.desc(nulls_last=True), '-pk')
+        return queryset.order_by(field.asc(nulls_last=True), 'pk')
+
+    # Cursor
+    def encode_cursor(self, obj):
+        value = getattr(obj, self.field.attname)
+        payload = {'v': self.field.value_to_string(obj) if value is not None else None, 'pk': obj.pk}
+        return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            value = payload['v']
+            return (self.field.to_python(value) if value is not None else None), int(payload['pk'])
+        except (ValueError, KeyError, TypeError, ValidationError):
+            raise InvalidCursor("Invalid cursor")
+
+    def _non_null_page(self, queryset, value, pk, limit):
+        """ردیف‌های غیر NULL بعد از (value, pk) - ترتیب منطبق بر ایندکس keyset در هر دو جهت"""
+        queryset = queryset.filter(**{f'{self.field_name}__isnull': False})
+        if pk is not None:
+            queryset = queryset.filter(RowCompare(
+                (F(self.field_name), F('pk')),
+                '<' if self.descending else '>',
+                (Value(value, output_field=self.field), Value(pk)),
+            ))
+
+        field = F(self.field_name)
+        if self.descending:
+            queryset = queryset.order_by(field.desc(nulls_last=True), '-pk')
+        else:
+            queryset = queryset.order_by(field.asc(nulls_first=True), 'pk')
+        return list(queryset[:limit])
+
+    def _null_page(self, queryset, pk, limit):
+        """ردیف‌های بدون مقدار، بعد از همه ردیف‌های غیر NULL، به ترتیب pk"""
+        queryset = queryset.filter(**{f'{self.field_name}__isnull': True})
+        if pk is not None:
+            queryset = queryset.filter(pk__lt=pk) if self.descending else queryset.filter(pk__gt=pk)
+        return list(queryset.order_by('-pk' if self.descending else 'pk')[:limit])
+
+    def paginate(self, queryset, page_size, cursor=None):
+        """یک صفحه: (items, next_cursor)"""
+        value, pk = self.decode_cursor(cursor) if cursor else (None, None)
+
+        items = []
+        # cursor روی ردیف NULL یعنی ردیف‌های غیر NULL قبلاً تمام شده‌اند
+        if pk is None or value is not None:
+            items = self._non_null_page(queryset, value, pk, page_size + 1)
+        if len(items) <= page_size:
+            null_after = pk if value is None else None
+            items += self._null_page(queryset, null_after, page_size + 1 - len(items))
+
+        next_cursor = self.encode_cursor(items[page_size - 1]) if len(items) > page_size else None
+        return items[:page_size], next_cursor
@@ -0,0 +1,157 @@
+# amazon_app/partitions.py
+import logging
+import re
+from datetime import date
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import AmazonProduct, AmazonProductPrice
+
+logger = logging.getLogger(__name__)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+class PricePartitionManager:
+    """نگهداری پارتیشن‌های ماهانه amazon_product_prices (PostgreSQL)
+
+    پارتیشن‌های ماه‌های آینده از قبل ساخته می‌شوند تا ردیفی در پارتیشن default نماند،
+    و پارتیشن‌های قدیمی‌تر از بازه نگهداری جدا (archive) یا حذف می‌شوند.
+    """
+
+    TABLE = AmazonProductPrice._meta.db_table
+    PARTITION_PATTERN = re.compile(r'_p(\d{4})_(\d{2})$')
+
+    def __init__(self, months_ahead=None, retention_months=None, retention_action=None):
+        self.months_ahead = months_ahead if months_ahead is not None else getattr(
+            settings, 'AMAZON_PRICE_PARTITION_MONTHS_AHEAD', 3
+        )
+        self.retention_months = retention_months if retention_months is not None else getattr(
+            settings, 'AMAZON_PRICE_RETENTION_MONTHS', 24
+        )
+        self.retention_action = retention_action or getattr(settings, 'AMAZON_PRICE_RETENTION_ACTION', 'detach')
+
+    def partition_name(self, month):
+        return f"{self.TABLE}_p{month:%Y_%m}"
+
+    def is_partitioned(self):
+        if connection.vendor != 'postgresql':
+            return False
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s", [self.TABLE])
+            row = cursor.fetchone()
+        return bool(row) and row[0] == 'p'
+
+    def list_partitions(self):
+        """پارتیشن‌های ماهانه متصل: {شروع ماه: نام جدول}"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT child.relname FROM pg_inherits "
+                "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+                "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+                "WHERE parent.relname = %s",
+                [self.TABLE]
+            )
+            names = [row[0] for row in cursor.fetchall()]
+
+        partitions = {}
+        for name in names:
+            match = self.PARTITION_PATTERN.search(name)
+            if match:
+                partitions[date(int(match.group(1)), int(match.group(2)), 1)] = name
+        return partitions
+
+    def maintain(self):
+        """ساخت پارتیشن‌های آینده + اعمال سیاست نگهداری"""
+        if not self.is_partitioned():
+            logger.info(f"ℹ️ {self.TABLE} is not partitioned, skipping partition maintenance")
+            return {'created': [], 'retired': []}
+
+        created = self.ensure_partitions()
+        retired = self.apply_retention()
+        return {'created': created, 'retired': retired}
+
+    # پارتیشن‌های آینده
+    def ensure_partitions(self):
+        existing = self.list_partitions()
+        current = timezone.now().date().replace(day=1)
+        created = []
+
+        for offset in range(self.months_ahead + 1):
+            month = add_months(current, offset)
+            if month not in existing:
+                self._create_partition(month)
+                created.append(self.partition_name(month))
+
+        if created:
+            logger.info(f"🗂️ Created price partitions: {', '.join(created)}")
+        return created
+
+    def _create_partition(self, month):
+        """ساخت پارتیشن ماه و انتقال ردیف‌های آن بازه از پارتیشن default (اگر باشد)"""
+        name = self.partition_name(month)
+        start, end = month.isoformat(), add_months(month, 1).isoformat()
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"CREATE TABLE {name} (LIKE {self.TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+            cursor.execute(
+                f"WITH moved AS (DELETE FROM {self.TABLE}_default "
+                f"WHERE crawl_timestamp >= %s AND crawl_timestamp < %s RETURNING *) "
+                f"INSERT INTO {name} SELECT * FROM moved",
+                [start, end]
+            )
+            cursor.execute(f"ALTER TABLE {self.TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)", [start, end])
+
+    # نگهداری
+    def apply_retention(self):
+        """جدا یا حذف کردن پارتیشن‌های قدیمی‌تر از AMAZON_PRICE_RETENTION_MONTHS (0 = نگهداری دائمی)"""
+        if self.retention_months <= 0:
+            return []
+
+        cutoff = add_months(timezone.now().date().replace(day=1), -self.retention_months)
+        retired = []
+        for month, name in sorted(self.list_partitions().items()):
+            if add_months(month, 1) > cutoff:
+                break
+            self._retire_partition(month, name)
+            retired.append(name)
+
+        if retired:
+            logger.info(f"🧹 Retired price partitions ({self.retention_action}): {', '.join(retired)}")
+        return retired
+
+    def _retire_partition(self, month, name):
+        boundary = add_months(month, 1).isoformat()
+        columns = [field.column for field in AmazonProductPrice._meta.concrete_fields if not field.primary_key]
+        # ادامه run از مرز پارتیشن شروع می‌شود و فقط آخرین مشاهده (last_seen_at) را نمایندگی می‌کند؛
+        # بقیه observation_count در پارتیشن قدیمی می‌ماند تا دوبار شمرده نشود
+        carried = {'crawl_timestamp': '%s', 'observation_count': '1'}
+        values = ', '.join(carried.get(column, column) for column in columns)
+        products_table = AmazonProduct._meta.db_table
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            # قیمتی که هنوز بعد از این ماه دیده می‌شود (run-length) از مرز پارتیشن ادامه پیدا می‌کند
+            # و خلاصه آخرین قیمت محصولاتی که به ردیف قدیمی اشاره می‌کنند به ردیف جدید منتقل می‌شود
+            cursor.execute(
+                f"WITH carried AS ("
+                f"INSERT INTO {self.TABLE} ({', '.join(columns)}) "
+                f"SELECT {values} FROM {name} WHERE last_seen_at >= %s "
+                f"RETURNING id, product_id, crawl_timestamp, observation_count) "
+                f"UPDATE {products_table} SET latest_price_row_id = carried.id, "
+                f"latest_price_at = carried.crawl_timestamp, "
+                f"latest_price_observation_count = carried.observation_count "
+                f"FROM carried, {name} retired "
+                f"WHERE retired.id = {products_table}.latest_price_row_id "
+                f"AND carried.product_id = {products_table}.id AND retired.product_id = carried.product_id",
+                [boundary, boundary]
+            )
+            cursor.execute(f"ALTER TABLE {self.TABLE} DETACH PARTITION {name}")
+            if self.retention_action == 'drop':
+                cursor.execute(f"DROP TABLE {name}")
+            else:
+                cursor.execute(f"ALTER TABLE {name} RENAME TO {self.TABLE}_archive_{month:%Y_%m}")
@@ -0,0 +1,330 @@
+# amazon_app/persistence.py
+import logging
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
+
+from .models import AmazonProduct, AmazonProductPrice
+from .price_history import max_run_length
+
+logger = logging.getLogger(__name__)
+
+# فیلدهایی که در upsert روی رکورد موجود بازنویسی می‌شوند
+PRODUCT_UPSERT_FIELDS = [
+    'title', 'description', 'brand', 'category', 'image_url', 'product_url', 'condition',
+    'features', 'specifications', 'rating', 'review_count', 'domain', 'seller', 'seller_info',
+    'last_crawled', 'is_active', 'updated_at',
+]
+
+# تغییر هر کدام از این فیلدها یعنی ردیف قیمت جدید؛ در غیر این صورت فقط last_seen_at جلو می‌رود
+PRICE_CHANGE_FIELDS = ['price', 'currency', 'seller', 'seller_type', 'availability']
+
+# فیلدهای خلاصه آخرین قیمت روی AmazonProduct
+LATEST_PRICE_FIELDS = [
+    'latest_price', 'latest_price_currency', 'latest_price_seller', 'latest_price_availability',
+    'latest_price_at', 'latest_price_seen_at', 'latest_price_row_id', 'latest_price_shipping_info',
+    'latest_price_observation_count',
+]
+
+
+def build_product_fields(product_data, country, now=None):
+    """فیلدهای AmazonProduct از خروجی پارسر"""
+    now = now or timezone.now()
+    return {
+        'title': product_data.get('title', ''),
+        'description': product_data.get('description', ''),
+        'brand': product_data.get('brand', ''),
+        'category': product_data.get('category', ''),
+        'image_url': product_data.get('image_url', ''),
+        'product_url': country.get_amazon_product_url(product_data['asin']),
+        'condition': product_data.get('condition', 'NEW'),
+        'features': product_data.get('features', []),
+        'specifications': product_data.get('specifications', {}),
+        'rating': product_data.get('rating'),
+        'review_count': product_data.get('review_count', 0),
+        'domain': country.amazon_domain,
+        'seller': product_data.get('seller', ''),
+        'seller_info': {
+            'last_crawled': now.isoformat(),
+            'seller_id': product_data.get('seller_id', ''),
+            'seller_type': product_data.get('seller_type', '')
+        },
+        'last_crawled': now,
+        'is_active': True
+    }
+
+
+def build_price_fields(product_data, country, crawl_source='url_crawler', now=None):
+    """فیلدهای AmazonProductPrice از خروجی پارسر"""
+    return {
+        'price': product_data['price'],
+        'currency': country.get_currency_code(),
+        'country_code': country.code,
+        'seller': product_data.get('seller', ''),
+        'seller_type': product_data.get('seller_type', 'Third-Party'),
+        'availability': product_data.get('availability', True),
+        'stock_status': 'In Stock' if product_data.get('availability', True) else 'Out of Stock',
+        'shipping_info': product_data.get('shipping_info', ''),
+        'crawl_source': crawl_source,
+        'crawl_timestamp': now or timezone.now(),
+    }
+
+
+def is_change_only_mode():
+    return getattr(settings, 'AMAZON_PRICE_STORAGE_MODE', 'change_only') == 'change_only'
+
+
+def _normalized(field, value):
+    if field == 'price' and value is not None:
+        return Decimal(str(value)).quantize(Decimal('0.01'))
+    return value
+
+
+def price_changed(latest_price, price_fields):
+    """آیا مشاهده جدید با آخرین ردیف قیمت فرق دارد؟"""
+    if latest_price is None:
+        return True
+    return any(
+        _normalized(field, getattr(latest_price, field)) != _normalized(field, price_fields[field])
+        for field in PRICE_CHANGE_FIELDS
+    )
+
+
+def can_extend_run(latest_price, price_fields):
+    """مشاهده بدون تغییر فقط تا max_run_length بعد از شروع run به همان ردیف اضافه می‌شود"""
+    return (
+        not price_changed(latest_price, price_fields)
+        and latest_price.crawl_timestamp >= price_fields['crawl_timestamp'] - max_run_length()
+    )
+
+
+def build_latest_price_fields(price, seen_at):
+    """فیلدهای خلاصه آخرین قیمت محصول از ردیف قیمت جاری"""
+    return {
+        'latest_price': price.price,
+        'latest_price_currency': price.currency,
+        'latest_price_seller': price.seller,
+        'latest_price_availability': price.availability,
+        'latest_price_at': price.crawl_timestamp,
+        'latest_price_seen_at': seen_at,
+        'latest_price_row_id': price.pk,
+        'latest_price_shipping_info': price.shipping_info,
+        'latest_price_observation_count': price.observation_count,
+    }
+
+
+def record_price_observation(product, price_fields):
+    """ثبت یک مشاهده قیمت - در حالت change_only فقط در صورت تغییر ردیف جدید ساخته می‌شود
+
+    خلاصه آخرین قیمت محصول در همان تراکنش بروز می‌شود.
+    """
+    seen_at = price_fields['crawl_timestamp']
+    with transaction.atomic():
+        if is_change_only_mode():
+            latest_price = product.prices.order_by('-crawl_timestamp').first()
+            if can_extend_run(latest_price, price_fields):
+                AmazonProductPrice.objects.filter(pk=latest_price.pk).update(
+                    last_seen_at=seen_at,
+                    observation_count=F('observation_count') + 1
+                )
+                latest_price.last_seen_at = seen_at
+                latest_price.observation_count += 1
+                AmazonProduct.objects.filter(pk=product.pk).update(**build_latest_price_fields(latest_price, seen_at))
+                return latest_price
+
+        price = AmazonProductPrice.objects.create(product=product, **price_fields)
+        AmazonProduct.objects.filter(pk=product.pk).update(**build_latest_price_fields(price, seen_at))
+        return price
+
+
+def get_latest_prices(product_ids):
+    """آخرین ردیف قیمت هر محصول (دو کوئری): {product_id: AmazonProductPrice}"""
+    if not product_ids:
+        return {}
+
+    latest_ids = AmazonProduct.objects.filter(pk__in=product_ids).annotate(
+        latest_price_id=Subquery(
+            AmazonProductPrice.objects.filter(product_id=OuterRef('pk')).order_by('-crawl_timestamp').values('pk')[:1]
+        )
+    ).values_list('latest_price_id', flat=True)
+
+    return {
+        price.product_id: price
+        for price in AmazonProductPrice.objects.filter(pk__in=[pk for pk in latest_ids if pk])
+    }
+
+
+class _PendingRecord:
+    def __init__(self, product_data, country, on_result):
+        self.product_data = product_data
+        self.country = country
+        self.on_result = on_result
+
+    @property
+    def key(self):
+        return self.product_data['asin'], self.country.code
+
+
+class AmazonProductBatchWriter:
+    """ذخیره دسته‌ای محصولات و قیمت‌ها: upsert چند ردیفی (ON CONFLICT) + bulk_create قیمت‌ها"""
+
+    def __init__(self, batch_size=None, flush_interval=None, crawl_source='url_crawler'):
+        self.batch_size = batch_size or getattr(settings, 'AMAZON_PERSIST_BATCH_SIZE', 50)
+        self.flush_interval = flush_interval if flush_interval is not None else getattr(
+            settings, 'AMAZON_PERSIST_FLUSH_INTERVAL', 30
+        )
+        self.crawl_source = crawl_source
+        self._pending = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def add(self, product_data, country, on_result=None):
+        """افزودن رکورد به بافر - اگر اندازه یا زمان بافر پر شده باشد flush می‌شود
+
+        on_result(success) بعد از ذخیره (یا شکست) همین رکورد صدا زده می‌شود.
+        """
+        with self._lock:
+            self._pending.append(_PendingRecord(product_data, country, on_result))
+            due = (
+                len(self._pending) >= self.batch_size
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        if due:
+            return self.flush()
+        return {}
+
+    def flush(self):
+        """نوشتن رکوردهای بافر - خروجی: {(asin, country_code): True/False}"""
+        with self._lock:
+            records, self._pending = self._pending, []
+            self._last_flush = time.monotonic()
+
+        if not records:
+            return {}
+
+        try:
+            results = self._write_batch(records)
+        except Exception as e:
+            # در صورت خطای دسته‌ای، رکوردها تک تک ذخیره می‌شوند تا فقط رکورد مشکل‌دار شکست بخورد
+            logger.warning(f"⚠️ Batch save of {len(records)} products failed, saving one by one: {e}")
+            results = {}
+            for record in records:
+                try:
+                    self._write_batch([record])
+                    results[record.key] = True
+                except Exception as record_error:
+                    logger.error(f"❌ Error saving product data {record.key[0]}: {record_error}")
+                    results[record.key] = False
+
+        for record in records:
+            if record.on_result:
+                try:
+                    record.on_result(results.get(record.key, False))
+                except Exception as e:
+                    logger.error(f"❌ Error in save callback for {record.key[0]}: {e}")
+
+        return results
+
+    def close(self):
+        """flush نهایی رکوردهای باقیمانده"""
+        return self.flush()
+
+    def _write_batch(self, records):
+        now = timezone.now()
+
+        # آخرین رکورد هر (asin, country) برنده است - ON CONFLICT یک ردیف را دو بار آپدیت نمی‌کند
+        latest = {}
+        for record in records:
+            latest[record.key] = record
+
+        products = [
+            AmazonProduct(
+                asin=record.product_data['asin'],
+                country_code=record.country.code,
+                **build_product_fields(record.product_data, record.country, now)
+            )
+            for record in latest.values()
+        ]
+
+        with transaction.atomic():
+            AmazonProduct.objects.bulk_create(
+                products,
+                batch_size=self.batch_size,
+                update_conflicts=True,
+                unique_fields=['asin', 'country_code'],
+                update_fields=PRODUCT_UPSERT_FIELDS,
+            )
+
+            product_ids = {
+                (asin, country_code): pk
+                for pk, asin, country_code in AmazonProduct.objects.filter(
+                    asin__in={asin for asin, _ in latest},
+                    country_code__in={country_code for _, country_code in latest},
+                ).values_list('pk', 'asin', 'country_code')
+            }
+
+            prices, seen, current = self._build_price_rows(records, product_ids, now)
+            if prices:
+                AmazonProductPrice.objects.bulk_create(prices, batch_size=self.batch_size)
+            # مشاهدات بدون تغییر: یک UPDATE به ازای هر مقدار افزایش (معمولاً فقط 1)
+            by_increment = {}
+            for pk, count in seen.items():
+                by_increment.setdefault(count, []).append(pk)
+            for count, pks in by_increment.items():
+                AmazonProductPrice.objects.filter(pk__in=pks).update(
+                    last_seen_at=now,
+                    observation_count=F('observation_count') + count
+                )
+            if current:
+                AmazonProduct.objects.bulk_update(
+                    [
+                        AmazonProduct(pk=product_id, **build_latest_price_fields(price, now))
+                        for product_id, price in current.items()
+                    ],
+                    LATEST_PRICE_FIELDS,
+                    batch_size=self.batch_size,
+                )
+
+        logger.info(
+            f"💾 Saved {len(products)} products and {len(prices)} prices in one batch "
+            f"({sum(seen.values())} unchanged observations)"
+        )
+        return {record.key: True for record in records}
+
+    def _build_price_rows(self, records, product_ids, now):
+        """ردیف‌های قیمت جدید + تعداد مشاهدات بدون تغییر به ازای ردیف موجود + ردیف جاری هر محصول:
+        (prices, {price_pk: count}, {product_id: price})"""
+        change_only = is_change_only_mode()
+        latest = get_latest_prices(set(product_ids.values())) if change_only else {}
+        prices = []
+        seen = {}
+        current = {}
+
+        for record in records:
+            if not record.product_data.get('price'):
+                continue
+
+            product_id = product_ids[record.key]
+            price_fields = build_price_fields(record.product_data, record.country, self.crawl_source, now)
+            latest_price = latest.get(product_id)
+
+            if change_only and can_extend_run(latest_price, price_fields):
+                current[product_id] = latest_price
+                if latest_price.pk:
+                    seen[latest_price.pk] = seen.get(latest_price.pk, 0) + 1
+                # ردیف ساخته شده در همین دسته مستقیم ذخیره می‌شود؛ برای ردیف موجود فقط خلاصه محصول از آن خوانده می‌شود
+                latest_price.last_seen_at = now
+                latest_price.observation_count += 1
+                continue
+
+            price = AmazonProductPrice(product_id=product_id, **price_fields)
+            prices.append(price)
+            latest[product_id] = price
+            current[product_id] = price
+
+        return prices, seen, current
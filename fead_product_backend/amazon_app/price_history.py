@@ -0,0 +1,145 @@
+# amazon_app/price_history.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import DecimalField, ExpressionWrapper, F, Q, Sum
+from django.utils import timezone
+
+BUCKET_SIZES = {
+    'daily': timedelta(days=1),
+    'hourly': timedelta(hours=1),
+}
+
+
+def max_run_length():
+    """حداکثر طول یک run قیمت: بعد از آن مشاهده بدون تغییر هم ردیف جدید می‌سازد"""
+    return timedelta(days=getattr(settings, 'AMAZON_PRICE_MAX_RUN_DAYS', 7))
+
+
+def run_window_q(since):
+    """شرط هم‌پوشانی run با پنجره [since, ...)
+
+    چون هیچ run ای بیشتر از max_run_length طول نمی‌کشد، crawl_timestamp از پایین محدود می‌شود
+    تا ایندکس (product, crawl_timestamp) و حذف پارتیشن‌ها (partition pruning) قابل استفاده بمانند.
+    """
+    return Q(crawl_timestamp__gte=since - max_run_length()) & (
+        Q(crawl_timestamp__gte=since) | Q(last_seen_at__gte=since)
+    )
+
+
+def weighted_avg_price(filter=None):
+    """عبارت aggregate میانگین قیمت بر اساس تعداد مشاهدات (هر ردیف run نماینده observation_count مشاهده است)"""
+    return ExpressionWrapper(
+        Sum(F('price') * F('observation_count'), filter=filter) / Sum('observation_count', filter=filter),
+        output_field=DecimalField(max_digits=14, decimal_places=4),
+    )
+
+
+def price_runs_in_window(prices, since, until=None):
+    """ردیف‌های قیمتی که بازه [crawl_timestamp, last_seen_at] آن‌ها با پنجره زمانی هم‌پوشانی دارد"""
+    prices = prices.filter(run_window_q(since))
+    if until is not None:
+        prices = prices.filter(crawl_timestamp__lte=until)
+    return prices.order_by('crawl_timestamp')
+
+
+def bucket_start(moment, granularity):
+    local = timezone.localtime(moment)
+    if granularity == 'daily':
+        return local.replace(hour=0, minute=0, second=0, microsecond=0)
+    return local.replace(minute=0, second=0, microsecond=0)
+
+
+def expand_price_runs(runs, granularity, since=None, until=None):
+    """بازسازی تاریخچه سطلی (روزانه/ساعتی) از ردیف‌های run-length
+
+    هر ردیف قیمت از crawl_timestamp تا seen_until ثابت بوده؛ در هر سطلی که با آن هم‌پوشانی دارد
+    حضور دارد و میانگین سطل بر اساس مدت هم‌پوشانی وزن‌دهی می‌شود.
+    خروجی: لیست مرتب {'bucket', 'min_price', 'max_price', 'avg_price', 'first_seen', 'last_seen',
+    'first_price', 'last_price', 'runs'}
+    """
+    step = BUCKET_SIZES[granularity]
+    buckets = {}
+
+    for run in runs:
+        first_seen = run.crawl_timestamp if since is None else max(run.crawl_timestamp, since)
+        last_seen = run.seen_until if until is None else min(run.seen_until, until)
+        if last_seen < first_seen:
+            continue
+
+        price = float(run.price)
+        bucket = bucket_start(first_seen, granularity)
+        while bucket <= last_seen:
+            overlap_start = max(first_seen, bucket)
+            overlap_end = min(last_seen, bucket + step)
+            # مشاهده لحظه‌ای هم حداقل وزن یک ثانیه می‌گیرد
+            weight = max((overlap_end - overlap_start).total_seconds(), 1.0)
+
+            entry = buckets.get(bucket)
+            if entry is None:
+                entry = buckets[bucket] = {
+                    'bucket': bucket,
+                    'min_price': price,
+                    'max_price': price,
+                    'weighted_sum': 0.0,
+                    'weight': 0.0,
+                    'first_seen': overlap_start,
+                    'last_seen': overlap_end,
+                    'first_price': price,
+                    'last_price': price,
+                    'runs': 0,
+                }
+            entry['min_price'] = min(entry['min_price'], price)
+            entry['max_price'] = max(entry['max_price'], price)
+            entry['weighted_sum'] += price * weight
+            entry['weight'] += weight
+            if overlap_start < entry['first_seen']:
+                entry['first_seen'], entry['first_price'] = overlap_start, price
+            if overlap_end >= entry['last_seen']:
+                entry['last_seen'], entry['last_price'] = overlap_end, price
+            entry['runs'] += 1
+
+            bucket += step
+
+    history = []
+    for bucket in sorted(buckets):
+        entry = buckets[bucket]
+        entry['avg_price'] = entry.pop('weighted_sum') / entry.pop('weight')
+        history.append(entry)
+    return history
+
+
+def summarize_price_runs(runs):
+    """آمار کلی از ردیف‌های run-length - میانگین بر اساس تعداد مشاهدات"""
+    runs = list(runs)
+    if not runs:
+        return {
+            'min_price': None, 'max_price': None, 'avg_price': None, 'total_records': 0,
+            'unique_sellers': 0, 'first_record': None, 'last_record': None,
+        }
+
+    observations = sum(run.observation_count for run in runs)
+    return {
+        'min_price': min(float(run.price) for run in runs),
+        'max_price': max(float(run.price) for run in runs),
+        'avg_price': sum(float(run.price) * run.observation_count for run in runs) / observations,
+        'total_records': observations,
+        'unique_sellers': len({run.seller for run in runs}),
+        'first_record': min(run.crawl_timestamp for run in runs),
+        'last_record': max(run.seen_until for run in runs),
+    }
+
+
+def summarize_price_buckets(history):
+    """آمار قیمت از تاریخچه سطلی - میانگین بر اساس مدت پوشش هر سطل"""
+    if not history:
+        return {'min_price': None, 'max_price': None, 'avg_price': None, 'first_record': None, 'last_record': None}
+
+    weights = [max((item['last_seen'] - item['first_seen']).total_seconds(), 1.0) for item in history]
+    return {
+        'min_price': min(item['min_price'] for item in history),
+        'max_price': max(item['max_price'] for item in history),
+        'avg_price': sum(item['avg_price'] * weight for item, weight in zip(history, weights)) / sum(weights),
+        'first_record': min(item['first_seen'] for item in history),
+        'last_record': max(item['last_seen'] for item in history),
+    }
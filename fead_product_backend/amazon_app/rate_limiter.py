@@ -0,0 +1,183 @@
+# amazon_app/rate_limiter.py
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Token bucket اتمیک در Redis - زمان از خود Redis خوانده می‌شود تا بین نودها یکسان باشد
+# خروجی: ثانیه‌های انتظار تا توکن بعدی (0 یعنی توکن مصرف شد)
+ACQUIRE_SCRIPT = """
+local key = KEYS[1]
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local ttl = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local data = redis.call('HMGET', key, 'tokens', 'ts', 'penalty')
+local penalty = tonumber(data[3]) or 1
+local effective_rate = rate / penalty
+local effective_burst = math.max(1, burst / penalty)
+local tokens = tonumber(data[1]) or effective_burst
+local ts = tonumber(data[2]) or now
+tokens = math.min(effective_burst, tokens + math.max(0, now - ts) * effective_rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / effective_rate
+end
+redis.call('HSET', key, 'tokens', tostring(tokens), 'ts', tostring(now), 'penalty', tostring(penalty))
+redis.call('EXPIRE', key, ttl)
+return tostring(wait)
+"""
+
+# تغییر ضریب جریمه: بلاک => ضرب در factor و خالی کردن سطل / موفقیت => شل شدن تدریجی
+PENALTY_SCRIPT = """
+local key = KEYS[1]
+local factor = tonumber(ARGV[1])
+local max_penalty = tonumber(ARGV[2])
+local ttl = tonumber(ARGV[3])
+local drain = ARGV[4] == '1'
+local penalty = tonumber(redis.call('HGET', key, 'penalty')) or 1
+penalty = math.min(max_penalty, math.max(1, penalty * factor))
+if penalty < 1.05 then
+    penalty = 1
+end
+redis.call('HSET', key, 'penalty', tostring(penalty))
+if drain then
+    redis.call('HSET', key, 'tokens', '0')
+end
+redis.call('EXPIRE', key, ttl)
+return tostring(penalty)
+"""
+
+
+class _LocalBucket:
+    """سطل محلی (داخل پروسه) برای زمانی که Redis در دسترس نیست"""
+
+    def __init__(self, burst):
+        self.tokens = burst
+        self.ts = time.monotonic()
+        self.penalty = 1.0
+
+
+class AmazonRateLimiter:
+    """محدودکننده نرخ درخواست‌ها به ازای هر دامنه آمازون (Token Bucket مشترک در Redis)"""
+
+    KEY_PREFIX = 'amazon:rate_limit'
+
+    def __init__(self, redis_alias='default'):
+        self.redis_alias = redis_alias
+        self._redis = None
+        self._acquire_script = None
+        self._penalty_script = None
+        self._local_buckets = {}
+        self._local_lock = threading.Lock()
+
+    # تنظیمات
+    def get_rate(self, domain):
+        """تعداد درخواست مجاز در ثانیه برای دامنه"""
+        per_domain = getattr(settings, 'AMAZON_RATE_LIMIT_PER_MINUTE_BY_DOMAIN', {})
+        per_minute = per_domain.get(domain, getattr(settings, 'AMAZON_RATE_LIMIT_PER_MINUTE', 4))
+        return max(float(per_minute), 0.01) / 60.0
+
+    def get_burst(self, domain):
+        per_domain = getattr(settings, 'AMAZON_RATE_LIMIT_BURST_BY_DOMAIN', {})
+        return max(1.0, float(per_domain.get(domain, getattr(settings, 'AMAZON_RATE_LIMIT_BURST', 2))))
+
+    def _key(self, domain):
+        return f"{self.KEY_PREFIX}:{domain}"
+
+    def _get_redis(self):
+        if self._redis is None:
+            from django_redis import get_redis_connection
+
+            self._redis = get_redis_connection(self.redis_alias)
+            self._acquire_script = self._redis.register_script(ACQUIRE_SCRIPT)
+            self._penalty_script = self._redis.register_script(PENALTY_SCRIPT)
+        return self._redis
+
+    # API اصلی
+    def acquire(self, domain, timeout=None):
+        """منتظر ماندن تا نوبت درخواست بعدی به دامنه - True اگر توکن گرفته شد"""
+        if timeout is None:
+            timeout = getattr(settings, 'AMAZON_RATE_LIMIT_MAX_WAIT', 300)
+        jitter = getattr(settings, 'AMAZON_RATE_LIMIT_JITTER', 1.0)
+        deadline = time.monotonic() + timeout
+
+        while True:
+            wait = self._try_acquire(domain)
+            if wait <= 0:
+                if jitter:
+                    time.sleep(random.uniform(0, jitter))
+                return True
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.warning(f"⏳ Rate limit wait timed out for {domain}")
+                return False
+
+            sleep_for = min(wait + random.uniform(0, 0.25), remaining)
+            logger.info(f"⏳ Rate limit for {domain}: waiting {sleep_for:.1f} seconds...")
+            time.sleep(sleep_for)
+
+    def report_block(self, domain):
+        """صفحه بلاک دیده شد - نرخ سخت‌گیرانه‌تر می‌شود"""
+        factor = getattr(settings, 'AMAZON_RATE_LIMIT_BLOCK_FACTOR', 2.0)
+        penalty = self._adjust_penalty(domain, factor, drain=True)
+        logger.warning(f"🐢 Tightening rate limit for {domain} (penalty x{penalty:.2f})")
+
+    def report_success(self, domain):
+        """صفحه بدون بلاک لود شد - نرخ به تدریج به حالت عادی برمی‌گردد"""
+        factor = getattr(settings, 'AMAZON_RATE_LIMIT_RECOVERY_FACTOR', 0.8)
+        self._adjust_penalty(domain, factor, drain=False)
+
+    def _ttl(self, domain):
+        # کلید تا زمانی که سطل دوباره پر شود معتبر می‌ماند
+        max_penalty = getattr(settings, 'AMAZON_RATE_LIMIT_MAX_PENALTY', 16)
+        return int(max(3600, self.get_burst(domain) * max_penalty / self.get_rate(domain)))
+
+    def _try_acquire(self, domain):
+        rate, burst = self.get_rate(domain), self.get_burst(domain)
+        try:
+            self._get_redis()
+            return float(self._acquire_script(keys=[self._key(domain)], args=[rate, burst, self._ttl(domain)]))
+        except Exception as e:
+            logger.warning(f"⚠️ Redis rate limiter unavailable, using local bucket: {e}")
+            return self._try_acquire_local(domain, rate, burst)
+
+    def _adjust_penalty(self, domain, factor, drain):
+        max_penalty = getattr(settings, 'AMAZON_RATE_LIMIT_MAX_PENALTY', 16)
+        try:
+            self._get_redis()
+            return float(self._penalty_script(
+                keys=[self._key(domain)],
+                args=[factor, max_penalty, self._ttl(domain), '1' if drain else '0']
+            ))
+        except Exception as e:
+            logger.warning(f"⚠️ Redis rate limiter unavailable, using local bucket: {e}")
+            with self._local_lock:
+                bucket = self._local_buckets.setdefault(domain, _LocalBucket(self.get_burst(domain)))
+                bucket.penalty = min(max_penalty, max(1.0, bucket.penalty * factor))
+                if bucket.penalty < 1.05:
+                    bucket.penalty = 1.0
+                if drain:
+                    bucket.tokens = 0
+                return bucket.penalty
+
+    def _try_acquire_local(self, domain, rate, burst):
+        with self._local_lock:
+            bucket = self._local_buckets.setdefault(domain, _LocalBucket(burst))
+            effective_rate = rate / bucket.penalty
+            effective_burst = max(1.0, burst / bucket.penalty)
+            now = time.monotonic()
+            bucket.tokens = min(effective_burst, bucket.tokens + (now - bucket.ts) * effective_rate)
+            bucket.ts = now
+            if bucket.tokens >= 1:
+                bucket.tokens -= 1
+                return 0
+            return (1 - bucket.tokens) / effective_rate
@@ -0,0 +1,165 @@
+# amazon_app/rollups.py
+import logging
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import AmazonPriceDailyRollup, AmazonPriceHourlyRollup, AmazonPriceRollupState, AmazonProductPrice
+from .price_history import bucket_start, expand_price_runs, max_run_length, price_runs_in_window, run_window_q
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_MODELS = {
+    'daily': AmazonPriceDailyRollup,
+    'hourly': AmazonPriceHourlyRollup,
+}
+
+ROLLUP_UPDATE_FIELDS = [
+    'min_price', 'max_price', 'avg_price', 'first_price', 'last_price',
+    'first_seen', 'last_seen', 'record_count', 'updated_at',
+]
+
+
+class PriceRollupCompactor:
+    """نگهداری افزایشی جداول خلاصه قیمت روزانه/ساعتی
+
+    فقط سطل‌های نهایی نوشته می‌شوند: مشاهده بعدی فقط run ای را تمدید می‌کند که حداکثر max_run_length پیش شروع شده،
+    پس سطل‌هایی که قبل از now - max_run_length (به علاوه SETTLE_TIME برای ذخیره‌های دیرهنگام) تمام شده‌اند دیگر تغییر نمی‌کنند.
+    watermark (در دیتابیس) مرز روزانه سطل‌های نهایی است؛ هر اجرا فقط روزهای بین watermark قبلی و جدید را
+    برای محصولاتی که run آن‌ها با این بازه هم‌پوشانی دارد می‌سازد و خواننده‌ها بعد از watermark را از داده خام می‌خوانند.
+    """
+
+    STATE_NAME = 'price_rollup'
+    # حداکثر فاصله crawl_timestamp یک مشاهده تا ذخیره آن
+    SETTLE_TIME = timedelta(hours=1)
+
+    def __init__(self, chunk_size=None):
+        self.chunk_size = chunk_size or getattr(settings, 'AMAZON_PRICE_ROLLUP_CHUNK_SIZE', 200)
+
+    # Watermark
+    def get_watermark(self):
+        """سطل‌های قبل از این زمان در جداول خلاصه نهایی هستند (None = هنوز ساخته نشده)"""
+        return (
+            AmazonPriceRollupState.objects.filter(name=self.STATE_NAME)
+            .values_list('watermark', flat=True)
+            .first()
+        )
+
+    def set_watermark(self, moment):
+        AmazonPriceRollupState.objects.update_or_create(name=self.STATE_NAME, defaults={'watermark': moment})
+
+    def final_until(self, now=None):
+        """مرز روزانه‌ای که سطل‌های قبل از آن دیگر تغییر نمی‌کنند"""
+        now = now or timezone.now()
+        return bucket_start(now - max_run_length() - self.SETTLE_TIME, 'daily')
+
+    def tail_start(self, granularity=None):
+        """از این زمان به بعد از داده خام خوانده می‌شود (مرز روزانه، پس مرز سطل ساعتی هم هست)"""
+        return self.get_watermark()
+
+    # Compaction
+    def compact(self, now=None):
+        """ساخت سطل‌های تازه نهایی شده از watermark قبلی تا final_until - تعداد محصولات پردازش شده"""
+        watermark = self.get_watermark()
+        until = self.final_until(now)
+        if watermark is not None and until <= watermark:
+            return 0
+
+        prices = AmazonProductPrice.objects.filter(crawl_timestamp__lt=until)
+        if watermark is not None:
+            prices = prices.filter(run_window_q(watermark))
+        product_ids = list(prices.order_by().values_list('product_id', flat=True).distinct())
+
+        for offset in range(0, len(product_ids), self.chunk_size):
+            self.rebuild_products(product_ids[offset:offset + self.chunk_size], watermark, until)
+
+        self.set_watermark(until)
+        logger.info(
+            f"🧮 Price rollups compacted for {len(product_ids)} products "
+            f"({watermark.isoformat() if watermark else 'beginning'} -> {until.isoformat()})"
+        )
+        return len(product_ids)
+
+    def rebuild_products(self, product_ids, since=None, until=None):
+        """ساخت سطل‌های روزانه و ساعتی بازه [since, until) (مرزهای روزانه) برای این محصولات"""
+        prices = AmazonProductPrice.objects.filter(product_id__in=product_ids)
+        if since is not None:
+            prices = price_runs_in_window(prices, since, until)
+        else:
+            prices = prices.filter(crawl_timestamp__lt=until) if until is not None else prices
+            prices = prices.order_by('crawl_timestamp')
+
+        runs_by_product = {}
+        for run in prices.only('product_id', 'price', 'crawl_timestamp', 'last_seen_at'):
+            runs_by_product.setdefault(run.product_id, []).append(run)
+
+        with transaction.atomic():
+            for granularity, model in ROLLUP_MODELS.items():
+                rows = [
+                    model(product_id=product_id, **self._rollup_fields(entry))
+                    for product_id, runs in runs_by_product.items()
+                    for entry in expand_price_runs(runs, granularity, since=since, until=until)
+                    if entry['bucket'] < until
+                ]
+                if rows:
+                    model.objects.bulk_create(
+                        rows,
+                        batch_size=500,
+                        update_conflicts=True,
+                        unique_fields=['product', 'bucket_start'],
+                        update_fields=ROLLUP_UPDATE_FIELDS,
+                    )
+
+    @staticmethod
+    def _rollup_fields(entry):
+        return {
+            'bucket_start': entry['bucket'],
+            'min_price': round(entry['min_price'], 2),
+            'max_price': round(entry['max_price'], 2),
+            'avg_price': round(entry['avg_price'], 4),
+            'first_price': round(entry['first_price'], 2),
+            'last_price': round(entry['last_price'], 2),
+            'first_seen': entry['first_seen'],
+            'last_seen': entry['last_seen'],
+            'record_count': entry['runs'],
+            'updated_at': timezone.now(),
+        }
+
+    # Read
+    def get_history(self, product, granularity, since):
+        """تاریخچه سطلی: سطل‌های نهایی از جدول خلاصه + دنباله بعد از watermark از داده خام
+
+        خروجی هم‌شکل expand_price_runs است.
+        """
+        tail_start = self.tail_start(granularity)
+        first_bucket = bucket_start(since, granularity)
+        history = []
+
+        if tail_start is not None and tail_start > first_bucket:
+            rollups = ROLLUP_MODELS[granularity].objects.filter(
+                product=product, bucket_start__gte=first_bucket, bucket_start__lt=tail_start
+            ).order_by('bucket_start')
+            history = [
+                {
+                    'bucket': rollup.bucket_start,
+                    'min_price': float(rollup.min_price),
+                    'max_price': float(rollup.max_price),
+                    'avg_price': float(rollup.avg_price),
+                    'first_price': float(rollup.first_price),
+                    'last_price': float(rollup.last_price),
+                    'first_seen': rollup.first_seen,
+                    'last_seen': rollup.last_seen,
+                    'runs': rollup.record_count,
+                }
+                for rollup in rollups
+            ]
+            live_since = tail_start
+        else:
+            live_since = since
+
+        runs = price_runs_in_window(product.prices.all(), live_since)
+        history.extend(expand_price_runs(runs, granularity, since=live_since))
+        return history
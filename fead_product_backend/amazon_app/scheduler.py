@@ -0,0 +1,175 @@
+# amazon_app/scheduler.py
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Avg, Count, StdDev
+from django.utils import timezone
+
+from contract_manager.models import Country, ProductChannel
+from .models import AmazonProduct, AmazonProductPrice
+
+logger = logging.getLogger(__name__)
+
+# کهنگی محصولی که هرگز کراول نشده (جلوتر از همه در صف)
+NEVER_CRAWLED_STALENESS = 1000.0
+
+
+class AmazonRefreshScheduler:
+    """زمان‌بندی تطبیقی بروزرسانی محصولات
+
+    اولویت هر (asin, country) = کهنگی داده × وزن (نوسان قیمت اخیر + زنده بودن در کانال).
+    محصولی با اولویت ≥ 1 موعد بروزرسانی‌اش رسیده؛ صف در یک sorted set در Redis نگه داشته می‌شود
+    و ارسال به کراولر در محدوده بودجه صفحه در ساعت انجام می‌شود.
+    """
+
+    QUEUE_KEY = 'amazon:refresh:queue'
+    INFLIGHT_KEY = 'amazon:refresh:inflight'
+    BUDGET_KEY_PREFIX = 'amazon:refresh:budget'
+
+    def __init__(self, redis_alias='default'):
+        self.redis_alias = redis_alias
+        self._redis = None
+
+    def _get_redis(self):
+        if self._redis is None:
+            from django_redis import get_redis_connection
+
+            self._redis = get_redis_connection(self.redis_alias)
+        return self._redis
+
+    @staticmethod
+    def _member(asin, country_code):
+        return f"{country_code}:{asin}"
+
+    # محاسبه اولویت
+    def compute_priorities(self, now=None):
+        """اولویت همه محصولات فعال کشورهای قابل کراول: {(asin, country_code): priority}"""
+        now = now or timezone.now()
+        base_interval = getattr(settings, 'AMAZON_REFRESH_BASE_INTERVAL_HOURS', 24) * 3600
+        volatility_weight = getattr(settings, 'AMAZON_REFRESH_VOLATILITY_WEIGHT', 4.0)
+        live_weight = getattr(settings, 'AMAZON_REFRESH_LIVE_WEIGHT', 3.0)
+        volatility_days = getattr(settings, 'AMAZON_REFRESH_VOLATILITY_DAYS', 7)
+
+        countries = set(
+            Country.objects.filter(is_active=True, is_available_for_crawling=True).values_list('code', flat=True)
+        )
+        products = AmazonProduct.objects.filter(
+            is_active=True, country_code__in=countries
+        ).values_list('id', 'asin', 'country_code', 'last_crawled')
+
+        # ضریب تغییرات قیمت (انحراف معیار / میانگین) در بازه اخیر - یک کوئری گروه‌بندی شده
+        volatility = {}
+        price_stats = AmazonProductPrice.objects.filter(
+            crawl_timestamp__gte=now - timedelta(days=volatility_days)
+        ).values('product_id').annotate(
+            avg_price=Avg('price'), std_price=StdDev('price'), price_count=Count('id')
+        ).filter(price_count__gt=1)
+        for row in price_stats:
+            if row['avg_price']:
+                volatility[row['product_id']] = float(row['std_price'] or 0) / float(row['avg_price'])
+
+        # محصولاتی که در حال حاضر در کانالی ارسال شده‌اند
+        live = set(
+            ProductChannel.objects.filter(status='sent').values_list('product__asin', 'product__country_id')
+        )
+
+        priorities = {}
+        for product_id, asin, country_code, last_crawled in products:
+            if last_crawled:
+                staleness = (now - last_crawled).total_seconds() / base_interval
+            else:
+                staleness = NEVER_CRAWLED_STALENESS
+            # نوسان 10% یا بیشتر وزن کامل می‌گیرد
+            weight = 1 + volatility_weight * min(1.0, volatility.get(product_id, 0.0) * 10)
+            if (asin, country_code) in live:
+                weight += live_weight
+            priorities[(asin, country_code)] = staleness * weight
+
+        return priorities
+
+    def rebuild_queue(self):
+        """بازسازی صف اولویت در Redis - فقط محصولاتی که موعدشان رسیده و در حال کراول نیستند"""
+        redis = self._get_redis()
+        inflight_ttl = getattr(settings, 'AMAZON_REFRESH_INFLIGHT_TTL', 3600)
+        redis.zremrangebyscore(self.INFLIGHT_KEY, '-inf', time.time() - inflight_ttl)
+        inflight = {member.decode() for member in redis.zrange(self.INFLIGHT_KEY, 0, -1)}
+
+        due = {
+            self._member(asin, country_code): priority
+            for (asin, country_code), priority in self.compute_priorities().items()
+            if priority >= 1 and self._member(asin, country_code) not in inflight
+        }
+
+        # جایگزینی اتمیک صف قبلی
+        pipe = redis.pipeline()
+        pipe.delete(self.QUEUE_KEY)
+        if due:
+            pipe.zadd(self.QUEUE_KEY, due)
+        pipe.execute()
+
+        logger.info(f"📋 Refresh queue rebuilt: {len(due)} products due, {len(inflight)} in flight")
+        return len(due)
+
+    # بودجه
+    def get_tick_budget(self):
+        """تعداد صفحه مجاز در این نوبت: سهم این نوبت از بودجه ساعتی، محدود به باقیمانده ساعت جاری"""
+        pages_per_hour = getattr(settings, 'AMAZON_REFRESH_PAGES_PER_HOUR', 120)
+        dispatch_interval = getattr(settings, 'AMAZON_REFRESH_DISPATCH_INTERVAL', 300)
+        tick_share = max(1, int(pages_per_hour * dispatch_interval / 3600))
+
+        used = int(self._get_redis().get(self._budget_key()) or 0)
+        return max(0, min(tick_share, pages_per_hour - used))
+
+    def _budget_key(self):
+        return f"{self.BUDGET_KEY_PREFIX}:{timezone.now().strftime('%Y%m%d%H')}"
+
+    def _consume_budget(self, pages):
+        pipe = self._get_redis().pipeline()
+        pipe.incrby(self._budget_key(), pages)
+        pipe.expire(self._budget_key(), 2 * 3600)
+        pipe.execute()
+
+    # ارسال
+    def pop_due(self, count):
+        """برداشتن پر اولویت‌ترین محصولات از صف: {country_code: [asin, ...]}"""
+        if count <= 0:
+            return {}
+
+        redis = self._get_redis()
+        popped = redis.zpopmax(self.QUEUE_KEY, count)
+        if not popped:
+            return {}
+
+        now = time.time()
+        redis.zadd(self.INFLIGHT_KEY, {member: now for member, _ in popped})
+
+        batches = {}
+        for member, _ in popped:
+            country_code, asin = member.decode().split(':', 1)
+            batches.setdefault(country_code, []).append(asin)
+        return batches
+
+    def dispatch(self, enqueue):
+        """ارسال محصولات موعد رسیده به کراولر در محدوده بودجه - enqueue(country_code, asins) برای هر کشور"""
+        budget = self.get_tick_budget()
+        if budget <= 0:
+            logger.info("⏸️ Hourly refresh budget exhausted, skipping dispatch")
+            return {}
+
+        batches = self.pop_due(budget)
+        dispatched = {}
+        for country_code, asins in batches.items():
+            try:
+                enqueue(country_code, asins)
+                dispatched[country_code] = len(asins)
+            except Exception as e:
+                logger.error(f"❌ Could not dispatch refresh for {country_code}: {e}")
+                self._get_redis().zrem(self.INFLIGHT_KEY, *[self._member(asin, country_code) for asin in asins])
+
+        total = sum(dispatched.values())
+        if total:
+            self._consume_budget(total)
+            logger.info(f"🚚 Dispatched {total} refresh crawls: {dispatched}")
+        return dispatched
@@ -0,0 +1,29 @@
+# amazon_app/search.py
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db import connections
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import Upper
+
+
+def search_products(queryset, term):
+    """جستجوی محصولات با ایندکس‌های full-text و trigram - خروجی با امتیاز search_rank
+
+    full-text وزن‌دار (عنوان > برند > دسته) برای کلمات کامل، trigram روی UPPER(title) برای
+    زیررشته و غلط تایپی، و icontains روی برند/ASIN که با ایندکس trigram همان ستون‌ها اجرا می‌شود.
+    """
+    if connections[queryset.db].vendor != 'postgresql':
+        return queryset.filter(
+            Q(title__icontains=term) | Q(brand__icontains=term) | Q(asin__icontains=term)
+        ).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    query = SearchQuery(term, search_type='websearch', config='simple')
+    upper_term = term.upper()
+    return queryset.annotate(title_upper=Upper('title')).filter(
+        Q(search_vector=query)
+        | Q(title_upper__contains=upper_term)
+        | Q(title_upper__trigram_word_similar=upper_term)
+        | Q(brand__icontains=term)
+        | Q(asin__icontains=term)
+    ).annotate(
+        search_rank=SearchRank(F('search_vector'), query) + TrigramWordSimilarity(upper_term, 'title_upper')
+    )
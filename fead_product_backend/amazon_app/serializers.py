@@ -1,10 +1,18 @@
 # amazon_app/serializers.py
+from django.conf import settings
 from rest_framework import serializers
 from drf_yasg.utils import swagger_serializer_method
 from .models import AmazonProduct, AmazonProductPrice
+from .price_history import run_window_q, weighted_avg_price
 from contract_manager.models import Product
 
 
+def parse_history_days(value, default=90):
+    """تعداد روزهای تاریخچه بین 1 و AMAZON_DETAIL_MAX_HISTORY_DAYS - ValueError برای مقدار غیر عددی"""
+    history_days = int(value) if value not in (None, '') else default
+    return max(1, min(history_days, getattr(settings, 'AMAZON_DETAIL_MAX_HISTORY_DAYS', 365)))
+
+
 class ProductPriceSerializer(serializers.ModelSerializer):
     """Serializer برای قیمت‌های محصول آمازون"""
 
@@ -12,7 +20,7 @@ class ProductPriceSerializer(serializers.ModelSerializer):
         model = AmazonProductPrice
         fields = [
             'id', 'price', 'currency', 'seller', 'availability',
-            'crawl_timestamp', 'shipping_info',
+            'crawl_timestamp', 'last_seen_at', 'observation_count', 'shipping_info',
             # 'discount_percentage', 'original_price', 'stock_quantity',
             # 'buybox_winner', 'created_at', 'updated_at',
             # 'is_fba', 'is_amazon',
@@ -38,14 +46,56 @@ class AmazonProductSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
     def get_current_price(self, obj):
-        """دریافت آخرین قیمت محصول"""
-        latest_price = obj.prices.order_by('-crawl_timestamp').first()
+        """دریافت آخرین قیمت محصول (از فیلدهای خلاصه روی خود محصول)"""
+        latest_price = obj.get_latest_price_snapshot()
         if latest_price:
             serializer = ProductPriceSerializer(latest_price)
             return serializer.data
         return None
 
 
+def get_price_statistics_map(product_ids):
+    """آمار قیمت چند محصول با یک کوئری گروه‌بندی شده: {product_id: stats}"""
+    from django.db.models import Min, Max, Sum
+
+    rows = AmazonProductPrice.objects.filter(product_id__in=product_ids).order_by().values('product_id').annotate(
+        min_price=Min('price'),
+        max_price=Max('price'),
+        avg_price=weighted_avg_price(),
+        price_count=Sum('observation_count')
+    )
+    return {
+        row['product_id']: {
+            'min_price': float(row['min_price']) if row['min_price'] else None,
+            'max_price': float(row['max_price']) if row['max_price'] else None,
+            'avg_price': float(row['avg_price']) if row['avg_price'] else None,
+            'price_count': row['price_count'] or 0
+        }
+        for row in rows
+    }
+
+
+def get_system_product_counts(products):
+    """تعداد استفاده هر محصول آمازون در سیستم ما با یک کوئری: {(asin, country_code): count}"""
+    from django.db.models import Count
+
+    rows = Product.objects.filter(
+        asin__in={product.asin for product in products},
+        country__code__in={product.country_code for product in products}
+    ).order_by().values('asin', 'country__code').annotate(count=Count('id'))
+    return {(row['asin'], row['country__code']): row['count'] for row in rows}
+
+
+class AmazonProductListPageSerializer(serializers.ListSerializer):
+    """محاسبه آمار کل صفحه به صورت دسته‌ای قبل از سریالایز تک تک محصولات"""
+
+    def to_representation(self, data):
+        products = list(data.all() if hasattr(data, 'all') else data)
+        self._context['price_statistics'] = get_price_statistics_map([product.pk for product in products])
+        self._context['system_product_counts'] = get_system_product_counts(products)
+        return super().to_representation(products)
+
+
 class AmazonProductListSerializer(AmazonProductSerializer):
     """Serializer برای لیست محصولات"""
 
@@ -57,38 +107,31 @@ class AmazonProductListSerializer(AmazonProductSerializer):
         fields = AmazonProductSerializer.Meta.fields + [
             'price_statistics', 'is_used_in_system', 'system_products_count'
         ]
+        list_serializer_class = AmazonProductListPageSerializer
 
     def get_price_statistics(self, obj):
         """آمار قیمت محصول"""
-        from django.db.models import Min, Max, Avg, Count
+        statistics = self.context.get('price_statistics')
+        if statistics is None:
+            statistics = get_price_statistics_map([obj.pk])
 
-        stats = obj.prices.aggregate(
-            min_price=Min('price'),
-            max_price=Max('price'),
-            avg_price=Avg('price'),
-            price_count=Count('price')
-        )
-
-        return {
-            'min_price': float(stats['min_price']) if stats['min_price'] else None,
-            'max_price': float(stats['max_price']) if stats['max_price'] else None,
-            'avg_price': float(stats['avg_price']) if stats['avg_price'] else None,
-            'price_count': stats['price_count'] or 0
-        }
+        return statistics.get(obj.pk, {
+            'min_price': None,
+            'max_price': None,
+            'avg_price': None,
+            'price_count': 0
+        })
 
     def get_is_used_in_system(self, obj):
         """آیا محصول در سیستم ما استفاده شده است؟"""
-        return Product.objects.filter(
-            asin=obj.asin,
-            country__code=obj.country_code
-        ).exists()
+        return self.get_system_products_count(obj) > 0
 
     def get_system_products_count(self, obj):
         """تعداد استفاده‌های محصول در سیستم ما"""
-        return Product.objects.filter(
-            asin=obj.asin,
-            country__code=obj.country_code
-        ).count()
+        counts = self.context.get('system_product_counts')
+        if counts is None:
+            counts = get_system_product_counts([obj])
+        return counts.get((obj.asin, obj.country_code), 0)
 
 
 class AmazonProductDetailSerializer(AmazonProductSerializer):
@@ -106,49 +149,49 @@ class AmazonProductDetailSerializer(AmazonProductSerializer):
         ]
 
     def get_price_statistics(self, obj):
-        """آمار کامل قیمت"""
-        from django.db.models import Min, Max, Avg, Count, Q
-        from datetime import datetime, timedelta
-
-        # محاسبه آمار کلی
-        stats = obj.prices.aggregate(
+        """آمار کامل قیمت - کل دوره و ۳۰ روز اخیر در یک کوئری، آخرین قیمت از خلاصه روی محصول"""
+        from django.db.models import Min, Max, Count, Sum, Q
+        from django.db.models.functions import Coalesce
+        from django.utils import timezone
+        from datetime import timedelta
+
+        # هر ردیف می‌تواند چند مشاهده بدون تغییر را نمایندگی کند
+        thirty_days_ago = timezone.now() - timedelta(days=30)
+        recent = run_window_q(thirty_days_ago)
+        stats = obj.prices.order_by().aggregate(
             min_price=Min('price'),
             max_price=Max('price'),
-            avg_price=Avg('price'),
-            price_count=Count('price'),
+            avg_price=weighted_avg_price(),
+            price_count=Sum('observation_count'),
             first_price_date=Min('crawl_timestamp'),
-            last_price_date=Max('crawl_timestamp'),
+            last_price_date=Max(Coalesce('last_seen_at', 'crawl_timestamp')),
             total_sellers=Count('seller', distinct=True),
             amazon_seller_count=Count('seller', distinct=True, filter=Q(seller='Amazon')),
-            fba_count=Count('id', filter=Q(is_fba=True)),
+            # فیلد FBA جداگانه ذخیره نمی‌شود - ارسال توسط آمازون از متن shipping_info
+            fba_count=Sum('observation_count', filter=Q(shipping_info__icontains='amazon')),
+            recent_min_price=Min('price', filter=recent),
+            recent_max_price=Max('price', filter=recent),
+            recent_avg_price=weighted_avg_price(filter=recent),
+            recent_count=Sum('observation_count', filter=recent),
         )
 
         # محاسبه تغییرات قیمت
-        oldest_price = obj.prices.order_by('crawl_timestamp').first()
-        latest_price = obj.prices.order_by('-crawl_timestamp').first()
+        oldest_price = obj.prices.order_by('crawl_timestamp').values('price', 'crawl_timestamp').first()
 
         price_change = None
-        if latest_price and oldest_price and latest_price != oldest_price:
+        if oldest_price and obj.latest_price is not None and oldest_price['crawl_timestamp'] != obj.latest_price_at:
+            old_price = float(oldest_price['price'])
+            new_price = float(obj.latest_price)
             price_change = {
-                'old_price': float(oldest_price.price),
-                'new_price': float(latest_price.price),
-                'change_amount': float(latest_price.price) - float(oldest_price.price),
-                'change_percentage': ((float(latest_price.price) - float(oldest_price.price)) / float(
-                    oldest_price.price)) * 100 if float(oldest_price.price) > 0 else 0,
-                'time_period_days': (latest_price.crawl_timestamp - oldest_price.crawl_timestamp).days
+                'old_price': old_price,
+                'new_price': new_price,
+                'change_amount': new_price - old_price,
+                'change_percentage': ((new_price - old_price) / old_price) * 100 if old_price > 0 else 0,
+                'time_period_days': (
+                    (obj.latest_price_seen_at or obj.latest_price_at) - oldest_price['crawl_timestamp']
+                ).days
             }
 
-        # آمار ۳۰ روز اخیر
-        thirty_days_ago = datetime.now() - timedelta(days=30)
-        recent_stats = obj.prices.filter(
-            crawl_timestamp__gte=thirty_days_ago
-        ).aggregate(
-            recent_min_price=Min('price'),
-            recent_max_price=Max('price'),
-            recent_avg_price=Avg('price'),
-            recent_count=Count('price')
-        )
-
         return {
             'all_time': {
                 'min_price': float(stats['min_price']) if stats['min_price'] else None,
@@ -162,10 +205,10 @@ class AmazonProductDetailSerializer(AmazonProductSerializer):
                 'fba_count': stats['fba_count'] or 0,
             },
             'last_30_days': {
-                'min_price': float(recent_stats['recent_min_price']) if recent_stats['recent_min_price'] else None,
-                'max_price': float(recent_stats['recent_max_price']) if recent_stats['recent_max_price'] else None,
-                'avg_price': float(recent_stats['recent_avg_price']) if recent_stats['recent_avg_price'] else None,
-                'price_count': recent_stats['recent_count'] or 0,
+                'min_price': float(stats['recent_min_price']) if stats['recent_min_price'] else None,
+                'max_price': float(stats['recent_max_price']) if stats['recent_max_price'] else None,
+                'avg_price': float(stats['recent_avg_price']) if stats['recent_avg_price'] else None,
+                'price_count': stats['recent_count'] or 0,
             },
             'price_change_over_time': price_change
         }
@@ -173,14 +216,13 @@ class AmazonProductDetailSerializer(AmazonProductSerializer):
     def get_price_history(self, obj):
         """تاریخچه قیمت"""
         request = self.context.get('request')
-        history_days = int(request.query_params.get('history_days', 90)) if request else 90
+        history_days = parse_history_days(request.query_params.get('history_days')) if request else 90
 
-        from datetime import datetime, timedelta
-        cutoff_date = datetime.now() - timedelta(days=history_days)
+        from datetime import timedelta
+        from django.utils import timezone
+        cutoff_date = timezone.now() - timedelta(days=history_days)
 
-        price_history = obj.prices.filter(
-            crawl_timestamp__gte=cutoff_date
-        ).order_by('-crawl_timestamp')[:100]  # محدود به ۱۰۰ رکورد
+        price_history = obj.prices.filter(run_window_q(cutoff_date)).order_by('-crawl_timestamp')[:100]  # محدود به ۱۰۰ رکورد
 
         return ProductPriceSerializer(price_history, many=True).data
 
@@ -191,9 +233,6 @@ class AmazonProductDetailSerializer(AmazonProductSerializer):
             country__code=obj.country_code
         ).select_related('owner')
 
-        if not system_products.exists():
-            return []
-
         return [
             {
                 'id': str(sp.id),
@@ -212,26 +251,23 @@ class AmazonProductDetailSerializer(AmazonProductSerializer):
         ]
 
     def get_available_in_other_countries(self, obj):
-        """سایر نسخه‌های کشور"""
+        """سایر نسخه‌های کشور - آخرین قیمت هر کشور از خلاصه روی همان ردیف (یک کوئری)"""
         other_countries = AmazonProduct.objects.filter(
             asin=obj.asin
-        ).exclude(country_code=obj.country_code)
-
-        if not other_countries.exists():
-            return []
-
-        result = []
-        for oc in other_countries:
-            latest_price = oc.prices.order_by('-crawl_timestamp').first()
-            result.append({
-                'country_code': oc.country_code,
-                'domain': oc.domain,
-                'last_crawled': oc.last_crawled.isoformat() if oc.last_crawled else None,
-                'current_price': float(latest_price.price) if latest_price else None,
-                'currency': latest_price.currency if latest_price else None
-            })
+        ).exclude(country_code=obj.country_code).order_by('country_code').values(
+            'country_code', 'domain', 'last_crawled', 'latest_price', 'latest_price_currency'
+        )
 
-        return result
+        return [
+            {
+                'country_code': oc['country_code'],
+                'domain': oc['domain'],
+                'last_crawled': oc['last_crawled'].isoformat() if oc['last_crawled'] else None,
+                'current_price': float(oc['latest_price']) if oc['latest_price'] is not None else None,
+                'currency': oc['latest_price_currency'] or None
+            }
+            for oc in other_countries
+        ]
 
 
 # Serializerهای درخواست (برای Swagger بهتر از swagger_serializer_method استفاده می‌کنیم)
@@ -260,6 +296,20 @@ class CrawlRequestSerializer(serializers.Serializer):
         allow_blank=True,
         help_text="شناسه سشن"
     )
+    concurrency = serializers.IntegerField(
+        min_value=1,
+        max_value=16,
+        required=False,
+        help_text="تعداد درایورهای موازی (پیش‌فرض: تنظیمات کشور)"
+    )
+    force = serializers.BooleanField(
+        default=False,
+        help_text="کراول حتی اگر داده ذخیره شده هنوز تازه باشد"
+    )
+    run_async = serializers.BooleanField(
+        default=True,
+        help_text="اجرا در پس‌زمینه (Celery) و برگرداندن job_id"
+    )
 
     class Meta:
         ref_name = "AmazonCrawlRequest"
@@ -289,6 +339,14 @@ class CrawlSingleRequestSerializer(serializers.Serializer):
         default='amazon_crawler',
         help_text="نام درایور"
     )
+    force = serializers.BooleanField(
+        default=False,
+        help_text="کراول حتی اگر داده ذخیره شده هنوز تازه باشد"
+    )
+    run_async = serializers.BooleanField(
+        default=True,
+        help_text="اجرا در پس‌زمینه (Celery) و برگرداندن job_id"
+    )
 
     def validate(self, data):
         """اعتبارسنجی: حداقل یکی از asin یا url باید وجود داشته باشد"""
@@ -311,6 +369,23 @@ class VerifyMatchRequestSerializer(serializers.Serializer):
         required=True,
         help_text="ASIN مورد انتظار"
     )
+    country_code = serializers.CharField(
+        max_length=2,
+        required=False,
+        allow_blank=True,
+        help_text="کد کشور (پیش‌فرض: از دامنه URL)"
+    )
+
+
+class BulkVerifyMatchRequestSerializer(serializers.Serializer):
+    """Serializer برای تأیید دسته‌ای تطابق محصولات"""
+
+    items = VerifyMatchRequestSerializer(
+        many=True,
+        allow_empty=False,
+        max_length=settings.AMAZON_BULK_VERIFY_MAX_ITEMS,
+        help_text="لیست {url, asin, country_code}"
+    )
 
 
 class CrawlByURLRequestSerializer(serializers.Serializer):
@@ -320,6 +395,10 @@ class CrawlByURLRequestSerializer(serializers.Serializer):
         required=True,
         help_text="URL محصول"
     )
+    run_async = serializers.BooleanField(
+        default=True,
+        help_text="اجرا در پس‌زمینه (Celery) و برگرداندن job_id"
+    )
 
 
 class PriceHistoryRequestSerializer(serializers.Serializer):
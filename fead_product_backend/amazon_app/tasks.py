@@ -0,0 +1,178 @@
+# amazon_app/tasks.py
+import logging
+import uuid
+
+from celery import shared_task
+from celery.signals import worker_process_init
+from django.conf import settings
+from django.utils import timezone
+
+from .amazon_crawler import AmazonCrawlerService
+from .driver_warmup import AmazonDriverWarmer
+from .models import AmazonCrawlSession
+from .partitions import PricePartitionManager
+from .rollups import PriceRollupCompactor
+from .scheduler import AmazonRefreshScheduler
+
+logger = logging.getLogger(__name__)
+
+crawler_service = AmazonCrawlerService()
+driver_warmer = AmazonDriverWarmer(crawler_service)
+
+CRAWL_TASK_TIME_LIMIT = getattr(settings, 'AMAZON_CRAWL_TASK_TIME_LIMIT', 12 * 60 * 60)
+
+
+@worker_process_init.connect
+def warm_up_amazon_drivers(**kwargs):
+    """گرم کردن pool درایورهای آمازون در هر پروسه worker (در پس‌زمینه تا شروع worker معطل نشود)
+
+    پیش‌فرض خاموش: هر پروسه فرزند pool خودش را دارد، پس هزینه = پروسه‌ها × کشورها × اندازه pool گرم session
+    """
+    if getattr(settings, 'AMAZON_DRIVER_WARMUP_ON_WORKER_START', False):
+        driver_warmer.start()
+
+
+def enqueue_crawl_job(task, task_kwargs, driver_name, country_code, total_products, session_id=None):
+    """ساخت session در وضعیت PENDING و ارسال task به صف Celery - شناسه job همان session_id است"""
+    session_id = session_id or str(uuid.uuid4())
+
+    crawl_session = AmazonCrawlSession.objects.create(
+        session_id=session_id,
+        driver_name=driver_name,
+        country_code=country_code,
+        total_products=total_products,
+        status='PENDING'
+    )
+
+    try:
+        task.apply_async(kwargs={'session_id': session_id, **task_kwargs}, task_id=session_id)
+    except Exception as e:
+        logger.error(f"❌ Could not enqueue crawl job {session_id}: {e}")
+        crawl_session.status = 'FAILED'
+        crawl_session.error_log = f"Enqueue failed: {e}"
+        crawl_session.completed_at = timezone.now()
+        crawl_session.save(update_fields=['status', 'error_log', 'completed_at'])
+        raise
+
+    return crawl_session
+
+
+def _mark_session_failed(session_id, error):
+    AmazonCrawlSession.objects.filter(session_id=session_id).update(
+        status='FAILED',
+        error_log=str(error),
+        completed_at=timezone.now()
+    )
+
+
+def _finish_single_session(session_id, asin, product_data):
+    """ثبت نتیجه job های تک محصولی در session"""
+    success = bool(product_data)
+    AmazonCrawlSession.objects.filter(session_id=session_id).update(
+        status='COMPLETED' if success else 'FAILED',
+        successful_crawls=1 if success else 0,
+        failed_crawls=0 if success else 1,
+        asins_crawled=[asin] if asin and success else [],
+        completed_at=timezone.now()
+    )
+
+
+@shared_task(bind=True, time_limit=CRAWL_TASK_TIME_LIMIT)
+def crawl_products_task(self, session_id, asins, country_code='US', driver_name='amazon_crawler', concurrency=None,
+                        force=False, caller='api'):
+    """کراول دسته‌ای محصولات در پس‌زمینه"""
+    try:
+        results = crawler_service.crawl_products(
+            asins,
+            country_code,
+            driver_name,
+            session_id,
+            concurrency=concurrency,
+            force=force,
+            caller=caller
+        )
+        if 'error' in results:
+            _mark_session_failed(session_id, results['error'])
+        return results
+    except Exception as e:
+        logger.error(f"💥 Crawl job {session_id} failed: {e}")
+        _mark_session_failed(session_id, e)
+        raise
+
+
+@shared_task(bind=True, time_limit=CRAWL_TASK_TIME_LIMIT)
+def crawl_single_product_task(self, session_id, product_identifier, country_code='US', driver_name='amazon_crawler',
+                              force=False):
+    """کراول یک محصول (ASIN یا URL) در پس‌زمینه"""
+    try:
+        AmazonCrawlSession.objects.filter(session_id=session_id).update(status='RUNNING')
+        product_data = crawler_service.crawl_single_product(
+            product_identifier, country_code, driver_name, force=force, caller='api'
+        )
+        asin = product_data.get('asin') if product_data else product_identifier
+        _finish_single_session(session_id, asin, product_data)
+        return product_data
+    except Exception as e:
+        logger.error(f"💥 Crawl job {session_id} failed: {e}")
+        _mark_session_failed(session_id, e)
+        raise
+
+
+@shared_task(bind=True, time_limit=CRAWL_TASK_TIME_LIMIT)
+def crawl_by_url_task(self, session_id, product_url):
+    """کراول محصول با URL در پس‌زمینه"""
+    try:
+        AmazonCrawlSession.objects.filter(session_id=session_id).update(status='RUNNING')
+        product_data = crawler_service.crawl_product_by_url(product_url)
+        asin = product_data.get('asin') if product_data else crawler_service.driver_manager.extract_asin_from_url(product_url)
+        _finish_single_session(session_id, asin, product_data)
+        return product_data
+    except Exception as e:
+        logger.error(f"💥 Crawl job {session_id} failed: {e}")
+        _mark_session_failed(session_id, e)
+        raise
+
+
+@shared_task
+def rebuild_refresh_queue_task():
+    """بازسازی دوره‌ای صف اولویت بروزرسانی (beat)"""
+    if not getattr(settings, 'AMAZON_REFRESH_ENABLED', True):
+        return 0
+    return AmazonRefreshScheduler().rebuild_queue()
+
+
+@shared_task
+def dispatch_refresh_task():
+    """ارسال دوره‌ای محصولات موعد رسیده به کراولر در محدوده بودجه (beat)"""
+    if not getattr(settings, 'AMAZON_REFRESH_ENABLED', True):
+        return {}
+
+    def enqueue(country_code, asins):
+        enqueue_crawl_job(
+            crawl_products_task,
+            {
+                'asins': asins,
+                'country_code': country_code,
+                'driver_name': 'amazon_scheduler',
+                # اولویت‌بندی خودش موعد بروزرسانی را تعیین کرده است
+                'force': True,
+                'caller': 'scheduler',
+            },
+            driver_name='amazon_scheduler',
+            country_code=country_code,
+            total_products=len(asins)
+        )
+
+    return AmazonRefreshScheduler().dispatch(enqueue)
+
+
+@shared_task
+def compact_price_rollups_task():
+    """بروزرسانی دوره‌ای جداول خلاصه قیمت روزانه/ساعتی (beat)"""
+    return PriceRollupCompactor().compact()
+
+
+@shared_task
+def maintain_price_partitions_task():
+    """ساخت پارتیشن‌های ماه‌های آینده و اعمال سیاست نگهداری قیمت‌ها (beat)"""
+    return PricePartitionManager().maintain()
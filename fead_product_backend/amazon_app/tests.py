@@ -1,3 +1,302 @@
-from django.test import TestCase
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from contract_manager.models import Country
+
+from .amazon_crawler import AmazonCrawlerService
+from .models import AmazonPriceDailyRollup, AmazonProduct, AmazonProductPrice
+from .pagination import InvalidCursor, KeysetPaginator
+from .persistence import record_price_observation
+from .price_history import expand_price_runs
+from .rollups import PriceRollupCompactor
+from .serializers import AmazonProductDetailSerializer, get_price_statistics_map
+from .url_normalizer import AmazonURL, normalize_amazon_url
+
+
+def price_fields(price, crawl_timestamp, seller='Amazon', shipping_info=''):
+    return {
+        'price': Decimal(price),
+        'currency': 'USD',
+        'country_code': 'US',
+        'seller': seller,
+        'seller_type': '',
+        'availability': True,
+        'shipping_info': shipping_info,
+        'crawl_source': 'test',
+        'crawl_timestamp': crawl_timestamp,
+    }
+
+
+@override_settings(AMAZON_PRICE_STORAGE_MODE='change_only', AMAZON_PRICE_MAX_RUN_DAYS=7)
+class ChangeOnlyPriceStorageTests(TestCase):
+
+    def setUp(self):
+        self.product = AmazonProduct.objects.create(asin='B000TEST01', country_code='US', title='Test product')
+        self.start = timezone.now() - timedelta(days=20)
+
+    def observe(self, price, hours, **kwargs):
+        return record_price_observation(self.product, price_fields(price, self.start + timedelta(hours=hours), **kwargs))
+
+    def test_unchanged_observations_extend_the_run(self):
+        for hours in range(3):
+            self.observe('10.00', hours)
+
+        run = AmazonProductPrice.objects.get(product=self.product)
+        self.assertEqual(run.observation_count, 3)
+        self.assertEqual(run.crawl_timestamp, self.start)
+        self.assertEqual(run.last_seen_at, self.start + timedelta(hours=2))
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.latest_price_row_id, run.pk)
+        self.assertEqual(self.product.latest_price_observation_count, 3)
+        self.assertEqual(self.product.latest_price_seen_at, run.last_seen_at)
+
+    def test_price_or_seller_change_starts_a_new_run(self):
+        self.observe('10.00', 0)
+        self.observe('10.00', 1)
+        self.observe('12.00', 2)
+        self.observe('12.00', 3, seller='Other')
+
+        runs = list(self.product.prices.order_by('crawl_timestamp').values_list('price', 'seller', 'observation_count'))
+        self.assertEqual(runs, [
+            (Decimal('10.00'), 'Amazon', 2),
+            (Decimal('12.00'), 'Amazon', 1),
+            (Decimal('12.00'), 'Other', 1),
+        ])
+
+    def test_runs_are_capped_at_max_run_length(self):
+        for day in range(10):
+            self.observe('10.00', day * 24)
+
+        counts = list(self.product.prices.order_by('crawl_timestamp').values_list('observation_count', flat=True))
+        self.assertEqual(counts, [8, 2])
+
+    @override_settings(AMAZON_PRICE_STORAGE_MODE='every_observation')
+    def test_every_observation_mode_stores_each_crawl(self):
+        for hours in range(3):
+            self.observe('10.00', hours)
+
+        self.assertEqual(self.product.prices.count(), 3)
+
+
+@override_settings(AMAZON_PRICE_STORAGE_MODE='change_only')
+class WeightedPriceStatisticsTests(TestCase):
+
+    def setUp(self):
+        self.product = AmazonProduct.objects.create(asin='B000TEST02', country_code='US', title='Test product')
+        now = timezone.now()
+        # سه مشاهده 10 (قدیمی، با ارسال آمازون) و یک مشاهده 30 (اخیر): میانگین وزن‌دار 15، نه 20
+        old = now - timedelta(days=60)
+        for hours in range(3):
+            record_price_observation(
+                self.product, price_fields('10.00', old + timedelta(hours=hours), shipping_info='Fulfilled by Amazon')
+            )
+        record_price_observation(self.product, price_fields('30.00', now - timedelta(days=1)))
+        self.product.refresh_from_db()
+
+    def test_statistics_map_is_weighted_by_observations(self):
+        stats = get_price_statistics_map([self.product.pk])[self.product.pk]
+
+        self.assertEqual(stats['price_count'], 4)
+        self.assertAlmostEqual(stats['avg_price'], 15.0)
+        self.assertEqual((stats['min_price'], stats['max_price']), (10.0, 30.0))
+
+    def test_detail_statistics_are_weighted_by_observations(self):
+        stats = AmazonProductDetailSerializer(self.product).data['price_statistics']
+
+        self.assertEqual(stats['all_time']['price_count'], 4)
+        self.assertAlmostEqual(stats['all_time']['avg_price'], 15.0)
+        self.assertEqual(stats['all_time']['fba_count'], 3)
+        self.assertEqual(stats['last_30_days']['price_count'], 1)
+        self.assertAlmostEqual(stats['last_30_days']['avg_price'], 30.0)
+
+
+@override_settings(AMAZON_PRICE_STORAGE_MODE='change_only', AMAZON_PRICE_MAX_RUN_DAYS=7)
+class PriceRollupCompactorTests(TestCase):
+
+    def setUp(self):
+        self.product = AmazonProduct.objects.create(asin='B000TEST03', country_code='US', title='Test product')
+        self.start = timezone.now() - timedelta(days=40)
+        for step, price in enumerate(['10.00', '10.00', '12.00', '11.00'] * 60):
+            record_price_observation(self.product, price_fields(price, self.start + timedelta(hours=step * 4)))
+
+    def raw_history(self, granularity):
+        runs = self.product.prices.order_by('crawl_timestamp')
+        return expand_price_runs(runs, granularity, since=self.start)
+
+    def test_history_matches_raw_data(self):
+        compactor = PriceRollupCompactor()
+        self.assertGreater(compactor.compact(), 0)
+
+        watermark = compactor.get_watermark()
+        self.assertLess(watermark, timezone.now() - timedelta(days=7))
+        self.assertFalse(AmazonPriceDailyRollup.objects.filter(bucket_start__gte=watermark).exists())
+
+        for granularity in ('daily', 'hourly'):
+            with self.subTest(granularity=granularity):
+                history = compactor.get_history(self.product, granularity, self.start)
+                expected = self.raw_history(granularity)
+                self.assertEqual([entry['bucket'] for entry in history], [entry['bucket'] for entry in expected])
+                for entry, raw in zip(history, expected):
+                    self.assertAlmostEqual(entry['avg_price'], raw['avg_price'], places=2)
+                    self.assertEqual((entry['min_price'], entry['max_price']), (raw['min_price'], raw['max_price']))
+
+    def test_watermark_is_persisted_and_only_advances_past_final_days(self):
+        compactor = PriceRollupCompactor()
+        compactor.compact()
+        rollups = AmazonPriceDailyRollup.objects.count()
+
+        # تا نهایی شدن روز بعد چیزی دوباره نوشته نمی‌شود
+        self.assertEqual(PriceRollupCompactor().compact(), 0)
+        self.assertEqual(AmazonPriceDailyRollup.objects.count(), rollups)
+
+        later = PriceRollupCompactor()
+        self.assertEqual(later.compact(now=timezone.now() + timedelta(days=2)), 1)
+        self.assertEqual(later.get_watermark(), later.final_until(timezone.now() + timedelta(days=2)))
+        self.assertEqual(AmazonPriceDailyRollup.objects.count(), rollups + 2)
+
+
+class CrawlSingleFlightTests(TestCase):
+
+    def setUp(self):
+        Country.objects.create(code='US', name='United States')
+        self.service = AmazonCrawlerService()
+        self.locks = []
+        # ASIN هایی که درخواست هم‌زمان دیگری در زمان انتظار برای قفل کراول می‌کند
+        self.crawled_concurrently = set()
+
+        @contextmanager
+        def single_flight(asin, country_code):
+            self.locks.append((asin, country_code))
+            if asin in self.crawled_concurrently:
+                AmazonProduct.objects.update_or_create(
+                    asin=asin, country_code=country_code, defaults={'title': 'Shared', 'last_crawled': timezone.now()}
+                )
+            yield
+
+        self.service.freshness.single_flight = single_flight
+
+    def test_batch_crawl_locks_each_asin_and_skips_concurrent_crawls(self):
+        self.crawled_concurrently.add('B000TEST05')
+        with mock.patch.object(self.service, '_crawl_asin', return_value=None) as crawl_asin:
+            results = self.service.crawl_products(['B000TEST04', 'B000TEST05'], 'US')
+
+        self.assertEqual(self.locks, [('B000TEST04', 'US'), ('B000TEST05', 'US')])
+        self.assertEqual([call.args[0] for call in crawl_asin.call_args_list], ['B000TEST04'])
+        self.assertEqual(results['skipped_fresh'], ['B000TEST05'])
+        self.assertEqual(results['failed'], ['B000TEST04'])
+
+    def test_url_crawl_takes_the_asin_lock(self):
+        url = 'https://www.amazon.de/dp/B08N5WRWNW?th=1'
+        with mock.patch.object(self.service, '_crawl_url', return_value={'asin': 'B08N5WRWNW'}) as crawl_url:
+            self.assertEqual(self.service.crawl_product_by_url(url), {'asin': 'B08N5WRWNW'})
+
+            self.crawled_concurrently.add('B08N5WRWNW')
+            shared = self.service.crawl_product_by_url(url)
+
+        self.assertEqual(self.locks, [('B08N5WRWNW', 'DE')] * 2)
+        self.assertEqual(crawl_url.call_count, 1)
+        self.assertTrue(shared['from_cache'])
+
+
+class KeysetPaginatorTests(TestCase):
+
+    def setUp(self):
+        # مقادیر تکراری و NULL تا شکستن تساوی با pk و رفتن به ردیف‌های NULL آزموده شود
+        ratings = [Decimal('4.50'), None, Decimal('3.00'), Decimal('4.50'), None, Decimal('5.00'), Decimal('3.00')]
+        for index, rating in enumerate(ratings):
+            AmazonProduct.objects.create(asin=f'B000PAGE{index:02d}', country_code='US', title='Page', rating=rating)
+
+    def walk(self, paginator, page_size):
+        pks, cursor = [], None
+        while True:
+            items, cursor = paginator.paginate(AmazonProduct.objects.all(), page_size, cursor)
+            pks.extend(item.pk for item in items)
+            if not cursor:
+                return pks
+
+    def test_pages_follow_order_in_both_directions(self):
+        for sort_order in ('desc', 'asc'):
+            paginator = KeysetPaginator(AmazonProduct, 'rating', sort_order)
+            expected = list(paginator.order(AmazonProduct.objects.all()).values_list('pk', flat=True))
+            for page_size in (1, 2, 3, 10):
+                with self.subTest(sort_order=sort_order, page_size=page_size):
+                    self.assertEqual(self.walk(paginator, page_size), expected)
+
+    def test_only_whitelisted_sort_fields(self):
+        for sort_by in ('prices', 'seller_info', 'search_vector', 'title'):
+            with self.subTest(sort_by=sort_by):
+                with self.assertRaises(InvalidCursor):
+                    KeysetPaginator(AmazonProduct, sort_by)
+        self.assertEqual(KeysetPaginator(AmazonProduct, 'price').field_name, 'latest_price')
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(InvalidCursor):
+            KeysetPaginator(AmazonProduct, 'rating').paginate(AmazonProduct.objects.all(), 2, 'not-a-cursor')
+
+
+class NormalizeAmazonURLTests(SimpleTestCase):
+
+    def test_country_from_host(self):
+        cases = {
+            'https://www.amazon.com/dp/B08N5WRWNW': ('US', 'amazon.com'),
+            'https://amazon.co.uk/dp/B08N5WRWNW': ('UK', 'amazon.co.uk'),
+            'https://smile.amazon.de/dp/B08N5WRWNW': ('DE', 'amazon.de'),
+            'https://www.amazon.com.au/dp/B08N5WRWNW': ('AU', 'amazon.com.au'),
+            'https://WWW.AMAZON.CO.JP/dp/B08N5WRWNW': ('JP', 'amazon.co.jp'),
+        }
+        for url, (country_code, domain) in cases.items():
+            with self.subTest(url=url):
+                result = normalize_amazon_url(url)
+                self.assertEqual((result.country_code, result.domain), (country_code, domain))
+
+    def test_unknown_host_has_no_country(self):
+        for url in ('https://www.example.com/dp/B08N5WRWNW', 'https://notamazon.com/dp/B08N5WRWNW'):
+            with self.subTest(url=url):
+                result = normalize_amazon_url(url)
+                self.assertIsNone(result.country_code)
+                self.assertEqual(result.asin, 'B08N5WRWNW')
+                self.assertEqual(result.canonical_url, 'https://www.amazon.com/dp/B08N5WRWNW')
+
+    def test_asin_from_path(self):
+        cases = [
+            'https://www.amazon.com/Example-Product/dp/B08N5WRWNW/ref=sr_1_1?keywords=x',
+            'https://www.amazon.com/dp/b08n5wrwnw',
+            'https://www.amazon.com/gp/product/B08N5WRWNW?th=1',
+            'https://www.amazon.com/gp/aw/d/B08N5WRWNW',
+            'https://www.amazon.com/gp/offer-listing/B08N5WRWNW/',
+        ]
+        for url in cases:
+            with self.subTest(url=url):
+                result = normalize_amazon_url(url)
+                self.assertEqual(result.asin, 'B08N5WRWNW')
+                self.assertEqual(result.canonical_url, 'https://www.amazon.com/dp/B08N5WRWNW')
+
+    def test_asin_from_query_and_invalid_asin(self):
+        self.assertEqual(normalize_amazon_url('https://www.amazon.com/some/page?asin=B08N5WRWNW').asin, 'B08N5WRWNW')
+        self.assertIsNone(normalize_amazon_url('https://www.amazon.com/dp/B08N5').asin)
+        self.assertIsNone(normalize_amazon_url('https://www.amazon.com/dp/B08N5WRWNWX').asin)
+
+    def test_seller_params(self):
+        cases = {
+            'https://www.amazon.com/dp/B08N5WRWNW?m=A1SELLER': 'A1SELLER',
+            'https://www.amazon.com/dp/B08N5WRWNW?th=1&smid=A2SELLER': 'A2SELLER',
+            'https://www.amazon.com/dp/B08N5WRWNW?seller=A3SELLER': 'A3SELLER',
+            'https://www.amazon.com/dp/B08N5WRWNW': '',
+        }
+        for url, seller_id in cases.items():
+            with self.subTest(url=url):
+                self.assertEqual(normalize_amazon_url(url).seller_id, seller_id)
+
+    def test_malformed_input_returns_empty_result(self):
+        empty = AmazonURL(None, None, '', None, None)
+        for url in ('', None, 'http://[::1', 'https://[invalid/dp/B08N5WRWNW', 'not a url'):
+            with self.subTest(url=url):
+                self.assertEqual(normalize_amazon_url(url), empty)
+        # فراخوان‌ها روی خروجی خالی به US برمی‌گردند
+        self.assertEqual(normalize_amazon_url('http://[::1').country_code or 'US', 'US')
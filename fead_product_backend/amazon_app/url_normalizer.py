@@ -0,0 +1,86 @@
+# amazon_app/url_normalizer.py
+import re
+from collections import namedtuple
+from functools import lru_cache
+from urllib.parse import parse_qs, urlsplit
+
+# دامنه آمازون -> کد کشور
+AMAZON_DOMAINS = {
+    'amazon.com': 'US',
+    'amazon.co.uk': 'UK',
+    'amazon.de': 'DE',
+    'amazon.fr': 'FR',
+    'amazon.it': 'IT',
+    'amazon.es': 'ES',
+    'amazon.ca': 'CA',
+    'amazon.co.jp': 'JP',
+    'amazon.com.au': 'AU',
+    'amazon.ae': 'AE',
+    'amazon.sa': 'SA',
+    'amazon.com.tr': 'TR',
+    'amazon.cn': 'CN',
+    'amazon.in': 'IN',
+    'amazon.com.br': 'BR',
+}
+
+# طولانی‌ترین دامنه اول تا amazon.com.au با amazon.com اشتباه نشود
+DOMAIN_PATTERN = re.compile(
+    r'(?:^|\.)(' + '|'.join(re.escape(domain) for domain in sorted(AMAZON_DOMAINS, key=len, reverse=True)) + r')$'
+)
+
+# /dp/ASIN ، /gp/product/ASIN ، /gp/aw/d/ASIN (موبایل) ، /gp/offer-listing/ASIN ، /exec/obidos/ASIN/ASIN
+ASIN_PATH_PATTERN = re.compile(
+    r'/(?:dp|gp/product|gp/aw/d|gp/offer-listing|exec/obidos/asin|o/asin)/([a-z0-9]{10})(?=[/?#;]|$)',
+    re.IGNORECASE
+)
+ASIN_PATTERN = re.compile(r'^[A-Za-z0-9]{10}$')
+
+# پارامترهای query که ASIN یا فروشنده را نگه می‌دارند
+ASIN_PARAMS = ('asin', 'ASIN')
+SELLER_PARAMS = ('m', 'smid', 'seller')
+
+URL_CACHE_SIZE = 10000
+
+AmazonURL = namedtuple('AmazonURL', ['asin', 'country_code', 'seller_id', 'domain', 'canonical_url'])
+EMPTY_URL = AmazonURL(None, None, '', None, None)
+
+
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def normalize_amazon_url(url):
+    """پارس یک URL آمازون در یک فراخوانی: (asin, country_code, seller_id, domain, canonical_url)
+
+    country_code و domain برای دامنه‌های ناشناخته None هستند؛ canonical_url فقط وقتی ASIN پیدا شود.
+    URL خراب (مثلاً IPv6 ناقص) خطا نمی‌دهد و خروجی خالی دارد تا fallback فراخوان‌ها کار کند.
+    """
+    if not url:
+        return EMPTY_URL
+
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return EMPTY_URL
+    host = parts.hostname or ''
+    domain_match = DOMAIN_PATTERN.search(host)
+    domain = domain_match.group(1) if domain_match else None
+
+    asin = None
+    path_match = ASIN_PATH_PATTERN.search(parts.path)
+    if path_match:
+        asin = path_match.group(1).upper()
+
+    seller_id = ''
+    if parts.query:
+        params = parse_qs(parts.query)
+        if asin is None:
+            for name in ASIN_PARAMS:
+                value = params.get(name, [''])[0]
+                if ASIN_PATTERN.match(value):
+                    asin = value.upper()
+                    break
+        for name in SELLER_PARAMS:
+            if params.get(name):
+                seller_id = params[name][0]
+                break
+
+    canonical_url = f"https://www.{domain or 'amazon.com'}/dp/{asin}" if asin else None
+    return AmazonURL(asin, AMAZON_DOMAINS.get(domain), seller_id, domain, canonical_url)
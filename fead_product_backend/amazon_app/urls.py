@@ -8,7 +8,9 @@ urlpatterns = [
     path('crawl/', views.CrawlProductsAPIView.as_view(), name='crawl_products'),
     path('crawl-single/', views.CrawlSingleProductAPIView.as_view(), name='crawl_single_product'),
     path('crawl-by-url/', views.CrawlByURLAPIView.as_view(), name='crawl_by_url'),
+    path('crawl-jobs/<str:job_id>/', views.CrawlJobStatusAPIView.as_view(), name='crawl_job_status'),
     path('verify-match/', views.VerifyProductMatchAPIView.as_view(), name='verify_product_match'),
+    path('verify-match/bulk/', views.BulkVerifyProductMatchAPIView.as_view(), name='bulk_verify_product_match'),
     path('products/<str:asin>/history/', views.GetPriceHistoryAPIView.as_view(), name='price_history'),
     path('stats/', views.GetCrawlStatsAPIView.as_view(), name='crawl_stats'),
 ]
\ No newline at end of file
@@ -1,6 +1,9 @@
 # amazon_app/views.py
 from datetime import datetime, timedelta
-from django.db.models import Count, Avg, Max, Min, Q
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Avg, Max, Min, Q, Sum
+from django.utils import timezone
 from rest_framework.authentication import SessionAuthentication, BasicAuthentication
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -10,23 +13,46 @@ from rest_framework_simplejwt.authentication import JWTAuthentication
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
+from celery.result import AsyncResult
+from django.urls import reverse
+
 from .amazon_crawler import AmazonCrawlerService
 from .permissions import IsAdminForAmazonAPI
-from .models import AmazonProduct, AmazonProductPrice
+from .models import AmazonProduct, AmazonProductPrice, AmazonCrawlSession, AmazonCrawlOutcome
+from .tasks import enqueue_crawl_job, crawl_products_task, crawl_single_product_task, crawl_by_url_task
+from .pagination import KeysetPaginator, InvalidCursor, estimate_count
+from .search import search_products
+from .price_history import price_runs_in_window, summarize_price_runs, summarize_price_buckets
+from .rollups import PriceRollupCompactor
 from .serializers import (
     AmazonProductListSerializer,
     AmazonProductDetailSerializer,
     CrawlRequestSerializer,
     CrawlSingleRequestSerializer,
     VerifyMatchRequestSerializer,
+    BulkVerifyMatchRequestSerializer,
     CrawlByURLRequestSerializer,
     PriceHistoryRequestSerializer,
-    ProductStatsSerializer
+    ProductStatsSerializer,
+    parse_history_days
 )
 from contract_manager.models import Product
 
 crawler_service = AmazonCrawlerService()
 
+CRAWL_JOB_ACCEPTED_RESPONSE = openapi.Response(
+    description='job در صف قرار گرفت (run_async=true)',
+    examples={
+        'application/json': {
+            'success': True,
+            'job_id': 'abc123',
+            'session_id': 'abc123',
+            'status': 'PENDING',
+            'status_url': 'http://example.com/api/amazon/crawl-jobs/abc123/'
+        }
+    }
+)
+
 
 class AmazonBaseAPIView(APIView):
     """کلاس پایه برای تمام APIهای آمازون - فقط برای Admin"""
@@ -37,6 +63,18 @@ class AmazonBaseAPIView(APIView):
     ]
     permission_classes = [IsAuthenticated, IsAdminForAmazonAPI]
 
+    def enqueued_response(self, request, crawl_session):
+        """پاسخ استاندارد برای job های در صف"""
+        return Response({
+            'success': True,
+            'job_id': crawl_session.session_id,
+            'session_id': crawl_session.session_id,
+            'status': crawl_session.status,
+            'status_url': request.build_absolute_uri(
+                reverse('crawl_job_status', args=[crawl_session.session_id])
+            )
+        }, status=status.HTTP_202_ACCEPTED)
+
 
 class ListProductsAPIView(AmazonBaseAPIView):
     """لیست محصولات آمازون با فیلترهای مختلف - فقط برای Admin"""
@@ -54,7 +92,7 @@ class ListProductsAPIView(AmazonBaseAPIView):
             openapi.Parameter(
                 'page_size',
                 openapi.IN_QUERY,
-                description="تعداد آیتم در هر صفحه",
+                description="تعداد آیتم در هر صفحه (حداکثر: 100)",
                 type=openapi.TYPE_INTEGER,
                 default=20
             ),
@@ -99,9 +137,9 @@ class ListProductsAPIView(AmazonBaseAPIView):
             openapi.Parameter(
                 'sort_by',
                 openapi.IN_QUERY,
-                description="مرتب‌سازی بر اساس (last_crawled, rating, review_count, price)",
+                description="مرتب‌سازی بر اساس (last_crawled, rating, review_count, price, relevance - پیش‌فرض در جستجو)",
                 type=openapi.TYPE_STRING,
-                enum=['last_crawled', 'rating', 'review_count', 'price']
+                enum=['last_crawled', 'rating', 'review_count', 'price', 'relevance']
             ),
             openapi.Parameter(
                 'sort_order',
@@ -129,6 +167,27 @@ class ListProductsAPIView(AmazonBaseAPIView):
                 description="لیست ASINها (جدا شده با کاما)",
                 type=openapi.TYPE_STRING
             ),
+            openapi.Parameter(
+                'pagination',
+                openapi.IN_QUERY,
+                description="نوع صفحه‌بندی (page: شماره صفحه، cursor: keyset برای پیمایش کامل کاتالوگ)",
+                type=openapi.TYPE_STRING,
+                enum=['page', 'cursor'],
+                default='page'
+            ),
+            openapi.Parameter(
+                'cursor',
+                openapi.IN_QUERY,
+                description="cursor صفحه بعد (از next_cursor پاسخ قبلی)",
+                type=openapi.TYPE_STRING
+            ),
+            openapi.Parameter(
+                'total',
+                openapi.IN_QUERY,
+                description="محاسبه تعداد کل (exact: COUNT، estimate: تخمین planner، none: بدون تعداد - پیش‌فرض cursor)",
+                type=openapi.TYPE_STRING,
+                enum=['exact', 'estimate', 'none']
+            ),
         ],
         responses={
             200: openapi.Response(
@@ -159,10 +218,15 @@ class ListProductsAPIView(AmazonBaseAPIView):
                                 'review_count': 1234,
                                 'image_url': 'http://example.com/image.jpg',
                                 'current_price': {
-                                    'price': 99.99,
+                                    'id': 1024,
+                                    'price': '99.99',
                                     'currency': 'USD',
                                     'seller': 'Amazon',
-                                    'timestamp': '2024-01-15T10:30:00Z'
+                                    'availability': True,
+                                    'crawl_timestamp': '2024-01-10T08:00:00Z',
+                                    'last_seen_at': '2024-01-15T10:30:00Z',
+                                    'observation_count': 12,
+                                    'shipping_info': 'FREE delivery'
                                 }
                             }
                         ]
@@ -174,30 +238,38 @@ class ListProductsAPIView(AmazonBaseAPIView):
     def get(self, request):
         try:
             # دریافت پارامترها
-            page = int(request.query_params.get('page', 1))
-            page_size = int(request.query_params.get('page_size', 20))
+            try:
+                page = max(1, int(request.query_params.get('page', 1)))
+                page_size = int(request.query_params.get('page_size', 20))
+            except ValueError:
+                return Response(
+                    {'error': 'page and page_size must be integers'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            page_size = max(1, min(page_size, getattr(settings, 'AMAZON_PRODUCTS_MAX_PAGE_SIZE', 100)))
             search = request.query_params.get('search', '').strip()
             country_code = request.query_params.get('country_code', '').strip()
             category = request.query_params.get('category', '').strip()
             brand = request.query_params.get('brand', '').strip()
             min_rating = request.query_params.get('min_rating')
             min_reviews = request.query_params.get('min_reviews')
-            sort_by = request.query_params.get('sort_by', 'last_crawled')
             sort_order = request.query_params.get('sort_order', 'desc')
             has_price = request.query_params.get('has_price')
             days_since_last_crawl = request.query_params.get('days_since_last_crawl')
             asin_list = request.query_params.get('asin_list', '').strip()
+            pagination_mode = request.query_params.get('pagination', 'page')
+            cursor = request.query_params.get('cursor', '').strip()
+            keyset = pagination_mode == 'cursor' or bool(cursor)
+            # جستجو به صورت پیش‌فرض بر اساس امتیاز مرتب می‌شود (فقط در صفحه‌بندی شماره صفحه)
+            sort_by = request.query_params.get('sort_by') or ('relevance' if search and not keyset else 'last_crawled')
+            total_mode = request.query_params.get('total', 'none' if keyset else 'exact')
 
             # شروع Query
             queryset = AmazonProduct.objects.all()
 
             # اعمال فیلترها
             if search:
-                queryset = queryset.filter(
-                    Q(title__icontains=search) |
-                    Q(brand__icontains=search) |
-                    Q(asin__icontains=search)
-                )
+                queryset = search_products(queryset, search)
 
             if country_code:
                 queryset = queryset.filter(country_code=country_code.upper())
@@ -215,7 +287,7 @@ class ListProductsAPIView(AmazonBaseAPIView):
                 queryset = queryset.filter(review_count__gte=int(min_reviews))
 
             if has_price == 'true':
-                queryset = queryset.filter(prices__isnull=False).distinct()
+                queryset = queryset.filter(latest_price__isnull=False)
 
             if days_since_last_crawl:
                 cutoff_date = datetime.now() - timedelta(days=int(days_since_last_crawl))
@@ -225,26 +297,71 @@ class ListProductsAPIView(AmazonBaseAPIView):
                 asins = [asin.strip().upper() for asin in asin_list.split(',') if asin.strip()]
                 queryset = queryset.filter(asin__in=asins)
 
-            # مرتب‌سازی
-            if sort_by == 'rating':
-                sort_field = 'rating'
-            elif sort_by == 'review_count':
-                sort_field = 'review_count'
-            elif sort_by == 'price':
-                from django.db.models import Subquery, OuterRef
-                latest_price = AmazonProductPrice.objects.filter(
-                    product=OuterRef('pk')
-                ).order_by('-crawl_timestamp')
-
-                queryset = queryset.annotate(
-                    latest_price_value=Subquery(latest_price.values('price')[:1])
-                ).order_by(f'-latest_price_value' if sort_order == 'desc' else 'latest_price_value')
+            # فیلترهای اعمال شده
+            applied_filters = {
+                'search': search if search else None,
+                'country_code': country_code if country_code else None,
+                'category': category if category else None,
+                'brand': brand if brand else None,
+                'min_rating': float(min_rating) if min_rating else None,
+                'min_reviews': int(min_reviews) if min_reviews else None,
+                'has_price': has_price == 'true' if has_price else None,
+                'days_since_last_crawl': int(days_since_last_crawl) if days_since_last_crawl else None,
+                'sort_by': sort_by,
+                'sort_order': sort_order
+            }
+            applied_filters = {k: v for k, v in applied_filters.items() if v is not None}
+
+            # مرتب‌سازی - pk ترتیب ردیف‌های هم‌مقدار را پایدار می‌کند (price روی خلاصه آخرین قیمت)
+            paginator = None
+            if sort_by == 'relevance':
+                if not search or keyset:
+                    return Response(
+                        {'error': 'sort_by=relevance requires search and page pagination'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
             else:
-                sort_field = f'-{sort_by}' if sort_order == 'desc' else sort_by
-                queryset = queryset.order_by(sort_field)
+                try:
+                    paginator = KeysetPaginator(AmazonProduct, sort_by, sort_order)
+                except InvalidCursor as e:
+                    return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+            base_url = request.build_absolute_uri('/api/amazon/products/')
+            query_params = request.GET.copy()
+
+            # صفحه‌بندی cursor: هزینه هر صفحه مستقل از عمق آن (مناسب خروجی گرفتن و همگام‌سازی)
+            if keyset:
+                try:
+                    products, next_cursor = paginator.paginate(queryset, page_size, cursor or None)
+                except InvalidCursor as e:
+                    return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-            # صفحه‌بندی
-            total_count = queryset.count()
+                serializer = AmazonProductListSerializer(products, many=True)
+
+                next_page_url = None
+                if next_cursor:
+                    query_params['pagination'] = 'cursor'
+                    query_params['cursor'] = next_cursor
+                    next_page_url = f"{base_url}?{query_params.urlencode()}"
+
+                response_data = {
+                    'success': True,
+                    'count': len(serializer.data),
+                    'page_size': page_size,
+                    'next_cursor': next_cursor,
+                    'next_page': next_page_url,
+                    'filters': applied_filters,
+                    'products': serializer.data
+                }
+                if total_mode == 'exact':
+                    response_data['total_count'] = queryset.count()
+                elif total_mode == 'estimate':
+                    response_data['estimated_total'] = estimate_count(queryset)
+                return Response(response_data)
+
+            # صفحه‌بندی شماره صفحه
+            queryset = paginator.order(queryset) if paginator else queryset.order_by('-search_rank', '-pk')
+            total_count = estimate_count(queryset) if total_mode == 'estimate' else queryset.count()
             total_pages = (total_count + page_size - 1) // page_size
 
             if page > total_pages:
@@ -259,9 +376,6 @@ class ListProductsAPIView(AmazonBaseAPIView):
             serializer = AmazonProductListSerializer(products, many=True)
 
             # ساخت URLهای صفحه‌بندی
-            base_url = request.build_absolute_uri('/api/amazon/products/')
-            query_params = request.GET.copy()
-
             next_page_url = None
             if page < total_pages:
                 query_params['page'] = str(page + 1)
@@ -272,20 +386,6 @@ class ListProductsAPIView(AmazonBaseAPIView):
                 query_params['page'] = str(page - 1)
                 previous_page_url = f"{base_url}?{query_params.urlencode()}"
 
-            # فیلترهای اعمال شده
-            applied_filters = {
-                'search': search if search else None,
-                'country_code': country_code if country_code else None,
-                'category': category if category else None,
-                'brand': brand if brand else None,
-                'min_rating': float(min_rating) if min_rating else None,
-                'min_reviews': int(min_reviews) if min_reviews else None,
-                'has_price': has_price == 'true' if has_price else None,
-                'days_since_last_crawl': int(days_since_last_crawl) if days_since_last_crawl else None,
-                'sort_by': sort_by,
-                'sort_order': sort_order
-            }
-
             return Response({
                 'success': True,
                 'count': len(serializer.data),
@@ -295,7 +395,7 @@ class ListProductsAPIView(AmazonBaseAPIView):
                 'page_size': page_size,
                 'next_page': next_page_url,
                 'previous_page': previous_page_url,
-                'filters': {k: v for k, v in applied_filters.items() if v is not None},
+                'filters': applied_filters,
                 'products': serializer.data
             })
 
@@ -328,7 +428,7 @@ class GetProductDetailAPIView(AmazonBaseAPIView):
             openapi.Parameter(
                 'history_days',
                 openapi.IN_QUERY,
-                description="تعداد روزهای تاریخچه (پیش‌فرض: 90)",
+                description="تعداد روزهای تاریخچه (پیش‌فرض: 90، حداکثر: 365)",
                 type=openapi.TYPE_INTEGER,
                 default=90
             ),
@@ -361,10 +461,15 @@ class GetProductDetailAPIView(AmazonBaseAPIView):
                         'review_count': 1234,
                         'image_url': 'http://example.com/image.jpg',
                         'current_price': {
-                            'price': 99.99,
+                            'id': 1024,
+                            'price': '99.99',
                             'currency': 'USD',
                             'seller': 'Amazon',
-                            'timestamp': '2024-01-15T10:30:00Z'
+                            'availability': True,
+                            'crawl_timestamp': '2024-01-10T08:00:00Z',
+                            'last_seen_at': '2024-01-15T10:30:00Z',
+                            'observation_count': 12,
+                            'shipping_info': 'FREE delivery'
                         },
                         'price_statistics': {
                             'all_time': {
@@ -396,13 +501,46 @@ class GetProductDetailAPIView(AmazonBaseAPIView):
                     status=status.HTTP_404_NOT_FOUND
                 )
 
-            # سریالایز محصول با context برای پارامترهای query
-            serializer = AmazonProductDetailSerializer(
-                product,
-                context={'request': request}
+            try:
+                history_days = parse_history_days(request.query_params.get('history_days'))
+            except ValueError:
+                return Response(
+                    {'error': 'history_days must be an integer'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            # کش تا مشاهده قیمت بعدی همین محصول یا نسخه‌های سایر کشورها (available_in_other_countries):
+            # latest_price_seen_at و updated_at خود محصول و بیشینه آن‌ها بین نسخه‌های دیگر همان ASIN در کلید هستند
+            siblings = AmazonProduct.objects.filter(asin=product.asin).exclude(pk=product.pk).aggregate(
+                count=Count('pk'),
+                updated_at=Max('updated_at'),
+                latest_price_seen_at=Max('latest_price_seen_at'),
+            )
+            # محصولات سیستم با همین ASIN/کشور (system_products) - تعداد برای حذف و updated_at برای ویرایش
+            system_products = Product.objects.filter(
+                asin=product.asin, country__code=product.country_code
+            ).aggregate(count=Count('pk'), updated_at=Max('updated_at'))
+            cache_key = (
+                f"amazon:product_detail:{product.pk}:{history_days}:"
+                f"{product.updated_at.timestamp() if product.updated_at else 0}:"
+                f"{product.latest_price_seen_at.timestamp() if product.latest_price_seen_at else 0}:"
+                f"{siblings['count']}:"
+                f"{siblings['updated_at'].timestamp() if siblings['updated_at'] else 0}:"
+                f"{siblings['latest_price_seen_at'].timestamp() if siblings['latest_price_seen_at'] else 0}:"
+                f"{system_products['count']}:"
+                f"{system_products['updated_at'].timestamp() if system_products['updated_at'] else 0}"
             )
+            data = cache.get(cache_key)
+            if data is None:
+                # سریالایز محصول با context برای پارامترهای query
+                serializer = AmazonProductDetailSerializer(
+                    product,
+                    context={'request': request}
+                )
+                data = serializer.data
+                cache.set(cache_key, data, getattr(settings, 'AMAZON_DETAIL_CACHE_TTL', 300))
 
-            return Response(serializer.data)
+            return Response(data)
 
         except Exception as e:
             return Response(
@@ -418,6 +556,7 @@ class CrawlProductsAPIView(AmazonBaseAPIView):
         operation_description="Crawl کردن لیستی از محصولات آمازون (فقط Admin)",
         request_body=CrawlRequestSerializer,
         responses={
+            202: CRAWL_JOB_ACCEPTED_RESPONSE,
             200: openapi.Response(
                 description='عملیات موفق',
                 examples={
@@ -429,7 +568,8 @@ class CrawlProductsAPIView(AmazonBaseAPIView):
                             'total': 10,
                             'successful': 8,
                             'failed': 2,
-                            'failed_asins': ['B001', 'B002']
+                            'failed_asins': ['B001', 'B002'],
+                            'skipped_fresh': 3
                         }
                     }
                 }
@@ -456,11 +596,31 @@ class CrawlProductsAPIView(AmazonBaseAPIView):
 
         try:
             data = serializer.validated_data
+            if data['run_async']:
+                crawl_session = enqueue_crawl_job(
+                    crawl_products_task,
+                    {
+                        'asins': data['asins'],
+                        'country_code': data['country_code'],
+                        'driver_name': data['driver_name'],
+                        'concurrency': data.get('concurrency'),
+                        'force': data['force'],
+                    },
+                    driver_name=data['driver_name'],
+                    country_code=data['country_code'],
+                    total_products=len(data['asins']),
+                    session_id=data.get('session_id') or None
+                )
+                return self.enqueued_response(request, crawl_session)
+
             results = crawler_service.crawl_products(
                 data['asins'],
                 data['country_code'],
                 data['driver_name'],
-                data.get('session_id')
+                data.get('session_id'),
+                concurrency=data.get('concurrency'),
+                force=data['force'],
+                caller='api'
             )
 
             if 'error' in results:
@@ -477,7 +637,8 @@ class CrawlProductsAPIView(AmazonBaseAPIView):
                     'total': results['total'],
                     'successful': len(results['successful']),
                     'failed': len(results['failed']),
-                    'failed_asins': results['failed']
+                    'failed_asins': results['failed'],
+                    'skipped_fresh': len(results['skipped_fresh'])
                 }
             })
 
@@ -495,6 +656,7 @@ class CrawlSingleProductAPIView(AmazonBaseAPIView):
         operation_description="Crawl کردن یک محصول آمازون (فقط Admin)",
         request_body=CrawlSingleRequestSerializer,
         responses={
+            202: CRAWL_JOB_ACCEPTED_RESPONSE,
             200: openapi.Response(
                 description='عملیات موفق',
                 examples={
@@ -523,10 +685,27 @@ class CrawlSingleProductAPIView(AmazonBaseAPIView):
             data = serializer.validated_data
             product_identifier = data.get('asin') or data.get('url')
 
+            if data['run_async']:
+                crawl_session = enqueue_crawl_job(
+                    crawl_single_product_task,
+                    {
+                        'product_identifier': product_identifier,
+                        'country_code': data['country_code'],
+                        'driver_name': data['driver_name'],
+                        'force': data['force'],
+                    },
+                    driver_name=data['driver_name'],
+                    country_code=data['country_code'],
+                    total_products=1
+                )
+                return self.enqueued_response(request, crawl_session)
+
             product_data = crawler_service.crawl_single_product(
                 product_identifier,
                 data['country_code'],
-                data['driver_name']
+                data['driver_name'],
+                force=data['force'],
+                caller='api'
             )
 
             if product_data:
@@ -628,59 +807,40 @@ class GetPriceHistoryAPIView(AmazonBaseAPIView):
                     status=status.HTTP_404_NOT_FOUND
                 )
 
-            # دریافت تاریخچه
-            cutoff_date = datetime.now() - timedelta(days=data['days'])
-            price_history = product.prices.filter(
-                crawl_timestamp__gte=cutoff_date
-            ).order_by('crawl_timestamp')
+            # دریافت تاریخچه - روزانه/ساعتی از جداول خلاصه، همه ردیف‌ها از run های خام
+            now = timezone.now()
+            cutoff_date = now - timedelta(days=data['days'])
+            rollups = PriceRollupCompactor()
 
             if data['granularity'] == 'daily':
-                from django.db.models.functions import TruncDate
-
-                daily_prices = price_history.annotate(
-                    date=TruncDate('crawl_timestamp')
-                ).values('date').annotate(
-                    min_price=Min('price'),
-                    max_price=Max('price'),
-                    avg_price=Avg('price'),
-                    first_price=Min('crawl_timestamp'),
-                    last_price=Max('crawl_timestamp'),
-                    record_count=Count('id')
-                ).order_by('date')
-
+                daily_history = rollups.get_history(product, 'daily', cutoff_date)
                 history_data = [
                     {
-                        'date': item['date'].isoformat(),
-                        'min_price': float(item['min_price']),
-                        'max_price': float(item['max_price']),
-                        'avg_price': float(item['avg_price']),
-                        'first_record_time': item['first_price'].isoformat(),
-                        'last_record_time': item['last_price'].isoformat(),
-                        'record_count': item['record_count']
+                        'date': item['bucket'].date().isoformat(),
+                        'min_price': item['min_price'],
+                        'max_price': item['max_price'],
+                        'avg_price': item['avg_price'],
+                        'first_record_time': item['first_seen'].isoformat(),
+                        'last_record_time': item['last_seen'].isoformat(),
+                        'record_count': item['runs']
                     }
-                    for item in daily_prices
+                    for item in daily_history
                 ]
+                stats = summarize_price_buckets(daily_history)
 
             elif data['granularity'] == 'hourly':
-                from django.db.models.functions import TruncHour
-
-                hourly_prices = price_history.annotate(
-                    hour=TruncHour('crawl_timestamp')
-                ).values('hour').annotate(
-                    avg_price=Avg('price'),
-                    record_count=Count('id')
-                ).order_by('hour')
-
                 history_data = [
                     {
-                        'hour': item['hour'].isoformat(),
-                        'avg_price': float(item['avg_price']),
-                        'record_count': item['record_count']
+                        'hour': item['bucket'].isoformat(),
+                        'avg_price': item['avg_price'],
+                        'record_count': item['runs']
                     }
-                    for item in hourly_prices
+                    for item in rollups.get_history(product, 'hourly', cutoff_date)
                 ]
+                stats = summarize_price_buckets(rollups.get_history(product, 'daily', cutoff_date))
 
             else:  # all
+                price_runs = list(price_runs_in_window(product.prices.all(), cutoff_date))
                 history_data = [
                     {
                         'price': float(price.price),
@@ -688,22 +848,20 @@ class GetPriceHistoryAPIView(AmazonBaseAPIView):
                         'seller': price.seller,
                         'availability': price.availability,
                         'timestamp': price.crawl_timestamp.isoformat(),
-                        'is_fba': price.is_fba,
-                        'is_amazon': price.is_amazon
+                        'last_seen': price.seen_until.isoformat(),
+                        'observation_count': price.observation_count
                     }
-                    for price in price_history
+                    for price in price_runs
                 ]
+                stats = summarize_price_runs(price_runs)
 
-            # آمار کلی
-            stats = price_history.aggregate(
-                min_price=Min('price'),
-                max_price=Max('price'),
-                avg_price=Avg('price'),
-                total_records=Count('id'),
-                first_record=Min('crawl_timestamp'),
-                last_record=Max('crawl_timestamp'),
-                unique_sellers=Count('seller', distinct=True)
-            )
+            if data['granularity'] != 'all':
+                # شمارش مشاهدات و فروشنده‌ها فقط روی ایندکس (product, crawl_timestamp) همین محصول
+                counts = price_runs_in_window(product.prices.all(), cutoff_date).aggregate(
+                    total_records=Sum('observation_count'), unique_sellers=Count('seller', distinct=True)
+                )
+                stats['total_records'] = counts['total_records'] or 0
+                stats['unique_sellers'] = counts['unique_sellers']
 
             response_data = {
                 'asin': product.asin,
@@ -712,11 +870,11 @@ class GetPriceHistoryAPIView(AmazonBaseAPIView):
                 'period_days': data['days'],
                 'granularity': data['granularity'],
                 'statistics': {
-                    'min_price': float(stats['min_price']) if stats['min_price'] else None,
-                    'max_price': float(stats['max_price']) if stats['max_price'] else None,
-                    'avg_price': float(stats['avg_price']) if stats['avg_price'] else None,
-                    'total_records': stats['total_records'] or 0,
-                    'unique_sellers': stats['unique_sellers'] or 0,
+                    'min_price': stats['min_price'],
+                    'max_price': stats['max_price'],
+                    'avg_price': stats['avg_price'],
+                    'total_records': stats['total_records'],
+                    'unique_sellers': stats['unique_sellers'],
                     'first_record': stats['first_record'].isoformat() if stats['first_record'] else None,
                     'last_record': stats['last_record'].isoformat() if stats['last_record'] else None,
                 },
@@ -815,7 +973,8 @@ class VerifyProductMatchAPIView(AmazonBaseAPIView):
             data = serializer.validated_data
             verification_result = crawler_service.verify_product_match(
                 data['url'],
-                data['asin'].upper()
+                data['asin'].upper(),
+                data.get('country_code')
             )
             return Response(verification_result)
 
@@ -826,6 +985,65 @@ class VerifyProductMatchAPIView(AmazonBaseAPIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class BulkVerifyProductMatchAPIView(AmazonBaseAPIView):
+    """تأیید دسته‌ای تطابق URL ها با محصولات - فقط برای Admin"""
+
+    @swagger_auto_schema(
+        operation_description="تأیید تطابق هزاران URL با ASIN در یک درخواست - بدون لود صفحه (فقط Admin)",
+        request_body=BulkVerifyMatchRequestSerializer,
+        responses={
+            200: openapi.Response(
+                description='نتیجه تأیید به ترتیب ورودی',
+                examples={
+                    'application/json': {
+                        'success': True,
+                        'count': 2,
+                        'valid_count': 1,
+                        'results': [
+                            {
+                                'valid': True,
+                                'url': 'https://www.amazon.com/dp/B08N5WRWNW',
+                                'asin_match': True,
+                                'seller_match': True,
+                                'details': {'asin_from_url': 'B08N5WRWNW', 'expected_asin': 'B08N5WRWNW'}
+                            },
+                            {
+                                'valid': False,
+                                'error': 'ASIN mismatch',
+                                'url': 'https://www.amazon.de/dp/B000000000',
+                                'asin_match': False,
+                                'seller_match': False
+                            }
+                        ]
+                    }
+                }
+            )
+        }
+    )
+    def post(self, request):
+        serializer = BulkVerifyMatchRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {'error': serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            results = crawler_service.verify_product_matches(serializer.validated_data['items'])
+            return Response({
+                'success': True,
+                'count': len(results),
+                'valid_count': sum(1 for result in results if result['valid']),
+                'results': results
+            })
+
+        except Exception as e:
+            return Response({
+                'success': False,
+                'error': str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 class CrawlByURLAPIView(AmazonBaseAPIView):
     """Crawl کردن محصول با URL - فقط برای Admin"""
 
@@ -833,6 +1051,7 @@ class CrawlByURLAPIView(AmazonBaseAPIView):
         operation_description="Crawl کردن محصول آمازون با URL (فقط Admin)",
         request_body=CrawlByURLRequestSerializer,
         responses={
+            202: CRAWL_JOB_ACCEPTED_RESPONSE,
             200: openapi.Response(
                 description='اطلاعات محصول',
                 examples={
@@ -859,6 +1078,17 @@ class CrawlByURLAPIView(AmazonBaseAPIView):
 
         try:
             data = serializer.validated_data
+
+            if data['run_async']:
+                crawl_session = enqueue_crawl_job(
+                    crawl_by_url_task,
+                    {'product_url': data['url']},
+                    driver_name='amazon_crawler',
+                    country_code=crawler_service.extract_country_from_url(data['url']),
+                    total_products=1
+                )
+                return self.enqueued_response(request, crawl_session)
+
             product_data = crawler_service.crawl_product_by_url(data['url'])
 
             if product_data:
@@ -877,3 +1107,90 @@ class CrawlByURLAPIView(AmazonBaseAPIView):
                 {'error': str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+
+class CrawlJobStatusAPIView(AmazonBaseAPIView):
+    """وضعیت و پیشرفت یک job کراول - فقط برای Admin"""
+
+    @swagger_auto_schema(
+        operation_description="دریافت وضعیت و پیشرفت job کراول در پس‌زمینه (فقط Admin)",
+        responses={
+            200: openapi.Response(
+                description='وضعیت job',
+                examples={
+                    'application/json': {
+                        'job_id': 'abc123',
+                        'status': 'RUNNING',
+                        'task_state': 'STARTED',
+                        'country': 'US',
+                        'progress': {
+                            'total': 10,
+                            'processed': 4,
+                            'successful': 3,
+                            'failed': 1,
+                            'pending': 6,
+                            'percent': 40.0
+                        },
+                        'asins_crawled': ['B08N5WRWNW'],
+                        'failed_items': [
+                            {'asin': 'B08N5WRWNX', 'status': 'FAILED', 'error_class': 'TimeoutException', 'duration_ms': 15230}
+                        ]
+                    }
+                }
+            ),
+            404: openapi.Response(description='job پیدا نشد')
+        }
+    )
+    def get(self, request, job_id):
+        try:
+            crawl_session = AmazonCrawlSession.objects.filter(session_id=job_id).first()
+            if not crawl_session:
+                return Response(
+                    {'error': 'Job not found'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+            processed = crawl_session.successful_crawls + crawl_session.failed_crawls
+            total = crawl_session.total_products
+
+            # تا پایان session لیست ASIN ها از جدول نتایج خوانده می‌شود
+            outcomes = crawl_session.outcomes.all()
+            asins_crawled = crawl_session.asins_crawled or list(
+                outcomes.filter(status='SUCCESS').values_list('asin', flat=True)
+            )
+            failed_items = list(
+                outcomes.exclude(status__in=AmazonCrawlOutcome.SUCCESS_STATUSES)
+                .values('asin', 'status', 'error_class', 'duration_ms')
+            )
+
+            task_result = AsyncResult(job_id)
+            response_data = {
+                'job_id': crawl_session.session_id,
+                'status': crawl_session.status,
+                'task_state': task_result.state,
+                'country': crawl_session.country_code,
+                'progress': {
+                    'total': total,
+                    'processed': processed,
+                    'successful': crawl_session.successful_crawls,
+                    'failed': crawl_session.failed_crawls,
+                    'pending': max(total - processed, 0),
+                    'percent': round(processed * 100.0 / total, 1) if total else 0.0
+                },
+                'asins_crawled': asins_crawled,
+                'failed_items': failed_items,
+                'started_at': crawl_session.started_at.isoformat() if crawl_session.started_at else None,
+                'completed_at': crawl_session.completed_at.isoformat() if crawl_session.completed_at else None,
+                'error_log': crawl_session.error_log or None,
+            }
+
+            if task_result.successful():
+                response_data['result'] = task_result.result
+
+            return Response(response_data)
+
+        except Exception as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
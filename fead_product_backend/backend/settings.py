@@ -28,6 +28,17 @@ load_dotenv(ENV_PATH)
 def env(key, default=None):
     """Get environment variable with default value."""
     return os.environ.get(key, default)
+
+
+def env_country_map(key, cast=int, upper=True):
+    """Parse a per-country environment variable like "US:3,DE:2"."""
+    result = {}
+    for item in env(key, "").split(","):
+        if ":" in item:
+            code, value = item.split(":", 1)
+            code = code.strip()
+            result[code.upper() if upper else code.lower()] = cast(value.strip())
+    return result
 TELEGRAM_MINI_APP_URL= env("TELEGRAM_MINI_APP_URL", "*")
 # Quick-start development settings - unsuitable for production
 SECRET_KEY = env("DJANGO_SECRET_KEY", "unsafe-dev-key-change-in-production")
@@ -67,6 +78,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     ################
     'rest_framework',
     'rest_framework.authtoken',
@@ -217,6 +229,114 @@ CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = env("CELERY_TIMEZONE", "UTC")
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60
+# کراول‌های دسته‌ای بزرگ بیشتر از ۳۰ دقیقه طول می‌کشند
+AMAZON_CRAWL_TASK_TIME_LIMIT = int(env("AMAZON_CRAWL_TASK_TIME_LIMIT", 12 * 60 * 60))
+
+# Pool درایورهای Selenium: حداقل/حداکثر درایور هر پروفایل، بستن درایور بیکار و حداکثر انتظار برای lease (ثانیه)
+SELENIUM_POOL_MIN_SIZE = int(env("SELENIUM_POOL_MIN_SIZE", 0))
+SELENIUM_POOL_MAX_SIZE = int(env("SELENIUM_POOL_MAX_SIZE", 2))
+SELENIUM_POOL_IDLE_TIMEOUT = int(env("SELENIUM_POOL_IDLE_TIMEOUT", 10 * 60))
+SELENIUM_POOL_LEASE_TIMEOUT = int(env("SELENIUM_POOL_LEASE_TIMEOUT", 5 * 60))
+# جایگزینی session های فرسوده: حداکثر درخواست، حداکثر سن (ثانیه) و حداکثر JS heap (MB، هر N درخواست) - 0 = بدون محدودیت
+SELENIUM_DRIVER_MAX_REQUESTS = int(env("SELENIUM_DRIVER_MAX_REQUESTS", 200))
+SELENIUM_DRIVER_MAX_AGE = int(env("SELENIUM_DRIVER_MAX_AGE", 2 * 60 * 60))
+SELENIUM_DRIVER_MAX_HEAP_MB = int(env("SELENIUM_DRIVER_MAX_HEAP_MB", 512))
+SELENIUM_DRIVER_MEMORY_CHECK_EVERY = int(env("SELENIUM_DRIVER_MEMORY_CHECK_EVERY", 10))
+# heartbeat پس‌زمینه سلامت درایورهای بیکار: فاصله و حداکثر انتظار هر probe (ثانیه) - 0 = probe در هر فراخوانی
+SELENIUM_HEARTBEAT_INTERVAL = int(env("SELENIUM_HEARTBEAT_INTERVAL", 30))
+SELENIUM_HEARTBEAT_TIMEOUT = int(env("SELENIUM_HEARTBEAT_TIMEOUT", 5))
+
+# Amazon crawler settings
+# درایورهای گرم هر کشور (ساخته و تنظیم موقعیت شده هنگام شروع worker) و فاصله جبران کمبود آن‌ها (ثانیه)، مثال: "US:2,DE:1"
+AMAZON_DRIVER_WARM_POOL_SIZE = int(env("AMAZON_DRIVER_WARM_POOL_SIZE", 1))
+AMAZON_DRIVER_WARM_POOL_SIZE_BY_COUNTRY = env_country_map("AMAZON_DRIVER_WARM_POOL_SIZE_BY_COUNTRY")
+# گرم کردن در هر پروسه فرزند worker اجرا می‌شود: session های Selenium هر میزبان = تعداد پروسه‌های worker (--concurrency)
+# × تعداد کشورهای فعال کراول × اندازه pool گرم، که به خاطر min_size هرگز evict نمی‌شوند و هر پروسه thread heartbeat خودش را دارد.
+# فقط برای worker اختصاصی کراول با concurrency مشخص (و ظرفیت Grid کافی) فعال شود.
+# pool ها به ازای هر پروسه هستند: درایور گرم فقط در پروسه‌ای وجود دارد که خودش warm-up کرده، پس بدون این تنظیم روی
+# worker کراول هیچ کراولی درایور گرم ندارد (دستور warm_amazon_drivers فقط کوکی‌های ذخیره شده را تازه می‌کند).
+AMAZON_DRIVER_WARMUP_ON_WORKER_START = env("AMAZON_DRIVER_WARMUP_ON_WORKER_START", "False").lower() in ("1", "true", "yes")
+AMAZON_DRIVER_KEEPALIVE_INTERVAL = int(env("AMAZON_DRIVER_KEEPALIVE_INTERVAL", 60))
+# live: استخراج المنت به المنت با WebDriver / offline: یک بار page_source و پارس با lxml
+AMAZON_PARSER_EXTRACTION_MODE = env("AMAZON_PARSER_EXTRACTION_MODE", "offline")
+# تعداد درایورهای موازی برای crawl_products (پیش‌فرض و به تفکیک کشور، مثال: "US:3,DE:2")
+AMAZON_CRAWL_CONCURRENCY = int(env("AMAZON_CRAWL_CONCURRENCY", 1))
+AMAZON_CRAWL_CONCURRENCY_BY_COUNTRY = env_country_map("AMAZON_CRAWL_CONCURRENCY_BY_COUNTRY")
+# Rate limiter مشترک (Redis) به ازای هر دامنه آمازون، مثال: "amazon.com:6,amazon.de:3"
+AMAZON_RATE_LIMIT_PER_MINUTE = float(env("AMAZON_RATE_LIMIT_PER_MINUTE", 4))
+AMAZON_RATE_LIMIT_BURST = float(env("AMAZON_RATE_LIMIT_BURST", 2))
+AMAZON_RATE_LIMIT_PER_MINUTE_BY_DOMAIN = env_country_map("AMAZON_RATE_LIMIT_PER_MINUTE_BY_DOMAIN", float, upper=False)
+AMAZON_RATE_LIMIT_BURST_BY_DOMAIN = env_country_map("AMAZON_RATE_LIMIT_BURST_BY_DOMAIN", float, upper=False)
+AMAZON_RATE_LIMIT_MAX_WAIT = int(env("AMAZON_RATE_LIMIT_MAX_WAIT", 300))  # ثانیه
+AMAZON_RATE_LIMIT_JITTER = float(env("AMAZON_RATE_LIMIT_JITTER", 1.0))  # ثانیه
+AMAZON_RATE_LIMIT_BLOCK_FACTOR = float(env("AMAZON_RATE_LIMIT_BLOCK_FACTOR", 2.0))
+AMAZON_RATE_LIMIT_RECOVERY_FACTOR = float(env("AMAZON_RATE_LIMIT_RECOVERY_FACTOR", 0.8))
+AMAZON_RATE_LIMIT_MAX_PENALTY = float(env("AMAZON_RATE_LIMIT_MAX_PENALTY", 16))
+
+# ذخیره دسته‌ای محصولات/قیمت‌ها: flush با رسیدن به تعداد یا گذشت زمان (ثانیه)
+AMAZON_PERSIST_BATCH_SIZE = int(env("AMAZON_PERSIST_BATCH_SIZE", 50))
+AMAZON_PERSIST_FLUSH_INTERVAL = float(env("AMAZON_PERSIST_FLUSH_INTERVAL", 30))
+# change_only: ردیف قیمت جدید فقط با تغییر قیمت/فروشنده/موجودی (بقیه فقط last_seen_at) / append: هر کراول یک ردیف
+AMAZON_PRICE_STORAGE_MODE = env("AMAZON_PRICE_STORAGE_MODE", "change_only")
+# حداکثر طول یک run قیمت (روز) - کوئری‌های پنجره زمانی crawl_timestamp را با همین مقدار محدود می‌کنند
+AMAZON_PRICE_MAX_RUN_DAYS = int(env("AMAZON_PRICE_MAX_RUN_DAYS", 7))
+# جداول خلاصه قیمت روزانه/ساعتی برای تاریخچه قیمت (celery beat)
+# فقط روزهایی که از AMAZON_PRICE_MAX_RUN_DAYS گذشته‌اند نهایی و نوشته می‌شوند، پس اجرای ساعتی کافی است
+AMAZON_PRICE_ROLLUP_INTERVAL = int(env("AMAZON_PRICE_ROLLUP_INTERVAL", 60 * 60))  # ثانیه
+AMAZON_PRICE_ROLLUP_CHUNK_SIZE = int(env("AMAZON_PRICE_ROLLUP_CHUNK_SIZE", 200))  # محصول در هر تراکنش
+# پارتیشن‌بندی ماهانه amazon_product_prices و سیاست نگهداری (0 ماه = نگهداری دائمی)
+AMAZON_PRICE_PARTITION_MONTHS_AHEAD = int(env("AMAZON_PRICE_PARTITION_MONTHS_AHEAD", 3))
+AMAZON_PRICE_RETENTION_MONTHS = int(env("AMAZON_PRICE_RETENTION_MONTHS", 24))
+AMAZON_PRICE_RETENTION_ACTION = env("AMAZON_PRICE_RETENTION_ACTION", "detach")  # detach (بایگانی) یا drop
+# کش جزئیات محصول (ثانیه) - با هر مشاهده قیمت جدید خودکار باطل می‌شود
+AMAZON_DETAIL_CACHE_TTL = int(env("AMAZON_DETAIL_CACHE_TTL", 5 * 60))
+# حداکثر page_size لیست محصولات
+AMAZON_PRODUCTS_MAX_PAGE_SIZE = int(env("AMAZON_PRODUCTS_MAX_PAGE_SIZE", 100))
+# حداکثر history_days در جزئیات محصول (مقادیر بزرگ‌تر به این مقدار محدود می‌شوند)
+AMAZON_DETAIL_MAX_HISTORY_DAYS = int(env("AMAZON_DETAIL_MAX_HISTORY_DAYS", 365))
+# حداکثر تعداد زوج (url, asin) در هر درخواست تأیید دسته‌ای
+AMAZON_BULK_VERIFY_MAX_ITEMS = int(env("AMAZON_BULK_VERIFY_MAX_ITEMS", 5000))
+
+# تازگی داده: محصولی که کمتر از TTL (ثانیه) پیش کراول شده دوباره کراول نمی‌شود (0 = غیرفعال)
+# به تفکیک کشور ("US:3600,DE:7200") و فراخواننده ("bulk_refresh:86400,api:0")
+AMAZON_FRESHNESS_TTL = int(env("AMAZON_FRESHNESS_TTL", 6 * 60 * 60))
+AMAZON_FRESHNESS_TTL_BY_COUNTRY = env_country_map("AMAZON_FRESHNESS_TTL_BY_COUNTRY")
+AMAZON_FRESHNESS_TTL_BY_CALLER = env_country_map("AMAZON_FRESHNESS_TTL_BY_CALLER", upper=False)
+# حداکثر انتظار برای کراول در جریان همان ASIN/کشور (ثانیه)
+AMAZON_SINGLE_FLIGHT_TIMEOUT = int(env("AMAZON_SINGLE_FLIGHT_TIMEOUT", 180))
+
+# زمان‌بندی تطبیقی بروزرسانی قیمت‌ها (celery beat)
+AMAZON_REFRESH_ENABLED = env("AMAZON_REFRESH_ENABLED", "True").lower() in ("1", "true", "yes")
+AMAZON_REFRESH_PAGES_PER_HOUR = int(env("AMAZON_REFRESH_PAGES_PER_HOUR", 120))  # بودجه کل صفحات در ساعت
+AMAZON_REFRESH_DISPATCH_INTERVAL = int(env("AMAZON_REFRESH_DISPATCH_INTERVAL", 5 * 60))  # ثانیه
+AMAZON_REFRESH_REBUILD_INTERVAL = int(env("AMAZON_REFRESH_REBUILD_INTERVAL", 15 * 60))  # ثانیه
+AMAZON_REFRESH_BASE_INTERVAL_HOURS = float(env("AMAZON_REFRESH_BASE_INTERVAL_HOURS", 24))  # محصول عادی
+AMAZON_REFRESH_VOLATILITY_DAYS = int(env("AMAZON_REFRESH_VOLATILITY_DAYS", 7))
+AMAZON_REFRESH_VOLATILITY_WEIGHT = float(env("AMAZON_REFRESH_VOLATILITY_WEIGHT", 4.0))
+AMAZON_REFRESH_LIVE_WEIGHT = float(env("AMAZON_REFRESH_LIVE_WEIGHT", 3.0))  # محصول ارسال شده در کانال
+AMAZON_REFRESH_INFLIGHT_TTL = int(env("AMAZON_REFRESH_INFLIGHT_TTL", 60 * 60))
+
+CELERY_BEAT_SCHEDULE = {
+    "amazon-rebuild-refresh-queue": {
+        "task": "amazon_app.tasks.rebuild_refresh_queue_task",
+        "schedule": AMAZON_REFRESH_REBUILD_INTERVAL,
+    },
+    "amazon-dispatch-refresh": {
+        "task": "amazon_app.tasks.dispatch_refresh_task",
+        "schedule": AMAZON_REFRESH_DISPATCH_INTERVAL,
+    },
+    "amazon-compact-price-rollups": {
+        "task": "amazon_app.tasks.compact_price_rollups_task",
+        "schedule": AMAZON_PRICE_ROLLUP_INTERVAL,
+    },
+    "amazon-maintain-price-partitions": {
+        "task": "amazon_app.tasks.maintain_price_partitions_task",
+        "schedule": 24 * 60 * 60,
+    },
+}
+
+# مدت اعتبار کوکی‌های ذخیره شده هر کشور (0 = غیرفعال)
+AMAZON_COOKIE_JAR_TTL_HOURS = int(env("AMAZON_COOKIE_JAR_TTL_HOURS", 24))
 
 # Logging
 LOGGING = {
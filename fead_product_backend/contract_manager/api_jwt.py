@@ -21,6 +21,11 @@ from .api_permissions import (
 import uuid
 
 
+def force_refresh(request):
+    """آیا درخواست‌دهنده کراول مجدد حتی با وجود داده تازه را خواسته؟ (پارامتر force)"""
+    return str(request.data.get('force', '')).lower() in ('1', 'true', 'yes')
+
+
 class ProductChannelsAPIView(APIView):
     """دریافت کانال‌های قابل ارسال برای محصول خاص"""
     permission_classes = [permissions.IsAuthenticated, IsAdminOrSellerOrAgentForAssigned]
@@ -131,7 +136,9 @@ class BulkRefreshAPIView(APIView):
         results = []
 
         for product in products:
-            success, message = crawler_service.refresh_product_data(product)
+            success, message = crawler_service.refresh_product_data(
+                product, force=force_refresh(request), caller='bulk_refresh'
+            )
             results.append({
                 'product_id': str(product.id),
                 'asin': product.asin,
@@ -315,7 +322,7 @@ class ProductViewSet(viewsets.ModelViewSet):
         product = self.get_object()
         crawler_service = ProductCrawlerService()
 
-        success, message = crawler_service.refresh_product_data(product)
+        success, message = crawler_service.refresh_product_data(product, force=force_refresh(request))
 
         if success:
             # لاگ تغییرات
@@ -462,7 +469,9 @@ class ProductViewSet(viewsets.ModelViewSet):
             results = []
 
             for product in products:
-                success, message = crawler_service.refresh_product_data(product)
+                success, message = crawler_service.refresh_product_data(
+                    product, force=force_refresh(request), caller='bulk_refresh'
+                )
                 results.append({
                     'product_id': str(product.id),
                     'asin': product.asin,
@@ -600,9 +609,9 @@ class ProductViewSet(viewsets.ModelViewSet):
 
                 # کراول اطلاعات محصول
                 if url:
-                    success, message = crawler_service.refresh_product_data(product)
+                    success, message = crawler_service.refresh_product_data(product, caller='product_create')
                 else:
-                    success, message = crawler_service.refresh_product_data(product)
+                    success, message = crawler_service.refresh_product_data(product, caller='product_create')
 
                 if success:
                     # لاگ
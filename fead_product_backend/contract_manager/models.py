@@ -451,7 +451,8 @@ class Product(models.Model):
             # استفاده از سرویس یکپارچه
             amazon_product, message = crawler_service.crawl_amazon_product(
                 self.asin,
-                self.country.code
+                self.country.code,
+                caller='product_create'
             )
 
             if amazon_product:
@@ -6,6 +6,7 @@ from telegram_manager.models import TelegramMessage, TelegramChannel
 from .models import Product, ProductContract, CountryChannelConfig, Country, ProductChannel
 from amazon_app.amazon_crawler import AmazonCrawlerService
 from amazon_app.models import AmazonProduct
+from amazon_app.url_normalizer import normalize_amazon_url
 from auth_app.models import SellerProfile
 import json
 
@@ -14,50 +15,39 @@ class ProductCrawlerService:
     def __init__(self):
         self.amazon_crawler = AmazonCrawlerService()
 
-    def crawl_amazon_product(self, asin: str, country_code: str = "US") -> Tuple[Optional[AmazonProduct], str]:
-        """کراول کردن محصول از آمازون با تنظیمات کشور خاص"""
+    def crawl_amazon_product(self, asin: str, country_code: str = "US", force: bool = False,
+                             caller: str = "contract") -> Tuple[Optional[AmazonProduct], str]:
+        """کراول کردن محصول از آمازون با تنظیمات کشور خاص
+
+        اگر داده ذخیره شده در TTL تازگی باشد (و force نباشد) بدون کراول برگردانده می‌شود.
+        """
         try:
             # ۱. پیدا کردن کشور
             country = Country.objects.get(code=country_code, is_active=True)
 
-            # ۲. چک کردن وجود محصول در دیتابیس
-            try:
-                amazon_product = AmazonProduct.objects.get(asin=asin, country=country)
-                return amazon_product, "Product already exists in database"
-            except AmazonProduct.DoesNotExist:
-                pass
-
-            # ۳. کراول کردن از آمازون با تنظیمات کشور
+            # ۲. کراول کردن از آمازون (یا استفاده از داده تازه ذخیره شده)
             print(f"🕷️ Crawling Amazon product: {asin} from {country.name}")
 
-            # استفاده از کراولر جدید با پشتیبانی کشور
             crawled_data = self.amazon_crawler.crawl_single_product(
                 product_identifier=asin,
-                country_code=country_code
+                country_code=country_code,
+                force=force,
+                caller=caller
             )
 
             if not crawled_data:
                 return None, f"Failed to crawl product from Amazon {country.amazon_domain}"
 
-            # ۴. ذخیره در AmazonProduct با اطلاعات کشور
-            amazon_product = AmazonProduct.objects.create(
+            # ۳. محصول توسط کراولر در AmazonProduct ذخیره شده است
+            amazon_product = AmazonProduct.objects.filter(
                 asin=crawled_data.get('asin', asin),
-                title=crawled_data.get('title', ''),
-                price=crawled_data.get('price'),
-                currency=crawled_data.get('currency', 'USD'),
-                rating=crawled_data.get('rating'),
-                review_count=crawled_data.get('review_count', 0),
-                brand=crawled_data.get('brand', ''),
-                image_url=crawled_data.get('image_url', ''),
-                availability=crawled_data.get('availability', True),
-                description=crawled_data.get('description', ''),
-                features=crawled_data.get('features', []),
-                specifications=crawled_data.get('specifications', {}),
-                country=country,
-                domain=country.amazon_domain,
-                geo_location=crawled_data.get('geo_location', {})
-            )
+                country_code=country.code
+            ).first()
+            if not amazon_product:
+                return None, f"Crawled product {asin} was not saved"
 
+            if crawled_data.get('from_cache'):
+                return amazon_product, f"Product data is fresh (last crawled {crawled_data.get('last_crawled')})"
             return amazon_product, f"Product crawled successfully from {country.amazon_domain}"
 
         except Country.DoesNotExist:
@@ -99,7 +89,8 @@ class ProductCrawlerService:
         except Exception as e:
             return None, f"Error creating product: {str(e)}"
 
-    def refresh_product_data(self, product: Product) -> Tuple[bool, str]:
+    def refresh_product_data(self, product: Product, force: bool = False,
+                             caller: str = "refresh") -> Tuple[bool, str]:
         """بروزرسانی داده‌های محصول از آمازون با تنظیمات کشور"""
         try:
             print(f"🔄 Refreshing Amazon data for product: {product.asin} from {product.country.name}")
@@ -107,7 +98,9 @@ class ProductCrawlerService:
             # کراول کردن داده‌های جدید با کشور محصول
             amazon_product, message = self.crawl_amazon_product(
                 product.asin,
-                product.country.code
+                product.country.code,
+                force=force,
+                caller=caller
             )
 
             if amazon_product:
@@ -152,28 +145,7 @@ class ProductCrawlerService:
 
     def _detect_country_from_url(self, url: str) -> str:
         """تشخیص کشور از URL محصول آمازون"""
-        country_map = {
-            'amazon.com': 'US',
-            'amazon.co.uk': 'UK',
-            'amazon.de': 'DE',
-            'amazon.fr': 'FR',
-            'amazon.it': 'IT',
-            'amazon.es': 'ES',
-            'amazon.ae': 'AE',
-            'amazon.sa': 'SA',
-            'amazon.com.tr': 'TR',
-            'amazon.cn': 'CN',
-            'amazon.co.jp': 'JP',
-            'amazon.in': 'IN',
-            'amazon.com.au': 'AU',
-            'amazon.ca': 'CA',
-            'amazon.com.br': 'BR',
-        }
-
-        for domain, code in country_map.items():
-            if domain in url:
-                return code
-        return 'US'
+        return normalize_amazon_url(url).country_code or 'US'
 
     def crawl_multiple_products(self, products_data: List[dict]) -> dict:
         """کراول کردن چندین محصول با کشورهای مختلف"""
@@ -1,4 +1,5 @@
 # selenium_app/driver_manager.py
+import logging
 import threading
 import queue
 import time
@@ -11,9 +12,14 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import WebDriverException, TimeoutException
+from django.conf import settings
+from django.db import connection
 from django.utils import timezone
+from .driver_pool import DriverPool, DriverRecyclePolicy, call_with_timeout
 from .models import SeleniumDriver, CrawlRequest, DriverSession
 
+logger = logging.getLogger(__name__)
+
 
 class SeleniumDriverManager:
     _instance = None
@@ -31,48 +37,145 @@ class SeleniumDriverManager:
         self.driver_locks = {}  # {driver_name: threading.Lock}
         self.request_queues = {}  # {driver_name: queue.Queue}
         self.driver_sessions = {}  # {driver_name: session_data}
+        self.pools = {}  # {pool_name: DriverPool}
+        self.recycle_policy = DriverRecyclePolicy(
+            max_requests=getattr(settings, 'SELENIUM_DRIVER_MAX_REQUESTS', 0),
+            max_age=getattr(settings, 'SELENIUM_DRIVER_MAX_AGE', 0),
+            max_heap_mb=getattr(settings, 'SELENIUM_DRIVER_MAX_HEAP_MB', 0),
+            memory_check_every=getattr(settings, 'SELENIUM_DRIVER_MEMORY_CHECK_EVERY', 10),
+        )
+        # قفل ساخت هر درایور: ساخت کند session یک درایور بقیه درایورها را بلاک نمی‌کند
+        self.creation_locks = {}  # {driver_name: threading.Lock}
+        # heartbeat پس‌زمینه: وضعیت سلامت کش شده به جای probe در هر فراخوانی
+        self.heartbeat_interval = getattr(settings, 'SELENIUM_HEARTBEAT_INTERVAL', 30)
+        self.heartbeat_timeout = getattr(settings, 'SELENIUM_HEARTBEAT_TIMEOUT', 5)
+        self.health_ttl = self.heartbeat_interval * 3 if self.heartbeat_interval else 0
+        self.driver_health = {}  # {driver_name: (healthy, checked_at)}
+        self.driver_options = {}  # {driver_name: (driver_type, profile_data, cookies, cookie_url)} برای ساخت جایگزین
+        self.recycling = set()  # driver_name هایی که جایگزینشان در پس‌زمینه در حال ساخت است
+        self._heartbeat_thread = None
 
-    def get_or_create_driver(self, driver_name, driver_type='CHROME', profile_data=None):
-        """دریافت یا ایجاد درایور"""
+    def _creation_lock(self, driver_name):
         with self._lock:
+            lock = self.creation_locks.get(driver_name)
+            if lock is None:
+                lock = self.creation_locks[driver_name] = threading.Lock()
+            return lock
+
+    def get_or_create_driver(self, driver_name, driver_type='CHROME', profile_data=None, cookies=None, cookie_url=None):
+        """دریافت یا ایجاد درایور - cookies (اختیاری) فقط روی درایور جدید تزریق می‌شوند
+
+        فقط درخواست‌های همین driver_name منتظر ساخت درایور می‌مانند؛ ثبت session در دیتابیس بعد از آزاد شدن قفل انجام می‌شود.
+        session فرسوده تا آماده شدن جایگزینش در پس‌زمینه به کار ادامه می‌دهد.
+        """
+        with self._creation_lock(driver_name):
             if driver_name in self.active_drivers:
-                # چک کردن سلامت درایور موجود
+                # چک کردن سلامت درایور موجود و فرسوده نبودن session
                 if self._is_driver_healthy(driver_name):
+                    if driver_name not in self.recycling and self._needs_recycle(driver_name):
+                        self._start_recycle(driver_name)
                     return self.active_drivers[driver_name]
-                else:
-                    self._cleanup_driver(driver_name)
+                self._cleanup_driver(driver_name)
 
             # ایجاد درایور جدید
-            driver = self._create_driver(driver_type, profile_data)
-            self.active_drivers[driver_name] = driver
-            self.driver_locks[driver_name] = threading.Lock()
-            self.request_queues[driver_name] = queue.Queue()
-
-            # ایجاد session در دیتابیس
-            session_id = str(uuid.uuid4())
-            driver_obj, created = SeleniumDriver.objects.get_or_create(
-                name=driver_name,
-                defaults={
-                    'driver_type': driver_type,
-                    'profile_data': profile_data or {}
-                }
-            )
+            driver, cookies_loaded = self._create_driver(driver_type, profile_data, cookies, cookie_url)
+            session_data = self._new_session_data(cookies_loaded)
+            with self._lock:
+                self.active_drivers[driver_name] = driver
+                self.driver_locks[driver_name] = threading.Lock()
+                self.request_queues[driver_name] = queue.Queue()
+                self.driver_sessions[driver_name] = session_data
+                self.driver_health[driver_name] = (True, time.monotonic())
+                self.driver_options[driver_name] = (driver_type, profile_data, cookies, cookie_url)
 
-            DriverSession.objects.create(
-                driver=driver_obj,
-                session_id=session_id,
-                is_active=True
-            )
+        # ایجاد session در دیتابیس
+        self._register_session(driver_name, driver_type, profile_data, session_data)
+        self.start_heartbeat()
+        return driver
+
+    @staticmethod
+    def _new_session_data(cookies_loaded):
+        return {
+            'session_id': str(uuid.uuid4()),
+            'created_at': timezone.now(),
+            'request_count': 0,
+            'cookies_loaded': cookies_loaded
+        }
 
-            self.driver_sessions[driver_name] = {
-                'session_id': session_id,
-                'created_at': timezone.now(),
-                'request_count': 0
+    def _register_session(self, driver_name, driver_type, profile_data, session_data):
+        """ثبت session درایور در دیتابیس"""
+        driver_obj, created = SeleniumDriver.objects.get_or_create(
+            name=driver_name,
+            defaults={
+                'driver_type': driver_type,
+                'profile_data': profile_data or {}
             }
+        )
+
+        DriverSession.objects.create(
+            driver=driver_obj,
+            session_id=session_data['session_id'],
+            is_active=True
+        )
+
+    # Pool
+    def get_pool(self, pool_name, driver_type='CHROME', profile_data=None, cookies=None, cookie_url=None,
+                 factory=None, min_size=None, max_size=None):
+        """pool درایورهای یک پروفایل (یک بار برای هر نام ساخته می‌شود)
+
+        factory (اختیاری) -> (driver, session_data) ؛ پیش‌فرض ساخت درایور با همین پروفایل/کوکی‌ها
+        """
+        with self._lock:
+            pool = self.pools.get(pool_name)
+            if pool is None:
+                if factory is None:
+                    factory = lambda: self.open_pooled_driver(pool_name, driver_type, profile_data, cookies, cookie_url)
+                pool = DriverPool(
+                    pool_name,
+                    factory,
+                    closer=self._close_pooled_driver,
+                    min_size=min_size if min_size is not None else getattr(settings, 'SELENIUM_POOL_MIN_SIZE', 0),
+                    max_size=max_size if max_size is not None else getattr(settings, 'SELENIUM_POOL_MAX_SIZE', 2),
+                    idle_timeout=getattr(settings, 'SELENIUM_POOL_IDLE_TIMEOUT', 600),
+                    health_check=self.is_driver_alive,
+                    health_ttl=self.health_ttl,
+                    health_timeout=self.heartbeat_timeout,
+                    recycle_policy=self.recycle_policy,
+                    # connection پروکسی هر thread است؛ باید در همان thread پس‌زمینه resolve شود
+                    background_cleanup=lambda: connection.close(),
+                )
+                self.pools[pool_name] = pool
+        self.start_heartbeat()
+        return pool
+
+    def lease(self, pool_name, timeout=None, **pool_options):
+        """with manager.lease('name') as driver: ... - درایور انحصاری تا پایان بلاک"""
+        if timeout is None:
+            timeout = getattr(settings, 'SELENIUM_POOL_LEASE_TIMEOUT', 300)
+        return self.get_pool(pool_name, **pool_options).lease(timeout)
+
+    def open_pooled_driver(self, pool_name, driver_type='CHROME', profile_data=None, cookies=None, cookie_url=None):
+        """ساخت یک درایور برای pool و ثبت session آن -> (driver, session_data)"""
+        driver, cookies_loaded = self._create_driver(driver_type, profile_data, cookies, cookie_url)
+        session_data = self._new_session_data(cookies_loaded)
+        self._register_session(pool_name, driver_type, profile_data, session_data)
+        return driver, session_data
 
-            return driver
+    def _close_pooled_driver(self, pooled):
+        try:
+            pooled.driver.quit()
+        finally:
+            session_id = pooled.session.get('session_id')
+            if session_id:
+                DriverSession.objects.filter(session_id=session_id).update(is_active=False)
+
+    def pool_stats(self):
+        """آمار همه pool ها: {pool_name: stats}"""
+        with self._lock:
+            pools = list(self.pools.values())
+        return {pool.name: pool.stats() for pool in pools}
 
-    def _create_driver(self, driver_type, profile_data):
+    def _create_driver(self, driver_type, profile_data, cookies=None, cookie_url=None):
         """ایجاد درایور Selenium"""
         if driver_type == 'CHROME':
             chrome_options = Options()
@@ -94,23 +197,206 @@ class SeleniumDriverManager:
             )
 
             # لود کردن کوکی‌ها اگر وجود دارن
-            if profile_data and 'cookies' in profile_data:
-                driver.get("about:blank")  # برای set cookie نیاز به یک صفحه داریم
-                for cookie in profile_data['cookies']:
-                    try:
-                        driver.add_cookie(cookie)
-                    except Exception as e:
-                        print(f"Warning: Could not add cookie: {e}")
+            if cookies is None and profile_data:
+                cookies = profile_data.get('cookies')
+            cookies_loaded = self.load_cookies(driver, cookies, cookie_url) if cookies else 0
 
-            return driver
+            return driver, cookies_loaded
 
         else:
             raise ValueError(f"Unsupported driver type: {driver_type}")
 
+    def load_cookies(self, driver, cookies, url=None):
+        """تزریق کوکی‌ها - اول از طریق CDP (بدون لود صفحه)، در غیر این صورت با رفتن به url و add_cookie"""
+        now = time.time()
+        cookies = [cookie for cookie in cookies if not cookie.get('expiry') or cookie['expiry'] > now]
+        if not cookies:
+            return 0
+
+        try:
+            driver.execute('executeCdpCommand', {
+                'cmd': 'Network.setCookies',
+                'params': {'cookies': [self._to_cdp_cookie(cookie) for cookie in cookies]}
+            })
+            return len(cookies)
+        except Exception as e:
+            logger.warning(f"⚠️ CDP cookie injection failed, falling back to add_cookie: {e}")
+
+        # add_cookie فقط روی صفحه‌ای از همان دامنه کار می‌کند
+        driver.get(url or "about:blank")
+        loaded = 0
+        for cookie in cookies:
+            try:
+                driver.add_cookie(cookie)
+                loaded += 1
+            except Exception as e:
+                logger.warning(f"⚠️ Could not add cookie: {e}")
+        return loaded
+
+    @staticmethod
+    def _to_cdp_cookie(cookie):
+        """تبدیل کوکی فرمت WebDriver به فرمت Network.CookieParam"""
+        cdp_cookie = {
+            'name': cookie['name'],
+            'value': cookie['value'],
+            'domain': cookie.get('domain'),
+            'path': cookie.get('path', '/'),
+            'secure': cookie.get('secure', False),
+            'httpOnly': cookie.get('httpOnly', False),
+        }
+        if cookie.get('expiry'):
+            cdp_cookie['expires'] = cookie['expiry']
+        if cookie.get('sameSite') in ('Strict', 'Lax', 'None'):
+            cdp_cookie['sameSite'] = cookie['sameSite']
+        return cdp_cookie
+
     def _is_driver_healthy(self, driver_name):
-        """بررسی سلامت درایور"""
+        """بررسی سلامت درایور - از وضعیت ثبت شده heartbeat؛ فقط اگر کهنه باشد probe (با timeout) می‌شود"""
+        driver = self.active_drivers.get(driver_name)
+        if driver is None:
+            return False
+
+        health = self.driver_health.get(driver_name)
+        if health and time.monotonic() - health[1] <= self.health_ttl:
+            return health[0]
+
+        healthy = call_with_timeout(self.is_driver_alive, driver, self.heartbeat_timeout)
+        self.driver_health[driver_name] = (healthy, time.monotonic())
+        return healthy
+
+    # Heartbeat
+    def start_heartbeat(self):
+        """راه‌اندازی thread پس‌زمینه heartbeat (یک بار در هر پروسه)"""
+        if not self.heartbeat_interval:
+            return
+        with self._lock:
+            if self._heartbeat_thread and self._heartbeat_thread.is_alive():
+                return
+            self._heartbeat_thread = threading.Thread(
+                target=self._heartbeat_loop, name='selenium_heartbeat', daemon=True
+            )
+            self._heartbeat_thread.start()
+
+    def _heartbeat_loop(self):
+        while True:
+            time.sleep(self.heartbeat_interval)
+            try:
+                self.heartbeat()
+            except Exception as e:
+                logger.error(f"❌ Error in driver heartbeat: {e}")
+            finally:
+                connection.close()
+
+    def heartbeat(self):
+        """probe درایورهای بیکار با timeout، ثبت وضعیت سلامت و جایگزینی پیش‌دستانه درایورهای خراب"""
+        with self._lock:
+            pools = list(self.pools.values())
+            driver_names = list(self.active_drivers)
+
+        for pool in pools:
+            pool.heartbeat(self.is_driver_alive, self.heartbeat_timeout, older_than=self.heartbeat_interval)
+
+        for driver_name in driver_names:
+            self._heartbeat_driver(driver_name)
+
+    def _heartbeat_driver(self, driver_name):
+        # درایوری که در حال اجرای درخواست است بررسی نمی‌شود - همان درخواست سلامتش را نشان می‌دهد
+        lock = self.driver_locks.get(driver_name)
+        if lock is None or not lock.acquire(blocking=False):
+            return
+        try:
+            driver = self.active_drivers.get(driver_name)
+            if driver is None:
+                return
+            healthy = call_with_timeout(self.is_driver_alive, driver, self.heartbeat_timeout)
+        finally:
+            lock.release()
+
+        self.driver_health[driver_name] = (healthy, time.monotonic())
+        if not healthy:
+            logger.warning(f"💔 Driver {driver_name} failed heartbeat, replacing it")
+            threading.Thread(
+                target=self._replace_driver, args=(driver_name,), name=f'{driver_name}_replace', daemon=True
+            ).start()
+
+    def _replace_driver(self, driver_name):
+        """ساخت دوباره درایور خراب با همان تنظیمات قبل از اینکه درخواست بعدی به آن برسد"""
+        try:
+            options = self.driver_options.get(driver_name)
+            if options:
+                self.get_or_create_driver(driver_name, *options)
+            else:
+                self._cleanup_driver(driver_name)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not replace driver {driver_name}: {e}")
+        finally:
+            connection.close()
+
+    # Recycling
+    def _start_recycle(self, driver_name):
+        with self._lock:
+            if driver_name in self.recycling or driver_name not in self.driver_options:
+                return
+            self.recycling.add(driver_name)
+        threading.Thread(
+            target=self._recycle_driver, args=(driver_name,), name=f'{driver_name}_recycle', daemon=True
+        ).start()
+
+    def _recycle_driver(self, driver_name):
+        """ساخت جایگزین در پس‌زمینه، جابجایی آن و بستن درایور قدیمی بعد از پایان درخواست در حال اجرا"""
+        try:
+            old_driver = self.active_drivers.get(driver_name)
+            driver_type, profile_data, cookies, cookie_url = self.driver_options[driver_name]
+            driver, cookies_loaded = self._create_driver(driver_type, profile_data, cookies, cookie_url)
+            session_data = self._new_session_data(cookies_loaded)
+
+            with self._lock:
+                # درایور در این فاصله خراب و دوباره ساخته شده (یا پاک شده) است؛ جایگزین لازم نیست
+                replaced = old_driver is not None and self.active_drivers.get(driver_name) is old_driver
+                if replaced:
+                    old_session = self.driver_sessions.get(driver_name)
+                    driver_lock = self.driver_locks[driver_name]
+                    self.active_drivers[driver_name] = driver
+                    self.driver_sessions[driver_name] = session_data
+                    self.driver_health[driver_name] = (True, time.monotonic())
+
+            if not replaced:
+                driver.quit()
+                return
+
+            self._register_session(driver_name, driver_type, profile_data, session_data)
+            # درخواستی که درایور قدیمی را گرفته تا پایان قفل درایور را نگه می‌دارد
+            with driver_lock:
+                try:
+                    old_driver.quit()
+                except Exception as e:
+                    logger.debug(f"Closing recycled driver {driver_name} failed: {e}")
+            if old_session:
+                DriverSession.objects.filter(session_id=old_session['session_id']).update(is_active=False)
+            logger.info(f"♻️ Driver {driver_name} replaced with a fresh session")
+        except Exception as e:
+            logger.warning(f"⚠️ Could not recycle driver {driver_name}: {e}")
+        finally:
+            with self._lock:
+                self.recycling.discard(driver_name)
+            connection.close()
+
+    def _needs_recycle(self, driver_name):
+        session_data = self.driver_sessions.get(driver_name)
+        if not session_data:
+            return False
+        reason = self.recycle_policy.recycle_reason(
+            self.active_drivers[driver_name],
+            session_data['request_count'],
+            (timezone.now() - session_data['created_at']).total_seconds()
+        )
+        if reason:
+            logger.info(f"♻️ Recycling driver {driver_name}: {reason}")
+        return bool(reason)
+
+    @staticmethod
+    def is_driver_alive(driver):
         try:
-            driver = self.active_drivers[driver_name]
             driver.current_url  # یک عملیات ساده برای تست سلامت
             return True
         except WebDriverException:
@@ -124,7 +410,12 @@ class SeleniumDriverManager:
         except:
             pass
 
-        self.active_drivers.pop(driver_name, None)
-        self.driver_locks.pop(driver_name, None)
-        self.request_queues.pop(driver_name, None)
-        self.driver_sessions.pop(driver_name, None)
\ No newline at end of file
+        with self._lock:
+            self.active_drivers.pop(driver_name, None)
+            self.driver_locks.pop(driver_name, None)
+            self.request_queues.pop(driver_name, None)
+            session_data = self.driver_sessions.pop(driver_name, None)
+            self.driver_health.pop(driver_name, None)
+
+        if session_data:
+            DriverSession.objects.filter(session_id=session_data['session_id']).update(is_active=False)
\ No newline at end of file
@@ -0,0 +1,485 @@
+# selenium_app/driver_pool.py
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from selenium.common.exceptions import WebDriverException
+
+logger = logging.getLogger(__name__)
+
+
+def call_with_timeout(func, driver, timeout):
+    """func(driver) با حداکثر زمان - session گیر کرده به جای بلاک کردن، False برمی‌گرداند"""
+    result = {}
+
+    def run():
+        try:
+            result['value'] = func(driver)
+        except Exception:
+            result['value'] = False
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    return result.get('value', False)
+
+
+class DriverPoolTimeout(Exception):
+    """در زمان تعیین شده درایور آزادی در pool پیدا نشد"""
+    pass
+
+
+class PooledDriver:
+    """یک درایور داخل pool به همراه اطلاعات session و استفاده"""
+
+    def __init__(self, driver, session=None):
+        self.driver = driver
+        self.session = session or {}
+        self.created_at = time.monotonic()
+        self.last_released = self.created_at
+        self.lease_count = 0
+        # آخرین وضعیت سلامت (heartbeat یا lease موفق) و زمان آن
+        self.healthy = True
+        self.checked_at = self.created_at
+        # جایگزین در حال ساخت است / جایگزین آماده شده و بعد از lease فعلی بسته می‌شود
+        self.retiring = False
+        self.retire_on_release = False
+
+    @property
+    def age(self):
+        return time.monotonic() - self.created_at
+
+    @property
+    def idle_time(self):
+        return time.monotonic() - self.last_released
+
+
+class DriverRecyclePolicy:
+    """سیاست جایگزینی session های قدیمی: تعداد درخواست، سن و حافظه heap مرورگر (CDP) - مقدار 0 یعنی بدون محدودیت"""
+
+    def __init__(self, max_requests=0, max_age=0, max_heap_mb=0, memory_check_every=10):
+        self.max_requests = max_requests
+        self.max_age = max_age
+        self.max_heap_mb = max_heap_mb
+        self.memory_check_every = max(1, memory_check_every)
+
+    def recycle_reason(self, driver, request_count, age):
+        """دلیل جایگزینی درایور یا None"""
+        if self.max_requests and request_count >= self.max_requests:
+            return f"{request_count} requests"
+        if self.max_age and age >= self.max_age:
+            return f"age {int(age)}s"
+        # خواندن حافظه یک رفت و برگشت به مرورگر است، پس فقط هر چند درخواست یک بار
+        if self.max_heap_mb and request_count and request_count % self.memory_check_every == 0:
+            heap_mb = self.get_heap_mb(driver)
+            if heap_mb is not None and heap_mb >= self.max_heap_mb:
+                return f"JS heap {heap_mb:.0f}MB"
+        return None
+
+    @staticmethod
+    def get_heap_mb(driver):
+        """حافظه heap استفاده شده صفحه (MB) از Performance.getMetrics یا None"""
+        try:
+            driver.execute('executeCdpCommand', {'cmd': 'Performance.enable', 'params': {}})
+            result = driver.execute('executeCdpCommand', {'cmd': 'Performance.getMetrics', 'params': {}})
+            metrics = {metric['name']: metric['value'] for metric in result['value']['metrics']}
+            return metrics['JSHeapUsedSize'] / (1024 * 1024)
+        except Exception as e:
+            logger.debug(f"Could not read browser heap size: {e}")
+            return None
+
+
+class DriverPool:
+    """pool درایورهای یک پروفایل با lease انحصاری
+
+    هر lease یک درایور را فقط به یک thread می‌دهد و بعد از آن به pool برمی‌گرداند.
+    درایورهای بیکار به ترتیب LIFO استفاده می‌شوند تا اضافه‌ها بیکار بمانند و بعد از idle_timeout
+    (تا حداقل min_size) بسته شوند؛ درایوری که در حین lease خطای WebDriver بدهد دور انداخته می‌شود.
+
+    تعداد درایورهای زنده (بیکار، در حال استفاده، در حال ساخت و در حال بسته شدن) از max_size بیشتر نمی‌شود؛
+    تنها استثنا recycle است: درایوری که طبق recycle_policy فرسوده شده تا آماده شدن جایگزینش (در پس‌زمینه)
+    به کار ادامه می‌دهد و در هر لحظه فقط یک recycle انجام می‌شود، پس در این فاصله حداکثر یک درایور اضافه وجود دارد.
+
+    factory() -> (driver, session_data) ، closer(pooled_driver) بستن درایور و session آن ،
+    setup(driver) آماده‌سازی درایورهای گرم/جایگزین ، background_cleanup() در پایان thread های پس‌زمینه
+
+    سلامت درایورها با heartbeat پس‌زمینه ثبت می‌شود و acquire فقط وضعیت کش شده را می‌خواند؛
+    health_check فقط وقتی صدا زده می‌شود که وضعیت ثبت شده قدیمی‌تر از health_ttl باشد (None = هرگز)
+    و حداکثر health_timeout ثانیه منتظر جواب آن می‌ماند تا session گیر کرده acquire را بلاک نکند.
+    """
+
+    def __init__(self, name, factory, closer=None, min_size=0, max_size=1, idle_timeout=600,
+                 health_check=None, health_ttl=None, health_timeout=None, recycle_policy=None, setup=None,
+                 background_cleanup=None):
+        self.name = name
+        self.factory = factory
+        self.closer = closer or (lambda pooled: pooled.driver.quit())
+        self.health_check = health_check
+        self.health_ttl = health_ttl
+        self.health_timeout = health_timeout
+        self.recycle_policy = recycle_policy
+        self.setup = setup
+        self.background_cleanup = background_cleanup
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.idle_timeout = idle_timeout
+
+        self._condition = threading.Condition()
+        self._idle = deque()
+        self._in_use = set()
+        self._creating = 0
+        # درایورهای خارج شده از pool که quit آن‌ها هنوز تمام نشده - تا بسته شدن در سقف max_size حساب می‌شوند
+        self._closing = 0
+        # درایور قدیمی recycle در جریان (فقط یکی در هر لحظه)
+        self._recycling = None
+        self._closed = False
+
+        self._stats = {
+            'leases': 0,
+            'created': 0,
+            'evicted': 0,
+            'discarded': 0,
+            'recycled': 0,
+            'timeouts': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+        }
+
+    @property
+    def size(self):
+        return len(self._idle) + len(self._in_use) + self._creating
+
+    @property
+    def live(self):
+        """درایورهای زنده شامل درایورهای در حال بسته شدن - باید با قفل خوانده شود"""
+        return self.size + self._closing
+
+    # Lease
+    @contextmanager
+    def lease(self, timeout=None):
+        """with pool.lease(timeout) as driver: ... - درایور بعد از بلاک به pool برمی‌گردد"""
+        pooled = self.acquire(timeout)
+        discard = False
+        try:
+            yield pooled.driver
+        except WebDriverException:
+            discard = True
+            raise
+        finally:
+            self.release(pooled, discard=discard)
+
+    def acquire(self, timeout=None):
+        """گرفتن یک درایور آزاد (یا ساخت درایور جدید تا max_size) - در غیر این صورت صبر تا timeout"""
+        started = time.monotonic()
+        deadline = started + timeout if timeout is not None else None
+
+        while True:
+            pooled, evicted = self._checkout(deadline)
+            self._close_all(evicted, 'evicted')
+
+            if pooled is None:
+                pooled = self._create()
+            elif not self._is_healthy(pooled):
+                logger.info(f"🔄 Discarding unhealthy driver from pool {self.name}")
+                self._forget(pooled)
+                continue
+
+            waited = time.monotonic() - started
+            with self._condition:
+                pooled.lease_count += 1
+                pooled.session['request_count'] = pooled.lease_count
+                self._stats['leases'] += 1
+                if waited >= 0.01:
+                    self._stats['waits'] += 1
+                    self._stats['wait_time_total'] += waited
+                    self._stats['wait_time_max'] = max(self._stats['wait_time_max'], waited)
+            return pooled
+
+    def release(self, pooled, discard=False):
+        """برگرداندن درایور به pool (یا بستن آن اگر discard باشد یا pool بسته شده باشد)"""
+        reason = None
+        if not discard and self.recycle_policy and not pooled.retiring:
+            reason = self.recycle_policy.recycle_reason(pooled.driver, pooled.lease_count, pooled.age)
+
+        with self._condition:
+            self._in_use.discard(pooled)
+            retired = pooled.retire_on_release
+            keep = not discard and not retired and not self._closed
+            if keep:
+                # lease بدون خطای WebDriver یعنی session سالم است
+                pooled.last_released = pooled.checked_at = time.monotonic()
+                pooled.healthy = True
+                self._idle.append(pooled)
+                if reason and self._recycling is None:
+                    self._recycling = pooled
+                    pooled.retiring = True
+                else:
+                    # recycle دیگری در جریان است؛ در release بعدی دوباره بررسی می‌شود
+                    reason = None
+            else:
+                self._closing += 1
+            self._condition.notify()
+
+        if not keep:
+            self._close_all([pooled], 'recycled' if retired else 'discarded')
+        elif reason:
+            threading.Thread(
+                target=self._replace, args=(pooled, reason), name=f'{self.name}_recycle', daemon=True
+            ).start()
+
+    def _is_healthy(self, pooled):
+        """وضعیت سلامت کش شده؛ فقط اگر کهنه باشد همین‌جا (با health_timeout) probe می‌شود"""
+        if pooled.healthy and self.health_check and self.health_ttl is not None \
+                and time.monotonic() - pooled.checked_at > self.health_ttl:
+            if self.health_timeout:
+                pooled.healthy = bool(call_with_timeout(self.health_check, pooled.driver, self.health_timeout))
+            else:
+                pooled.healthy = bool(self.health_check(pooled.driver))
+            pooled.checked_at = time.monotonic()
+        return pooled.healthy
+
+    # Recycling
+    def _replace(self, old, reason):
+        """ساخت جایگزین در پس‌زمینه و سپس بازنشسته کردن درایور قدیمی"""
+        logger.info(f"♻️ Recycling a driver of pool {self.name} ({reason})")
+        try:
+            self._swap(old)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not create replacement driver for pool {self.name}: {e}")
+            with self._condition:
+                old.retiring = False
+                if self._recycling is old:
+                    self._recycling = None
+        finally:
+            if self.background_cleanup:
+                self.background_cleanup()
+
+    def _swap(self, old):
+        # جای جایگزین رزرو می‌شود (تنها حالتی که pool یک واحد از max_size بیشتر می‌شود)
+        with self._condition:
+            self._creating += 1
+        replacement = self._create()
+        try:
+            if self.setup:
+                self.setup(replacement.driver)
+        except Exception:
+            self._forget(replacement)
+            raise
+
+        # درایور قدیمی اگر بیکار است همین حالا، وگرنه بعد از پایان lease فعلی بسته می‌شود
+        with self._condition:
+            retire_now = old in self._idle
+            if retire_now:
+                self._idle.remove(old)
+                self._closing += 1
+            else:
+                old.retire_on_release = True
+        self.release(replacement)
+        if retire_now:
+            self._close_all([old], 'recycled')
+
+    def _checkout(self, deadline):
+        """(درایور بیکار یا None برای ساخت درایور جدید, درایورهای منقضی شده برای بستن)"""
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise DriverPoolTimeout(f"Driver pool {self.name} is closed")
+
+                evicted = self._collect_expired()
+                if self._idle:
+                    pooled = self._idle.pop()
+                    self._in_use.add(pooled)
+                    return pooled, evicted
+                # درایورهای منقضی شده قبل از ساخت درایور جدید (توسط acquire) بسته می‌شوند
+                if self.live - len(evicted) < self.max_size:
+                    self._creating += 1
+                    return None, evicted
+
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise DriverPoolTimeout(
+                        f"No free driver in pool {self.name} after waiting (size={self.max_size})"
+                    )
+                self._condition.wait(remaining)
+
+    def _create(self):
+        try:
+            driver, session = self.factory()
+        except Exception:
+            with self._condition:
+                self._creating -= 1
+                self._condition.notify()
+            raise
+
+        pooled = PooledDriver(driver, session)
+        with self._condition:
+            self._creating -= 1
+            self._in_use.add(pooled)
+            self._stats['created'] += 1
+        logger.info(f"🚗 Created driver #{self._stats['created']} for pool {self.name} (size={self.size})")
+        return pooled
+
+    def _forget(self, pooled):
+        with self._condition:
+            self._in_use.discard(pooled)
+            self._closing += 1
+            self._condition.notify()
+        self._close_all([pooled], 'discarded')
+
+    # Warm-up
+    def prewarm(self, count=None, setup=None):
+        """ساخت درایور تا رسیدن اندازه pool به count (پیش‌فرض min_size) و نگهداری آن‌ها به صورت بیکار
+
+        setup(driver) (پیش‌فرض setup خود pool) قبل از برگشت درایور به pool اجرا می‌شود - تعداد درایورهای ساخته شده
+        """
+        count = min(count if count is not None else self.min_size, self.max_size)
+        setup = setup or self.setup
+        created = 0
+        while True:
+            with self._condition:
+                if self._closed or self.size >= count or self.live >= self.max_size:
+                    return created
+                self._creating += 1
+
+            pooled = self._create()
+            try:
+                if setup:
+                    setup(pooled.driver)
+            except Exception:
+                self._forget(pooled)
+                raise
+            self.release(pooled)
+            created += 1
+
+    def ping_idle(self, ping, timeout=None, older_than=0):
+        """ping درایورهای بیکاری که از older_than ثانیه پیش بررسی نشده‌اند (بدون تغییر زمان بیکاری آن‌ها)
+
+        درایورهایی که جواب ندهند (یا تا timeout جواب ندهند) بسته می‌شوند - خروجی: تعداد درایورهای بسته شده
+        """
+        now = time.monotonic()
+        with self._condition:
+            candidates = [pooled for pooled in self._idle if now - pooled.checked_at >= older_than]
+
+        dead = []
+        for pooled in candidates:
+            with self._condition:
+                if pooled not in self._idle:
+                    continue
+                self._idle.remove(pooled)
+                self._in_use.add(pooled)
+
+            alive = call_with_timeout(ping, pooled.driver, timeout) if timeout else ping(pooled.driver)
+            with self._condition:
+                pooled.healthy = bool(alive)
+                pooled.checked_at = time.monotonic()
+                self._in_use.discard(pooled)
+                if alive and not self._closed:
+                    self._return_idle(pooled)
+                else:
+                    dead.append(pooled)
+                    self._closing += 1
+                self._condition.notify()
+
+        self._close_all(dead, 'discarded')
+        return len(dead)
+
+    def _return_idle(self, pooled):
+        """برگرداندن به جای قبلی در صف بیکارها (مرتب بر اساس زمان release) - باید با قفل صدا زده شود"""
+        index = next(
+            (i for i, other in enumerate(self._idle) if other.last_released > pooled.last_released),
+            len(self._idle)
+        )
+        self._idle.insert(index, pooled)
+
+    def heartbeat(self, probe, timeout=None, older_than=0):
+        """بررسی سلامت درایورهای بیکار و جایگزینی پیش‌دستانه درایورهای خراب در پس‌زمینه"""
+        evicted = self.evict_idle()
+        dead = self.ping_idle(probe, timeout, older_than)
+        if dead:
+            logger.warning(f"💔 {dead} drivers of pool {self.name} failed heartbeat, replacing them")
+            with self._condition:
+                target = self.size + dead
+            threading.Thread(
+                target=self._replenish, args=(target,), name=f'{self.name}_replenish', daemon=True
+            ).start()
+        return {'evicted': evicted, 'dead': dead}
+
+    def _replenish(self, count):
+        try:
+            self.prewarm(count)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not replace dead drivers of pool {self.name}: {e}")
+        finally:
+            if self.background_cleanup:
+                self.background_cleanup()
+
+    # Eviction
+    def _collect_expired(self):
+        """درایورهای بیکار قدیمی‌تر از idle_timeout (تا حد min_size) - باید با قفل صدا زده شود"""
+        if not self.idle_timeout:
+            return []
+
+        expired = []
+        # قدیمی‌ترین بیکارها سمت چپ deque هستند
+        while self._idle and self.size > self.min_size and self._idle[0].idle_time > self.idle_timeout:
+            expired.append(self._idle.popleft())
+        self._closing += len(expired)
+        return expired
+
+    def evict_idle(self):
+        """بستن درایورهای بیکار منقضی شده - تعداد بسته شده"""
+        with self._condition:
+            expired = self._collect_expired()
+        self._close_all(expired, 'evicted')
+        return len(expired)
+
+    def _close_all(self, drivers, reason):
+        """بستن درایورهایی که با قفل از pool خارج و در _closing شمرده شده‌اند"""
+        if not drivers:
+            return
+        with self._condition:
+            self._stats[reason] += len(drivers)
+        for pooled in drivers:
+            try:
+                self.closer(pooled)
+            except Exception as e:
+                logger.debug(f"Closing {reason} driver of pool {self.name} failed: {e}")
+            finally:
+                with self._condition:
+                    self._closing -= 1
+                    if self._recycling is pooled:
+                        self._recycling = None
+                    self._condition.notify()
+
+    def close(self):
+        """بستن همه درایورهای بیکار؛ درایورهای در حال استفاده هنگام release بسته می‌شوند"""
+        with self._condition:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._closing += len(idle)
+            self._condition.notify_all()
+        self._close_all(idle, 'evicted')
+
+    # Stats
+    def stats(self):
+        with self._condition:
+            stats = dict(self._stats)
+            stats.update({
+                'name': self.name,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'size': self.size,
+                'in_use': len(self._in_use),
+                'idle': len(self._idle),
+                'creating': self._creating,
+                'closing': self._closing,
+            })
+        stats['wait_time_avg'] = round(stats['wait_time_total'] / stats['waits'], 3) if stats['waits'] else 0.0
+        stats['wait_time_total'] = round(stats['wait_time_total'], 3)
+        stats['wait_time_max'] = round(stats['wait_time_max'], 3)
+        return stats
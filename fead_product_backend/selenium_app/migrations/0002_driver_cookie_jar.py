@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('selenium_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='seleniumdriver',
+            name='cookie_jar',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='seleniumdriver',
+            name='cookie_jar_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='seleniumdriver',
+            name='cookie_jar_saved_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='seleniumdriver',
+            name='cookie_jar_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
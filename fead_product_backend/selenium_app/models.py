@@ -13,6 +13,11 @@ class SeleniumDriver(models.Model):
     name = models.CharField(max_length=100, unique=True)
     driver_type = models.CharField(max_length=10, choices=DRIVER_TYPES, default='CHROME')
     profile_data = models.JSONField(default=dict, blank=True)  # برای ذخیره پروفایل/کوکی‌ها
+    # کوکی‌های session ذخیره شده بعد از تنظیم موفق موقعیت: {'domain', 'location', 'cookies'}
+    cookie_jar = models.JSONField(default=dict, blank=True)
+    cookie_jar_version = models.PositiveIntegerField(default=0)
+    cookie_jar_saved_at = models.DateTimeField(null=True, blank=True)
+    cookie_jar_expires_at = models.DateTimeField(null=True, blank=True)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     last_used = models.DateTimeField(auto_now=True)
@@ -20,6 +25,14 @@ class SeleniumDriver(models.Model):
     def __str__(self):
         return f"{self.name} ({self.driver_type})"
 
+    def has_valid_cookie_jar(self):
+        """آیا کوکی‌های ذخیره شده هنوز منقضی نشده‌اند؟"""
+        return bool(
+            self.cookie_jar.get('cookies')
+            and self.cookie_jar_expires_at
+            and self.cookie_jar_expires_at > timezone.now()
+        )
+
 
 class CrawlRequest(models.Model):
     STATUS_CHOICES = [
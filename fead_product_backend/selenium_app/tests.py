@@ -1,3 +1,223 @@
-from django.test import TestCase
+import random
+import threading
+import time
 
-# Create your tests here.
+from django.test import SimpleTestCase
+from selenium.common.exceptions import WebDriverException
+
+from .driver_pool import DriverPool, DriverPoolTimeout, DriverRecyclePolicy
+
+
+class FakeDriver:
+    def __init__(self, number):
+        self.number = number
+        self.quit_called = False
+
+
+class FakeDriverFactory:
+    """factory/closer ساختگی که تعداد درایورهای زنده (ساخته شده و هنوز quit نشده) را می‌شمارد"""
+
+    def __init__(self, create_delay=0.0, quit_delay=0.0):
+        self.create_delay = create_delay
+        self.quit_delay = quit_delay
+        self.lock = threading.Lock()
+        self.created = 0
+        self.live = 0
+        self.max_live = 0
+
+    def __call__(self):
+        with self.lock:
+            self.created += 1
+            self.live += 1
+            self.max_live = max(self.max_live, self.live)
+            number = self.created
+        time.sleep(self.create_delay)
+        return FakeDriver(number), {'session_id': f'fake-{number}'}
+
+    def close(self, pooled):
+        time.sleep(self.quit_delay)
+        pooled.driver.quit_called = True
+        with self.lock:
+            self.live -= 1
+
+
+def make_pool(factory, **kwargs):
+    return DriverPool('test', factory, closer=factory.close, **kwargs)
+
+
+class DriverPoolTests(SimpleTestCase):
+
+    def run_threads(self, target, count=8):
+        threads = [threading.Thread(target=target) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        self.assertFalse(any(thread.is_alive() for thread in threads))
+
+    def test_live_drivers_never_exceed_max_size(self):
+        factory = FakeDriverFactory(create_delay=0.005, quit_delay=0.01)
+        pool = make_pool(factory, max_size=3, idle_timeout=0.005)
+        stop = threading.Event()
+
+        def worker():
+            for _ in range(25):
+                try:
+                    with pool.lease(timeout=5):
+                        time.sleep(random.uniform(0, 0.005))
+                        if random.random() < 0.2:
+                            raise WebDriverException('session lost')
+                except WebDriverException:
+                    pass
+                time.sleep(random.uniform(0, 0.01))
+
+        def heartbeat():
+            # heartbeat همزمان: eviction، ping ناموفق و جایگزینی در پس‌زمینه
+            while not stop.is_set():
+                pool.heartbeat(lambda driver: random.random() > 0.3, timeout=1)
+                time.sleep(0.002)
+
+        heartbeat_thread = threading.Thread(target=heartbeat)
+        heartbeat_thread.start()
+        try:
+            self.run_threads(worker)
+        finally:
+            stop.set()
+            heartbeat_thread.join(5)
+        time.sleep(0.1)
+
+        self.assertLessEqual(factory.max_live, 3)
+        self.assertEqual(factory.live, pool.stats()['size'])
+
+    def test_lease_is_exclusive(self):
+        factory = FakeDriverFactory()
+        pool = make_pool(factory, max_size=2)
+        lock = threading.Lock()
+        in_use = set()
+        collisions = []
+
+        def worker():
+            for _ in range(20):
+                with pool.lease(timeout=5) as driver:
+                    with lock:
+                        if driver in in_use:
+                            collisions.append(driver)
+                        in_use.add(driver)
+                    time.sleep(0.001)
+                    with lock:
+                        in_use.discard(driver)
+
+        self.run_threads(worker)
+
+        self.assertEqual(collisions, [])
+        self.assertLessEqual(factory.created, 2)
+        self.assertEqual(pool.stats()['leases'], 160)
+
+    def test_lease_times_out_when_pool_is_exhausted(self):
+        pool = make_pool(FakeDriverFactory(), max_size=1)
+        with pool.lease():
+            with self.assertRaises(DriverPoolTimeout):
+                pool.acquire(timeout=0.05)
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+    def test_webdriver_exception_discards_driver(self):
+        factory = FakeDriverFactory()
+        pool = make_pool(factory, max_size=1)
+
+        with self.assertRaises(WebDriverException):
+            with pool.lease() as driver:
+                raise WebDriverException('session lost')
+
+        self.assertTrue(driver.quit_called)
+        self.assertEqual(pool.stats()['discarded'], 1)
+        self.assertEqual(pool.stats()['size'], 0)
+        with pool.lease() as new_driver:
+            self.assertIsNot(new_driver, driver)
+
+    def test_other_exceptions_keep_driver(self):
+        pool = make_pool(FakeDriverFactory(), max_size=1)
+
+        with self.assertRaises(ValueError):
+            with pool.lease() as driver:
+                raise ValueError('parse error')
+
+        self.assertFalse(driver.quit_called)
+        with pool.lease() as same_driver:
+            self.assertIs(same_driver, driver)
+
+    def test_idle_eviction_keeps_min_size(self):
+        factory = FakeDriverFactory()
+        pool = make_pool(factory, min_size=1, max_size=3, idle_timeout=0.05)
+        leased = [pool.acquire() for _ in range(3)]
+        for pooled in leased:
+            pool.release(pooled)
+
+        time.sleep(0.1)
+        self.assertEqual(pool.evict_idle(), 2)
+
+        stats = pool.stats()
+        self.assertEqual(stats['size'], 1)
+        self.assertEqual(stats['evicted'], 2)
+        self.assertEqual(factory.live, 1)
+        # بیکارترین درایورها بسته می‌شوند و آخرین درایور برگشته می‌ماند
+        self.assertEqual([pooled.driver.quit_called for pooled in leased], [True, True, False])
+
+    def test_recycle_replaces_then_retires(self):
+        factory = FakeDriverFactory(create_delay=0.05)
+        pool = make_pool(factory, max_size=1, recycle_policy=DriverRecyclePolicy(max_requests=2))
+
+        with pool.lease() as first:
+            pass
+        with pool.lease() as same:
+            self.assertIs(same, first)
+            # lease دوم به max_requests می‌رسد و recycle بعد از release شروع می‌شود
+        # تا آماده شدن جایگزین درایور قدیمی همچنان lease داده می‌شود
+        with pool.lease(timeout=1) as during_recycle:
+            self.assertIs(during_recycle, first)
+            time.sleep(0.1)
+            # جایگزین آماده است ولی درایور قدیمی تا پایان lease بسته نمی‌شود
+            self.assertFalse(first.quit_called)
+        self.assertTrue(first.quit_called)
+
+        with pool.lease(timeout=1) as replacement:
+            self.assertIsNot(replacement, first)
+
+        stats = pool.stats()
+        self.assertEqual(stats['recycled'], 1)
+        self.assertEqual(stats['size'], 1)
+        self.assertEqual(factory.max_live, 2)
+        self.assertEqual(factory.live, 1)
+
+    def test_recycling_exceeds_max_size_by_at_most_one(self):
+        factory = FakeDriverFactory(create_delay=0.01, quit_delay=0.005)
+        pool = make_pool(factory, max_size=3, recycle_policy=DriverRecyclePolicy(max_requests=1))
+
+        def worker():
+            for _ in range(20):
+                with pool.lease(timeout=5):
+                    time.sleep(random.uniform(0, 0.003))
+
+        self.run_threads(worker)
+        time.sleep(0.2)
+
+        self.assertLessEqual(factory.max_live, 4)
+        self.assertGreater(pool.stats()['recycled'], 0)
+        self.assertEqual(factory.live, pool.stats()['size'])
+
+    def test_stale_health_probe_is_bounded_by_timeout(self):
+        factory = FakeDriverFactory()
+        hung = threading.Event()
+        pool = make_pool(
+            factory, max_size=1, health_check=lambda driver: hung.wait(5), health_ttl=0, health_timeout=0.05
+        )
+        with pool.lease() as first:
+            pass
+        time.sleep(0.01)
+
+        started = time.monotonic()
+        # probe گیر کرده تا timeout منتظر می‌ماند، درایور ناسالم حساب و با درایور جدید جایگزین می‌شود
+        with pool.lease(timeout=1) as second:
+            self.assertIsNot(second, first)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertTrue(first.quit_called)
+        hung.set()
@@ -171,6 +171,7 @@ def get_crawl_stats(request):
             'success_rate': (completed_requests / total_requests * 100) if total_requests > 0 else 0,
             'active_drivers': active_drivers,
             'active_sessions': active_sessions,
+            'driver_pools': manager.driver_manager.pool_stats(),
             'recent_requests': recent_serializer.data
         }
 